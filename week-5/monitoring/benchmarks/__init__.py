@@ -0,0 +1 @@
+# Benchmarks for the YOLO monitoring pipeline
@@ -0,0 +1,121 @@
+"""
+Бенчмарк вивантаження наборів даних з ClickHouse у pandas.
+
+Порівнює шляхи:
+    legacy  - execute() -> кортежі -> pd.DataFrame -> pd.to_numeric по колонках
+    native  - execute_iter() частинами з типізованими колонками
+    arrow   - ArrowStream через HTTP інтерфейс
+    parquet - Parquet через HTTP інтерфейс
+    spool   - Parquet потоково на диск, потім читання через memory map
+
+Дані генеруються на сервері з numbers() з тими ж колонками, що й запит детекцій,
+тож бенчмарк не залежить від наповнення таблиць. Кожен випадок виконується
+в окремому процесі, щоб пікова пам'ять (max RSS) не змішувалась між випадками.
+
+Запуск (з директорії week-5, ClickHouse з docker-compose):
+    python -m monitoring.benchmarks.clickhouse_export_benchmark --rows 1000000 10000000
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+# Модулі аналізу дрейфу запускаються як скрипти з директорії evidently
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "evidently"))
+
+from clickhouse_client import (  # noqa: E402
+    ClickHouseClient, DATASET_COLUMNS, EXPORT_ARROW, EXPORT_NATIVE, EXPORT_PARQUET
+)
+
+SYNTHETIC_QUERY = """
+SELECT
+    now64(3) - toIntervalMillisecond(number) as timestamp,
+    toString(generateUUIDv4(number)) as prediction_id,
+    0.05 + (number % 100) / 1000 as processing_time,
+    concat('img_', toString(intDiv(number, 3) % 1000), '.jpg') as filename,
+    'yolo11n' as model_name,
+    ['car', 'person', 'truck'][number % 3 + 1] as class_name,
+    randCanonical() as confidence,
+    toInt32(number % 3) as object_index,
+    1.0 as sampling_weight,
+    toFloat64(number % 256) as image_brightness,
+    toFloat64(number % 64) as image_contrast,
+    toFloat64(number % 500) as image_blur
+FROM numbers({rows:UInt64})
+"""
+
+CASES = ["legacy", EXPORT_NATIVE, EXPORT_ARROW, EXPORT_PARQUET, "spool"]
+
+
+def fetch(case: str, rows: int) -> pd.DataFrame:
+    params = {'rows': rows}
+
+    if case == "legacy":
+        # Шлях до переходу на типізовані колонки
+        client = ClickHouseClient(export_format=EXPORT_NATIVE)
+        df = pd.DataFrame(client.client.execute(SYNTHETIC_QUERY, params), columns=DATASET_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        for column in ('confidence', 'processing_time', 'object_index'):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        return df
+
+    if case == "spool":
+        client = ClickHouseClient(export_format=EXPORT_PARQUET)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = client.spool_to_parquet(SYNTHETIC_QUERY, params, f"{tmp_dir}/spool.parquet")
+            return client.read_spooled(path)
+
+    return ClickHouseClient(export_format=case).fetch_dataframe(SYNTHETIC_QUERY, params)
+
+
+def run_case(case: str, rows: int) -> Dict[str, float]:
+    """Виконується в окремому процесі"""
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = fetch(case, rows)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "seconds": elapsed,
+        "rows": len(df),
+        # ru_maxrss у Linux в кілобайтах
+        "peak_rss_mb": peak_rss / 1024,
+        "rss_growth_mb": (peak_rss - baseline_rss) / 1024,
+        "df_mb": df.memory_usage(deep=True).sum() / 1024 ** 2
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ClickHouse -> pandas export paths: time and memory")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results: List[Dict] = []
+
+    for rows in args.rows:
+        for case in args.cases:
+            with ctx.Pool(1) as pool:
+                result = pool.apply(run_case, (case, rows))
+            results.append({"case": case, **result})
+            print(f"✅ {case:<8} {rows:>12,} rows: {result['seconds']:.2f}s, "
+                  f"+{result['rss_growth_mb']:.0f} MB RSS")
+
+    print(f"\n📊 Export benchmark")
+    print(f"{'case':<10}{'rows':>14}{'seconds':>10}{'rows/s':>14}{'RSS +MB':>10}{'DF MB':>10}")
+    for r in results:
+        print(f"{r['case']:<10}{r['rows']:>14,}{r['seconds']:>10.2f}{r['rows'] / r['seconds']:>14,.0f}"
+              f"{r['rss_growth_mb']:>10.0f}{r['df_mb']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
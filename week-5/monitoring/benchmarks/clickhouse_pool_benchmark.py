@@ -0,0 +1,91 @@
+"""
+Бенчмарк пулу з'єднань AsyncClickHouseClient.
+
+Для кожної моделі виконує зведення, розподіл класів та поточний набір даних:
+послідовно одним ClickHouseClient та паралельно через AsyncClickHouseClient
+з різним розміром пулу. Виводить час проходу, прискорення та метрики запитів.
+
+Запуск (з директорії week-5, ClickHouse з docker-compose):
+    python -m monitoring.benchmarks.clickhouse_pool_benchmark --pool-sizes 1 2 4 8 --repeats 3
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Модулі аналізу дрейфу запускаються як скрипти з директорії evidently
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "evidently"))
+
+from async_clickhouse_client import AsyncClickHouseClient  # noqa: E402
+from clickhouse_client import ClickHouseClient, SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS  # noqa: E402
+
+
+def run_sequential(client: ClickHouseClient, models: List[str], hours_ago: Optional[int]) -> float:
+    """Час одного послідовного проходу, мс"""
+    start = time.perf_counter()
+    for model_name in models:
+        client.get_predictions_summary(model_name)
+        client.get_class_distribution(hours_ago, model_name)
+        client.get_current_dataset(model_name)
+    return (time.perf_counter() - start) * 1000
+
+
+async def run_pooled(pool: AsyncClickHouseClient, models: List[str], hours_ago: Optional[int], repeats: int) -> List[float]:
+    """Час паралельних проходів, мс (перший прогрів не враховується)"""
+    await pool.get_models_overview(models, hours_ago)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await pool.get_models_overview(models, hours_ago)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs pooled ClickHouse queries per model")
+    parser.add_argument("--source", choices=[SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS], default=None)
+    parser.add_argument("--models", nargs="+", default=None, help="за замовчуванням - моделі з поточного вікна")
+    parser.add_argument("--hours-ago", type=int, default=None, help="вікно розподілу класів")
+    parser.add_argument("--pool-sizes", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--timeout", type=float, default=None, help="таймаут запиту, с")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    client = ClickHouseClient(source=args.source)
+    if not client.test_connection():
+        raise SystemExit("❌ ClickHouse connection failed")
+
+    models = args.models or client.get_model_names()
+    if not models:
+        raise SystemExit("❌ No models with predictions in the current window")
+    print(f"📊 {client.source}: {len(models)} models ({', '.join(models)}), {len(models) * 3} queries per pass")
+
+    run_sequential(client, models, args.hours_ago)
+    sequential = statistics.median(run_sequential(client, models, args.hours_ago) for _ in range(args.repeats))
+    print(f"\n{'mode':<16}{'median ms':>12}{'speedup':>10}")
+    print(f"{'sequential':<16}{sequential:>12.1f}{1.0:>10.2f}")
+
+    stats: Dict[int, Dict[str, Dict[str, float]]] = {}
+    for pool_size in args.pool_sizes:
+        pool = AsyncClickHouseClient(pool_size=pool_size, query_timeout=args.timeout, source=args.source)
+        try:
+            pooled = statistics.median(asyncio.run(run_pooled(pool, models, args.hours_ago, args.repeats)))
+            stats[pool_size] = pool.get_query_stats()
+        finally:
+            pool.close()
+        print(f"{f'pool={pool_size}':<16}{pooled:>12.1f}{sequential / pooled:>10.2f}")
+
+    for pool_size, by_query in stats.items():
+        print(f"\n📊 Query metrics, pool={pool_size}")
+        print(f"{'query':<26}{'calls':>7}{'err':>5}{'t/o':>5}{'p50 ms':>10}{'p95 ms':>10}{'wait ms':>10}")
+        for name, metrics in by_query.items():
+            print(f"{name:<26}{metrics['calls']:>7}{metrics['errors']:>5}{metrics['timeouts']:>5}"
+                  f"{metrics['p50_ms']:>10.1f}{metrics['p95_ms']:>10.1f}{metrics['avg_wait_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
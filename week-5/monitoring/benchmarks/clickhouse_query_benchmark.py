@@ -0,0 +1,87 @@
+"""
+Бенчмарк запитів ClickHouseClient: otel_traces проти yolo_predictions.
+
+Виконує кожен метод клієнта для обох джерел даних кілька разів
+та порівнює медіанну затримку запиту.
+
+Запуск (з директорії week-5, ClickHouse з docker-compose):
+    python -m monitoring.benchmarks.clickhouse_query_benchmark --repeats 5
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Модулі аналізу дрейфу запускаються як скрипти з директорії evidently
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "evidently"))
+
+from clickhouse_client import ClickHouseClient, SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS  # noqa: E402
+
+
+def client_methods(client: ClickHouseClient) -> Dict[str, Callable[[], object]]:
+    """Методи клієнта, що вимірюються"""
+    return {
+        "get_predictions_summary": client.get_predictions_summary,
+        "get_class_distribution": client.get_class_distribution,
+        "get_class_distribution(24h)": lambda: client.get_class_distribution(hours_ago=24),
+        "get_current_dataset": client.get_current_dataset,
+        "get_reference_dataset": client.get_reference_dataset,
+        "get_yolo_predictions_data(24h)": lambda: client.get_yolo_predictions_data(hours_ago=24),
+        "get_confidence_histogram": client.get_confidence_histogram,
+        "get_latency_quantiles": client.get_latency_quantiles,
+        "get_latency_quantiles(24h)": lambda: client.get_latency_quantiles(hours_ago=24),
+        "get_feature_sketch": client.get_feature_sketch,
+        "get_slice_sketches(24h)": lambda: client.get_slice_sketches(*last_hours(client, 24)),
+        "get_watermark_bound": client.get_watermark_bound,
+    }
+
+
+def last_hours(client: ClickHouseClient, hours: int) -> Tuple[str, str]:
+    """Межі вікна [now - hours, now] у часі сервера"""
+    end = client.get_watermark_bound()
+    start = (datetime.strptime(end, '%Y-%m-%d %H:%M:%S.%f') - timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+    return start, end[:19]
+
+
+def time_call(fn: Callable[[], object], repeats: int) -> List[float]:
+    """Повертає затримки виклику в мілісекундах (перший прогрів не враховується)"""
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(sources: List[str], repeats: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for source in sources:
+        client = ClickHouseClient(source=source)
+        if not client.test_connection():
+            raise SystemExit("❌ ClickHouse connection failed")
+        for name, fn in client_methods(client).items():
+            results.setdefault(name, {})[source] = statistics.median(time_call(fn, repeats))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ClickHouseClient query latency: otel_traces vs yolo_predictions")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--sources", nargs="+", default=[SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS])
+    args = parser.parse_args()
+
+    results = run(args.sources, args.repeats)
+
+    print(f"\n📊 Median query latency, ms ({args.repeats} runs)")
+    print(f"{'method':<34}" + "".join(f"{source:>20}" for source in args.sources))
+    for name, by_source in results.items():
+        print(f"{name:<34}" + "".join(f"{by_source[source]:>20.1f}" for source in args.sources))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Бенчмарк запитів ClickHouseClient та дашбордів Grafana на різних обсягах даних.
+
+Заповнює окрему базу (за замовчуванням yolo_bench) синтетичними спанами
+(synthetic_spans.py) поступово до кожного обсягу зі списку --scales і на
+кожному кроці вимірює методи клієнта для обох джерел та SQL панелей
+дашборду yolo-monitoring-clickhouse.json. Результати зберігаються в JSON;
+з --baseline поточний запуск порівнюється з попереднім і повертає
+ненульовий код, якщо медіана запиту зросла більше ніж у --tolerance разів.
+
+Методи, що повертають сирі рядки в pandas, пропускаються, якщо вікно
+містить більше --max-fetch-rows детекцій (на 100M спанів це сотні мільйонів рядків).
+
+Запуск (з директорії week-5, ClickHouse з docker-compose):
+    python -m monitoring.benchmarks.clickhouse_scale_benchmark --scales 1000000 10000000 100000000
+    python -m monitoring.benchmarks.clickhouse_scale_benchmark --scales 1000000 --baseline results/old.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from monitoring.benchmarks.clickhouse_query_benchmark import client_methods
+from monitoring.benchmarks.synthetic_spans import (
+    DEFAULT_DATABASE, add_profile_arguments, create_schema, generate_clickhouse,
+    profile_from_args, reset_tables
+)
+
+from clickhouse_client import ClickHouseClient, SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS  # noqa: E402
+from config import Config  # noqa: E402
+
+DASHBOARD_PATH = Path(__file__).resolve().parents[1] / "grafana" / "dashboards" / "yolo-monitoring-clickhouse.json"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Часові діапазони дашборду, для яких виконуються панелі
+DASHBOARD_RANGES = {"15m": 15 * 60, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+
+# Методи, що читають сирі детекції, та вікно (години) для оцінки кількості рядків
+FETCH_METHODS = {
+    "get_current_dataset": None,
+    "get_yolo_predictions_data(24h)": 24,
+}
+
+
+def dashboard_queries(database: str, range_seconds: int) -> Dict[str, str]:
+    """
+    SQL панелей дашборду з підставленими макросами Grafana ($__fromTime/$__toTime
+    розгортаються плагіном ClickHouse у fromUnixTimestamp64Milli(...)).
+    """
+    with open(DASHBOARD_PATH) as f:
+        dashboard = json.load(f)
+
+    now_ms = int(time.time() * 1000)
+    from_ms = now_ms - range_seconds * 1000
+
+    queries = {}
+    for panel in dashboard.get("panels", []):
+        for i, target in enumerate(panel.get("targets", [])):
+            sql = target.get("rawSql") or target.get("query")
+            if not sql:
+                continue
+            sql = (sql.replace("$__fromTime", f"fromUnixTimestamp64Milli({from_ms})")
+                      .replace("$__toTime", f"fromUnixTimestamp64Milli({now_ms})")
+                      .replace(f"{DEFAULT_DATABASE}.", f"{database}."))
+            name = panel.get("title", f"panel {panel.get('id')}") + (f" [{i}]" if i else "")
+            queries[name] = sql
+    return queries
+
+
+def existing_spans(client: ClickHouseClient, database: str) -> int:
+    """Кількість синтетичних спанів передбачень, вже записаних у базу бенчмарку"""
+    return client._execute(
+        f"SELECT count() FROM {database}.otel_traces WHERE SpanName = 'yolo_prediction'"
+    )[0][0]
+
+
+def measure(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    """Медіана, мінімум та максимум затримки (мс); перший прогрів не враховується"""
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(statistics.median(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2)
+    }
+
+
+def detections_in_window(client: ClickHouseClient, hours: Optional[int]) -> int:
+    """Кількість детекцій у вікні методу (для рішення про пропуск)"""
+    hours = hours or Config.CURRENT_DAYS_AGO * 24
+    result = client._execute(
+        f"SELECT count() FROM {Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_PREDICTIONS_TABLE} "
+        "WHERE object_index >= 0 AND timestamp >= now() - toIntervalHour({hours:UInt32})",
+        {'hours': hours}
+    )
+    return int(result[0][0])
+
+
+def run_scale(sources: List[str], database: str, repeats: int, max_fetch_rows: int) -> Dict[str, Any]:
+    """Вимірює методи клієнта та панелі дашборду на поточних даних"""
+    result: Dict[str, Any] = {"methods": {}, "dashboard": {}, "skipped": []}
+
+    counter = ClickHouseClient(source=SOURCE_YOLO_PREDICTIONS)
+    windows = {name: detections_in_window(counter, hours) for name, hours in FETCH_METHODS.items()}
+
+    for source in sources:
+        client = ClickHouseClient(source=source)
+        for name, fn in client_methods(client).items():
+            if windows.get(name, 0) > max_fetch_rows:
+                result["skipped"].append(f"{source}:{name}")
+                continue
+            result["methods"].setdefault(source, {})[name] = measure(fn, repeats)
+            print(f"   {source:<18}{name:<34}{result['methods'][source][name]['median_ms']:>12.1f} ms")
+
+    for range_name, range_seconds in DASHBOARD_RANGES.items():
+        for name, sql in dashboard_queries(database, range_seconds).items():
+            key = f"{name} ({range_name})"
+            result["dashboard"][key] = measure(lambda: counter._execute(sql), repeats)
+            print(f"   {'dashboard':<18}{key:<34}{result['dashboard'][key]['median_ms']:>12.1f} ms")
+
+    return result
+
+
+def table_sizes(client: ClickHouseClient, database: str) -> Dict[str, Dict[str, int]]:
+    rows = client._execute(
+        "SELECT table, sum(rows), sum(data_compressed_bytes) FROM system.parts "
+        "WHERE database = {database:String} AND active GROUP BY table",
+        {'database': database}
+    )
+    return {table: {"rows": int(count), "compressed_bytes": int(size)} for table, count, size in rows}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Запити, медіана яких зросла більше ніж у tolerance разів порівняно з baseline"""
+    regressions = []
+    for scale, result in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if not base:
+            continue
+
+        pairs = [(f"dashboard:{name}", timing, base["dashboard"].get(name))
+                 for name, timing in result["dashboard"].items()]
+        for source, methods in result["methods"].items():
+            pairs += [(f"{source}:{name}", timing, base["methods"].get(source, {}).get(name))
+                      for name, timing in methods.items()]
+
+        for name, timing, base_timing in pairs:
+            if not base_timing or not base_timing["median_ms"]:
+                continue
+            ratio = timing["median_ms"] / base_timing["median_ms"]
+            if ratio > tolerance:
+                regressions.append(f"{scale} {name}: {base_timing['median_ms']:.1f} -> "
+                                   f"{timing['median_ms']:.1f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ClickHouseClient and dashboard query latency at 1M/10M/100M spans")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000_000, 10_000_000, 100_000_000])
+    parser.add_argument("--database", default="yolo_bench")
+    parser.add_argument("--sources", nargs="+", default=[SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--chunk-spans", type=int, default=1_000_000)
+    parser.add_argument("--max-fetch-rows", type=int, default=5_000_000)
+    parser.add_argument("--keep", action="store_true", help="Keep existing data in the benchmark database")
+    parser.add_argument("--output", default=None, help="Results JSON (default: results/clickhouse_scale_<time>.json)")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.3)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.database == DEFAULT_DATABASE:
+        raise SystemExit(f"❌ Use a separate database, not {DEFAULT_DATABASE}")
+
+    # Клієнти читають базу з Config, тож бенчмарк не торкається робочих таблиць
+    Config.CLICKHOUSE_DATABASE = args.database
+    client = ClickHouseClient()
+    if not client.test_connection():
+        raise SystemExit("❌ ClickHouse connection failed")
+
+    create_schema(client, args.database)
+    if not args.keep:
+        reset_tables(client, args.database)
+
+    profile = profile_from_args(args)
+    results: Dict[str, Any] = {
+        "created_at": datetime.now().isoformat(),
+        "server_version": client._execute("SELECT version()")[0][0],
+        "database": args.database,
+        "repeats": args.repeats,
+        "profile": profile.describe(),
+        "scales": {}
+    }
+
+    # З --keep нумерація продовжується з наявних спанів, інакше номери та prediction_id повторяться
+    generated = existing_spans(client, args.database) if args.keep else 0
+    for scale in sorted(args.scales):
+        seconds = 0.0
+        if scale > generated:
+            print(f"\n📥 Generating spans {generated:,} -> {scale:,}")
+            seconds = generate_clickhouse(client, profile, scale - generated, generated, args.chunk_spans, args.database)
+            generated = scale
+        else:
+            print(f"\n📥 Database already has {generated:,} spans (>= {scale:,})")
+
+        print(f"📊 Querying at {scale:,} spans")
+        result = run_scale(args.sources, args.database, args.repeats, args.max_fetch_rows)
+        result["spans"] = generated
+        result["generate_seconds"] = round(seconds, 1)
+        result["tables"] = table_sizes(client, args.database)
+        results["scales"][str(scale)] = result
+        if result["skipped"]:
+            print(f"⚠️  Skipped (> {args.max_fetch_rows:,} rows): {', '.join(result['skipped'])}")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"clickhouse_scale_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions (> x{args.tolerance}):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
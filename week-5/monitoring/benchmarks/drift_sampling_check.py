@@ -0,0 +1,115 @@
+"""
+Перевірка стратифікованої вибірки current даних перед звітом Evidently.
+
+Для кожного бюджету рядків та seed будує вибірку поточного набору
+(class_name x часовий кошик) і порівнює PSI / Jensen-Shannon reference
+проти вибірки з тими ж метриками на повних даних. Перед цим на синтетичних
+даних перевіряє, що вибірка не перевищує бюджет (одна велика страта та багато
+дрібних). Завершується з кодом 1, якщо бюджет перевищено або відхилення
+перевищує допуск.
+
+Запуск (з директорії week-5, ClickHouse з docker-compose):
+    python -m monitoring.benchmarks.drift_sampling_check --budgets 10000 50000 --seeds 1 2 3
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Модулі аналізу дрейфу запускаються як скрипти з директорії evidently
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "evidently"))
+
+from clickhouse_client import ClickHouseClient, SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS  # noqa: E402
+from config import Config  # noqa: E402
+from sampling import _allocate, sample_drift_deviation, stratified_sample  # noqa: E402
+
+
+def check_budget() -> int:
+    """Вибірка не перевищує бюджет, коли малих страт багато; повертає кількість порушень"""
+    cases = [(np.array([1000] + [1] * 9), 10), (np.array([5000] + [1] * 99 + [3] * 50), 150)]
+    failed = 0
+    for sizes, budget in cases:
+        counts = _allocate(sizes, budget)
+        if counts.sum() > budget or (counts < 1).any():
+            print(f"❌ _allocate({len(sizes)} strata, budget={budget}) -> {counts.sum()} rows")
+            failed += 1
+
+    # 7 днів годинних кошиків x 5 класів: страт більше, ніж рядків у бюджеті
+    rng = np.random.default_rng(0)
+    rows = 20000
+    df = pd.DataFrame({
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 7 * 24 * 3600, rows), unit='s'),
+        'class_name': rng.choice(['car', 'person', 'truck', 'bus', 'bicycle'], rows, p=[0.8, 0.1, 0.05, 0.04, 0.01]),
+        'sampling_weight': np.ones(rows)
+    })
+    for budget in (100, 500, 1000):
+        sample_df, sampling = stratified_sample(df, budget)
+        if len(sample_df) > budget:
+            print(f"❌ stratified_sample(budget={budget}, {sampling['strata']} strata) -> {len(sample_df)} rows")
+            failed += 1
+
+    if not failed:
+        print("✅ Samples stay within the row budget")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drift metrics on a stratified sample vs the full current window")
+    parser.add_argument("--source", choices=[SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS], default=None)
+    parser.add_argument("--budgets", nargs="+", type=int, default=[10000, 50000, 100000])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[Config.DRIFT_SAMPLE_SEED])
+    parser.add_argument("--time-bucket", default=Config.DRIFT_SAMPLE_TIME_BUCKET)
+    parser.add_argument("--tolerance", type=float, default=Config.DRIFT_SAMPLE_TOLERANCE)
+    parser.add_argument("--reference-hours-ago", type=int, default=None,
+                        help="reference - доба передбачень N годин тому (за замовчуванням REFERENCE_* фільтри)")
+    args = parser.parse_args()
+
+    if check_budget():
+        sys.exit(1)
+
+    client = ClickHouseClient(source=args.source)
+    if not client.test_connection():
+        raise SystemExit("❌ ClickHouse connection failed")
+
+    if args.reference_hours_ago:
+        reference_df = client.get_yolo_predictions_data(hours_ago=args.reference_hours_ago)
+    else:
+        reference_df = client.get_reference_dataset()
+    current_df = client.get_current_dataset()
+    if reference_df.empty or current_df.empty:
+        raise SystemExit("❌ Reference or current dataset is empty")
+    print(f"📊 {client.source}: reference={len(reference_df)} current={len(current_df)} rows, "
+          f"tolerance={args.tolerance}")
+
+    print(f"\n{'budget':>8}{'seed':>6}{'rows':>9}{'rate':>9}{'strata':>8}{'sample ms':>11}"
+          f"{'PSI dev':>9}{'JS dev':>9}  status")
+    failed = 0
+    for budget in args.budgets:
+        for seed in args.seeds:
+            start = time.perf_counter()
+            sample_df, sampling = stratified_sample(current_df, budget, seed=seed, time_bucket=args.time_bucket or None)
+            elapsed = (time.perf_counter() - start) * 1000
+
+            check = sample_drift_deviation(reference_df, current_df, sample_df, args.tolerance)
+            failed += not check['within_tolerance']
+            print(f"{budget:>8}{seed:>6}{sampling['sample_rows']:>9}{sampling['sampling_rate']:>9.4f}"
+                  f"{sampling['strata']:>8}{elapsed:>11.1f}{check['max_psi_delta']:>9.4f}{check['max_js_delta']:>9.4f}"
+                  f"  {'✅' if check['within_tolerance'] else '❌'}")
+
+            for feature, deviation in check['features'].items():
+                if deviation['drift_full'] != deviation['drift_sample']:
+                    print(f"   ⚠️ {feature}: drift decision differs "
+                          f"(PSI {deviation['psi_full']} -> {deviation['psi_sample']})")
+
+    if failed:
+        print(f"\n❌ {failed} sample(s) outside tolerance")
+        sys.exit(1)
+    print("\n✅ Drift metrics on all samples are within tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Бенчмарк статистик зображення в колекторі.
+
+Міряє додаткову затримку record_prediction (гарячий шлях /detect) зі
+статистиками зображення та без них: у запиті береться лише зменшена копія,
+а яскравість, контраст, гістограма та різкість рахуються фоновим потоком.
+Окремо показує вартість фонового розрахунку на одне зображення.
+
+Запуск (з директорії week-5):
+    python -m monitoring.benchmarks.image_stats_benchmark --requests 2000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from monitoring.image_stats import compute_image_stats, downsample
+from monitoring.otel_collector import YOLOOpenTelemetryCollector
+
+RESOLUTIONS = {"640x480": (480, 640), "1920x1080": (1080, 1920)}
+
+# Бюджет додаткової затримки p99 на запит
+OVERHEAD_BUDGET_MS = 1.0
+
+DETECTIONS = [
+    {"bbox": [10.0, 20.0, 110.0, 220.0], "confidence": 0.87, "class_name": "car"},
+    {"bbox": [300.0, 40.0, 360.0, 200.0], "confidence": 0.64, "class_name": "person"}
+]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples)
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99))
+    }
+
+
+async def measure_hot_path(image: np.ndarray, image_stats: bool, requests: int,
+                           interval_ms: float = 0.0) -> List[float]:
+    """
+    Час виклику record_prediction (мс) для кожного запиту.
+    interval_ms імітує час інференсу між запитами: без паузи фоновий потік
+    постійно зайнятий і конкурує за GIL з вимірюваним викликом.
+    """
+    collector = YOLOOpenTelemetryCollector(
+        service_name="yolo-benchmark",
+        queue_size=requests,
+        image_stats=image_stats,
+        span_exporter=InMemorySpanExporter(),
+        metric_reader=InMemoryMetricReader()
+    )
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await collector.record_prediction(image, DETECTIONS, 42.0, filename="benchmark.jpg")
+        samples.append((time.perf_counter() - start) * 1000)
+        if interval_ms:
+            await asyncio.sleep(interval_ms / 1000)
+
+    collector.close()
+    return samples
+
+
+def measure_background(image: np.ndarray, iterations: int) -> float:
+    """Середній час фонового розрахунку статистик (мс)"""
+    thumbnail = downsample(image)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        compute_image_stats(thumbnail)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path overhead of image statistics in the OTel collector")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--interval-ms", type=float, default=5.0,
+                        help="Pause between requests (simulated inference time)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failed = False
+
+    print(f"\n📊 {args.requests} requests per case")
+    print(f"{'image':<12}{'off p50':>10}{'off p99':>10}{'on p50':>10}{'on p99':>10}"
+          f"{'Δ p99':>10}{'bg ms':>10}")
+
+    for name, (height, width) in RESOLUTIONS.items():
+        image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+        # Прогрів, щоб не міряти імпорт та ініціалізацію
+        asyncio.run(measure_hot_path(image, True, 50))
+
+        off = percentiles(asyncio.run(measure_hot_path(image, False, args.requests, args.interval_ms)))
+        on = percentiles(asyncio.run(measure_hot_path(image, True, args.requests, args.interval_ms)))
+        background = measure_background(image, 200)
+
+        overhead = on["p99"] - off["p99"]
+        failed |= overhead >= OVERHEAD_BUDGET_MS
+        print(f"{name:<12}{off['p50']:>10.3f}{off['p99']:>10.3f}{on['p50']:>10.3f}{on['p99']:>10.3f}"
+              f"{overhead:>10.3f}{background:>10.3f}")
+
+    if failed:
+        print(f"\n❌ p99 overhead exceeds {OVERHEAD_BUDGET_MS} ms")
+        sys.exit(1)
+    print(f"\n✅ p99 overhead below {OVERHEAD_BUDGET_MS} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Бенчмарк пропускної здатності телеметрії від API до ClickHouse.
+
+Конкурентні продюсери викликають record_prediction з заданою сумарною
+швидкістю, спани йдуть через BatchSpanProcessor в OTLP колектор
+(memory_limiter -> batch -> clickhouse) і далі в otel_traces. Для кожної
+швидкості зі списку --rates вимірюється:
+  * заповнення черги колектора та черги BatchSpanProcessor, відкинуті спани;
+  * час і розмір кожного експорту OTLP;
+  * прийняті / відхилені / відправлені спани за метриками колектора (:8888);
+  * затримка появи спанів у ClickHouse (свіжість) та час дочитування черг.
+Наприкінці показується максимальна швидкість без втрат та рекомендовані
+налаштування BatchSpanProcessor (OTEL_BSP_*) для --target-rate.
+
+Запуск (з директорії week-5, стек з docker-compose):
+    python -m monitoring.benchmarks.ingest_benchmark --rates 200 500 1000 2000 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import requests
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from monitoring.benchmarks.synthetic_spans import DEFAULT_CLASS_MIX, SyntheticProfile, parse_class_mix
+from monitoring.otel_collector import YOLOOpenTelemetryCollector
+
+from clickhouse_client import ClickHouseClient, SOURCE_OTEL_TRACES  # noqa: E402
+
+# Лічильники колектора (назви без суфікса _total, він залежить від версії колектора)
+COLLECTOR_COUNTERS = {
+    "otelcol_receiver_accepted_spans": "accepted",
+    "otelcol_receiver_refused_spans": "refused",
+    "otelcol_processor_refused_spans": "memory_limiter_refused",
+    "otelcol_exporter_sent_spans": "sent",
+    "otelcol_exporter_send_failed_spans": "send_failed",
+    "otelcol_exporter_enqueue_failed_spans": "enqueue_failed",
+}
+
+# Запас для рекомендацій: черги та батчі розраховуються з подвійним навантаженням
+HEADROOM = 2.0
+
+
+class CountingExporter(SpanExporter):
+    """Обгортка експортера: рахує спани та міряє час кожного експорту"""
+
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+        self.exported = 0
+        self.failed = 0
+        self.calls: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        start = time.perf_counter()
+        result = self.exporter.export(spans)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.calls.append((len(spans), elapsed))
+            if result == SpanExportResult.SUCCESS:
+                self.exported += len(spans)
+            else:
+                self.failed += len(spans)
+        return result
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.exporter.force_flush(timeout_millis)
+
+
+def scrape_collector(url: str) -> Dict[str, float]:
+    """Сумарні лічильники спанів з /metrics колектора (порожньо, якщо недоступний)"""
+    try:
+        text = requests.get(url, timeout=5).text
+    except requests.RequestException:
+        return {}
+
+    totals: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        key = COLLECTOR_COUNTERS.get(name[:-len("_total")] if name.endswith("_total") else name)
+        if key:
+            totals[key] = totals.get(key, 0.0) + float(line.rsplit(" ", 1)[-1])
+    return totals
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+class ClickHouseProbe:
+    """Фоновий опит ClickHouse: кількість спанів запуску та їхня свіжість"""
+
+    def __init__(self, client: ClickHouseClient, service_name: str, since: str, interval: float = 0.5):
+        self.client = client
+        self.service_name = service_name
+        self.since = since
+        self.interval = interval
+        self.rows = 0
+        self.lag_samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def poll(self) -> int:
+        result = self.client._execute(
+            f"SELECT count(), toUnixTimestamp64Milli(max(Timestamp)) FROM {self.client.table_name} "
+            "WHERE SpanName = 'yolo_prediction' AND ServiceName = {service:String} "
+            "AND Timestamp >= {since:DateTime64(3)}",
+            {'service': self.service_name, 'since': self.since}
+        )
+        rows, latest_ms = result[0]
+        self.rows = int(rows)
+        if rows:
+            self.lag_samples.append(time.time() - latest_ms / 1000)
+        return self.rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️  ClickHouse poll failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+async def produce(collector: YOLOOpenTelemetryCollector, profile: SyntheticProfile,
+                  rate: float, duration: float, seed: int) -> int:
+    """Один продюсер: record_prediction з рівномірним темпом rate викликів/с"""
+    rng = random.Random(seed)
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    sent = 0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration:
+        record = profile.make_record(rng)
+        await collector.record_prediction(
+            image, record["detections"], record["processing_time_ms"],
+            filename=record["filename"], model_name=record["model_name"]
+        )
+        sent += 1
+        delay = start + sent / rate - time.perf_counter()
+        # Продюсер, що відстає, не спить, а одразу наздоганяє темп
+        await asyncio.sleep(max(delay, 0))
+    return sent
+
+
+async def sample_queues(collector: YOLOOpenTelemetryCollector, samples: Dict[str, List[int]],
+                        stop: asyncio.Event, interval: float = 0.05):
+    while not stop.is_set():
+        samples["collector"].append(len(collector._queue))
+        exporter_queue = collector.exporter_queue_size()
+        if exporter_queue is not None:
+            samples["exporter"].append(exporter_queue)
+        await asyncio.sleep(interval)
+
+
+async def drive(collector: YOLOOpenTelemetryCollector, profile: SyntheticProfile,
+                rate: float, duration: float, producers: int) -> Dict[str, Any]:
+    samples: Dict[str, List[int]] = {"collector": [], "exporter": []}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_queues(collector, samples, stop))
+
+    start = time.perf_counter()
+    sent = await asyncio.gather(*[
+        produce(collector, profile, rate / producers, duration, seed)
+        for seed in range(producers)
+    ])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await sampler
+    return {"sent": sum(sent), "seconds": elapsed, "samples": samples}
+
+
+def run_rate(rate: float, args: argparse.Namespace, profile: SyntheticProfile) -> Dict[str, Any]:
+    """Один крок навантаження з фіксованою швидкістю"""
+    service_name = f"yolo-ingest-{uuid.uuid4().hex[:8]}"
+    exporter = CountingExporter(OTLPSpanExporter(endpoint=f"{args.otel_endpoint}/v1/traces"))
+    collector = YOLOOpenTelemetryCollector(
+        service_name=service_name,
+        queue_size=args.queue_size,
+        image_stats=False,
+        bsp_max_queue_size=args.bsp_max_queue_size,
+        bsp_max_export_batch_size=args.bsp_max_export_batch_size,
+        bsp_schedule_delay_millis=args.bsp_schedule_delay,
+        bsp_export_timeout_millis=args.bsp_export_timeout,
+        span_exporter=exporter
+    )
+
+    clickhouse = ClickHouseClient(source=SOURCE_OTEL_TRACES)
+    since = (datetime.now() - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S.%f')
+    probe = ClickHouseProbe(clickhouse, service_name, since)
+
+    before = scrape_collector(args.collector_metrics)
+    probe.start()
+    load = asyncio.run(drive(collector, profile, rate, args.duration, args.producers))
+
+    # Дочитуємо черги та чекаємо, поки всі експортовані спани з'являться в ClickHouse
+    finished = time.perf_counter()
+    collector.close(timeout=args.drain_timeout)
+    while probe.rows < exporter.exported and time.perf_counter() - finished < args.drain_timeout:
+        time.sleep(0.5)
+    drain_seconds = time.perf_counter() - finished
+    probe.stop()
+    probe.poll()
+    after = scrape_collector(args.collector_metrics)
+
+    stats = collector.get_stats()
+    written = stats["records_exported"]
+    batch_sizes = [size for size, _ in exporter.calls]
+    export_ms = [seconds * 1000 for _, seconds in exporter.calls]
+
+    result = {
+        "target_rate": rate,
+        "achieved_rate": round(load["sent"] / load["seconds"], 1),
+        "sent": load["sent"],
+        "collector_queue_dropped": stats["records_dropped"],
+        "spans_written": written,
+        "spans_exported": exporter.exported,
+        "spans_export_failed": exporter.failed,
+        # Спани, що пройшли _write_span, але не дійшли до експортера: переповнення черги SDK
+        "bsp_dropped": max(written - exporter.exported - exporter.failed, 0),
+        "collector_queue_p50": percentile(load["samples"]["collector"], 50),
+        "collector_queue_max": max(load["samples"]["collector"], default=0),
+        "bsp_queue_p50": percentile(load["samples"]["exporter"], 50),
+        "bsp_queue_max": max(load["samples"]["exporter"], default=None),
+        "bsp_queue_capacity": args.bsp_max_queue_size,
+        "export_calls": len(exporter.calls),
+        "export_batch_mean": round(statistics.mean(batch_sizes), 1) if batch_sizes else None,
+        "export_ms_p50": percentile(export_ms, 50),
+        "export_ms_p99": percentile(export_ms, 99),
+        "collector": {key: after.get(key, 0.0) - before.get(key, 0.0) for key in after},
+        "clickhouse_rows": probe.rows,
+        "ingest_lag_s_p50": percentile(probe.lag_samples, 50),
+        "ingest_lag_s_p99": percentile(probe.lag_samples, 99),
+        "drain_seconds": round(drain_seconds, 1),
+        "export_calls_raw": exporter.calls
+    }
+    result["lost"] = (result["collector_queue_dropped"] + result["bsp_dropped"] + exporter.failed
+                      + max(exporter.exported - probe.rows, 0))
+    return result
+
+
+def power_of_two(value: float, low: int, high: int) -> int:
+    return int(min(max(2 ** math.ceil(math.log2(max(value, 1))), low), high))
+
+
+def suggest_bsp(results: List[Dict[str, Any]], target_rate: float) -> Dict[str, Any]:
+    """
+    Рекомендовані налаштування BatchSpanProcessor для target_rate спанів/с.
+    Час експорту апроксимується як a + b * batch (один потік експорту), тож
+    пропускна здатність batch / (a + b * batch) має перевищувати target_rate із запасом.
+    """
+    calls = [call for result in results for call in result["export_calls_raw"]]
+    if not calls:
+        return {}
+
+    sizes = np.array([size for size, _ in calls], dtype=np.float64)
+    seconds = np.array([elapsed for _, elapsed in calls], dtype=np.float64)
+    if len(np.unique(sizes)) > 1:
+        b, a = np.polyfit(sizes, seconds, 1)
+        a, b = max(a, 0.0), max(b, 0.0)
+    else:
+        a, b = float(np.median(seconds)), 0.0
+
+    rate = target_rate * HEADROOM
+    suggestion: Dict[str, Any] = {
+        "target_rate": target_rate,
+        "export_fixed_ms": round(a * 1000, 3),
+        "export_per_span_ms": round(b * 1000, 4)
+    }
+
+    if rate * b >= 1:
+        # Навіть нескінченний батч не встигає: потрібне семплювання
+        suggestion["max_rate_single_exporter"] = round(1 / b) if b else None
+        suggestion["sample_rate"] = round(1 / (rate * b), 3)
+        rate = 0.9 / b
+
+    batch = power_of_two(rate * a / (1 - rate * b), 32, 4096)
+    p99_export = float(np.percentile(seconds, 99))
+    queue = power_of_two(max(rate * max(p99_export, a + b * batch) + batch, 2 * batch), 256, 65536)
+
+    suggestion.update({
+        "OTEL_BSP_MAX_EXPORT_BATCH_SIZE": batch,
+        "OTEL_BSP_MAX_QUEUE_SIZE": queue,
+        "OTEL_BSP_SCHEDULE_DELAY": int(min(max(1000 * batch / target_rate, 100), 1000)),
+        "OTEL_BSP_EXPORT_TIMEOUT": int(max(3000, 3 * p99_export * 1000))
+    })
+    return suggestion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end telemetry ingest throughput")
+    parser.add_argument("--rates", type=float, nargs="+", default=[200, 500, 1000, 2000])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per rate")
+    parser.add_argument("--producers", type=int, default=16)
+    parser.add_argument("--queue-size", type=int, default=1024, help="Collector record queue")
+    parser.add_argument("--bsp-max-queue-size", type=int, default=256)
+    parser.add_argument("--bsp-max-export-batch-size", type=int, default=32)
+    parser.add_argument("--bsp-schedule-delay", type=int, default=1000)
+    parser.add_argument("--bsp-export-timeout", type=int, default=3000)
+    parser.add_argument("--target-rate", type=float, default=None, help="Rate to size BSP settings for")
+    parser.add_argument("--otel-endpoint", default="http://localhost:30318")
+    parser.add_argument("--collector-metrics", default="http://localhost:30888/metrics")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--mean-objects", type=float, default=4.0)
+    parser.add_argument("--output", default=None, help="Save results as JSON")
+    args = parser.parse_args()
+
+    if not ClickHouseClient(source=SOURCE_OTEL_TRACES).test_connection():
+        raise SystemExit("❌ ClickHouse connection failed")
+
+    profile = SyntheticProfile(parse_class_mix(DEFAULT_CLASS_MIX), mean_objects=args.mean_objects, days=0)
+
+    results = []
+    for rate in sorted(args.rates):
+        print(f"\n🚀 {rate:.0f} predictions/s, {args.producers} producers, {args.duration:.0f}s")
+        result = run_rate(rate, args, profile)
+        results.append(result)
+        print(f"   achieved {result['achieved_rate']}/s | lost {result['lost']} "
+              f"(queue {result['collector_queue_dropped']}, bsp {result['bsp_dropped']}, "
+              f"export failed {result['spans_export_failed']}) | "
+              f"bsp queue max {result['bsp_queue_max']}/{result['bsp_queue_capacity']} | "
+              f"export p99 {result['export_ms_p99']} ms | "
+              f"lag p99 {result['ingest_lag_s_p99']} s | drain {result['drain_seconds']} s")
+        if result["collector"]:
+            print(f"   collector: {', '.join(f'{k}={v:.0f}' for k, v in result['collector'].items())}")
+
+    sustainable = [r["target_rate"] for r in results
+                   if not r["lost"] and r["achieved_rate"] >= 0.95 * r["target_rate"]]
+    dropping = [r["target_rate"] for r in results if r["lost"]]
+    print(f"\n📊 Max sustainable rate: {max(sustainable) if sustainable else 'none'} predictions/s")
+    if dropping:
+        print(f"❌ Data loss starts at {min(dropping):.0f} predictions/s")
+
+    target_rate = args.target_rate or max(args.rates)
+    suggestion = suggest_bsp(results, target_rate)
+    if suggestion:
+        print(f"\n💡 BatchSpanProcessor for {target_rate:.0f} spans/s "
+              f"(export ≈ {suggestion['export_fixed_ms']} ms + {suggestion['export_per_span_ms']} ms/span):")
+        for key, value in suggestion.items():
+            if key.startswith("OTEL_BSP_"):
+                print(f"   {key}={value}")
+        if "sample_rate" in suggestion:
+            print(f"   ⚠️  One exporter thread tops out at ~{suggestion['max_rate_single_exporter']} spans/s, "
+                  f"consider OTEL_SAMPLE_RATE={suggestion['sample_rate']}")
+
+    if args.output:
+        for result in results:
+            result.pop("export_calls_raw")
+        with open(args.output, "w") as f:
+            json.dump({"created_at": datetime.now().isoformat(), "args": vars(args),
+                       "results": results, "suggestion": suggestion}, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
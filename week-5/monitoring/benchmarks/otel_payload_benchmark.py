@@ -0,0 +1,134 @@
+"""
+Бенчмарк форматів запису передбачень YOLO в OpenTelemetry.
+
+Порівнює режим "events" (подія на кожен об'єкт) з режимом "compact"
+(масиви в атрибутах спану + OTLP гістограми): розмір OTLP payload,
+час побудови спану, час кодування та обсяг даних для ClickHouse.
+
+Запуск (з директорії week-5):
+    python -m monitoring.benchmarks.otel_payload_benchmark --predictions 2000
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+from opentelemetry.exporter.otlp.proto.common.metrics_encoder import encode_metrics
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from monitoring.otel_collector import (
+    YOLOOpenTelemetryCollector, RECORDING_EVENTS, RECORDING_COMPACT
+)
+
+CLASSES = ["car", "person", "truck", "bus", "bicycle", "motorcycle", "traffic light"]
+
+
+def make_records(count: int, mean_objects: float, seed: int) -> List[Dict[str, Any]]:
+    """Генерує синтетичні записи передбачень"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        objects = max(0, int(rng.gauss(mean_objects, mean_objects / 2)))
+        detections = []
+        for _ in range(objects):
+            x1, y1 = rng.uniform(0, 600), rng.uniform(0, 400)
+            detections.append({
+                "bbox": [x1, y1, x1 + rng.uniform(10, 200), y1 + rng.uniform(10, 200)],
+                "confidence": rng.uniform(0.25, 0.99),
+                "class_name": rng.choice(CLASSES)
+            })
+        records.append({
+            "prediction_id": str(uuid.uuid4()),
+            "start_time_ns": time.time_ns(),
+            "timestamp": datetime.now().isoformat(),
+            "processing_time_ms": rng.uniform(20, 120),
+            "image_width": 640,
+            "image_height": 480,
+            "detections": detections,
+            "filename": "benchmark.jpg",
+            "model_name": "yolo11n",
+            "error": None,
+            "sampling_weight": 1.0,
+            "sampling_reason": "head"
+        })
+    return records
+
+
+def run_mode(mode: str, records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Прогоняє записи через колектор у заданому режимі та міряє вартість"""
+    span_exporter = InMemorySpanExporter()
+    metric_reader = InMemoryMetricReader()
+    collector = YOLOOpenTelemetryCollector(
+        service_name="yolo-benchmark",
+        recording_mode=mode,
+        span_exporter=span_exporter,
+        metric_reader=metric_reader
+    )
+
+    # Час запису передбачення: гістограми (компактний режим) та побудова спану фоновим потоком
+    start = time.perf_counter()
+    for record in records:
+        collector._record_metrics(record)
+        collector._write_span(record)
+    build_seconds = time.perf_counter() - start
+
+    collector.tracer_provider.force_flush()
+    spans = span_exporter.get_finished_spans()
+
+    # Час та розмір кодування OTLP (робота експортера)
+    start = time.perf_counter()
+    span_bytes = len(encode_spans(spans).SerializeToString())
+    encode_seconds = time.perf_counter() - start
+
+    metric_bytes = 0
+    if mode == RECORDING_COMPACT:
+        metric_bytes = len(encode_metrics(metric_reader.get_metrics_data()).SerializeToString())
+
+    # Обсяг для ClickHouse: рядки Events та записи в Map-колонках
+    events = sum(len(span.events) for span in spans)
+    map_entries = sum(
+        len(span.attributes) + sum(len(event.attributes) for event in span.events)
+        for span in spans
+    )
+
+    collector.close()
+
+    n = len(records)
+    return {
+        "bytes_per_prediction": (span_bytes + metric_bytes) / n,
+        "span_bytes_per_prediction": span_bytes / n,
+        "metric_bytes_per_prediction": metric_bytes / n,
+        "build_us_per_prediction": build_seconds / n * 1e6,
+        "encode_us_per_prediction": encode_seconds / n * 1e6,
+        "events_per_prediction": events / n,
+        "map_entries_per_prediction": map_entries / n
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OTLP payload benchmark: events vs compact")
+    parser.add_argument("--predictions", type=int, default=2000)
+    parser.add_argument("--mean-objects", type=float, default=6.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    records = make_records(args.predictions, args.mean_objects, args.seed)
+
+    results = {mode: run_mode(mode, records) for mode in (RECORDING_EVENTS, RECORDING_COMPACT)}
+
+    print(f"\n📊 {args.predictions} predictions, ~{args.mean_objects} objects each")
+    print(f"{'metric':<30}{'events':>14}{'compact':>14}{'ratio':>10}")
+    for key in results[RECORDING_EVENTS]:
+        events_value = results[RECORDING_EVENTS][key]
+        compact_value = results[RECORDING_COMPACT][key]
+        ratio = compact_value / events_value if events_value else 0.0
+        print(f"{key:<30}{events_value:>14.2f}{compact_value:>14.2f}{ratio:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
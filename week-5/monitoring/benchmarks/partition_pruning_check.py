@@ -0,0 +1,129 @@
+"""
+Перевірка відсікання партицій для запитів ClickHouseClient.
+
+Перехоплює запити, які будують методи клієнта (ті самі тексти та параметри),
+виконує для кожного EXPLAIN indexes = 1 і показує, скільки партів
+залишилось після індексів MinMax / Partition / PrimaryKey / Skip.
+Запит вважається таким, що відсікає партиції, якщо умова MinMax або
+Partition індексу не вироджується в true.
+
+Запуск (з директорії week-5, ClickHouse з docker-compose):
+    python -m monitoring.benchmarks.partition_pruning_check --source otel_traces
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+# Модулі аналізу дрейфу запускаються як скрипти з директорії evidently
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "evidently"))
+
+from clickhouse_client import ClickHouseClient, SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS  # noqa: E402
+
+INDEX_STAGES = ("MinMax", "Min-Max", "Partition", "PrimaryKey", "Skip")
+PRUNING_STAGES = ("MinMax", "Min-Max", "Partition")
+
+
+class RecordingClient(ClickHouseClient):
+    """Клієнт, який лише записує запити замість їх виконання"""
+
+    def __init__(self, source: str):
+        super().__init__(source=source, export_format="native")
+        self.recorded: List[Tuple[str, Dict[str, Any]]] = []
+
+    def _execute(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        self.recorded.append((query, params or {}))
+        return []
+
+    def _iter_dataset_chunks(self, query: str, params: Optional[Dict[str, Any]] = None,
+                             chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        self.recorded.append((query, params or {}))
+        return iter(())
+
+
+def record_queries(source: str) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+    """Запити, які будують методи клієнта з часовими фільтрами"""
+    methods = {
+        "get_current_dataset": lambda c: c.get_current_dataset(),
+        "get_yolo_predictions_data(24h)": lambda c: c.get_yolo_predictions_data(hours_ago=24),
+        "get_class_distribution(24h)": lambda c: c.get_class_distribution(hours_ago=24),
+        "get_confidence_histogram(24h)": lambda c: c.get_confidence_histogram(hours_ago=24),
+        "get_latency_quantiles(24h)": lambda c: c.get_latency_quantiles(hours_ago=24),
+        "get_feature_sketch": lambda c: c.get_feature_sketch(),
+    }
+
+    recorded = {}
+    for name, call in methods.items():
+        client = RecordingClient(source)
+        try:
+            call(client)
+        except Exception:
+            # Порожні результати можуть ламати розбір, нам потрібні лише тексти запитів
+            pass
+        recorded[name] = client.recorded
+    return recorded
+
+
+def parse_explain(lines: List[str]) -> List[Dict[str, str]]:
+    """Розбирає блок Indexes з EXPLAIN indexes = 1"""
+    stages = []
+    for line in lines:
+        text = line.strip()
+        if text in INDEX_STAGES:
+            stages.append({"stage": text})
+        elif stages and ":" in text:
+            key, value = text.split(":", 1)
+            if key in ("Condition", "Parts", "Granules", "Name"):
+                stages[-1].setdefault(key.lower(), value.strip())
+    return stages
+
+
+def check_query(client: ClickHouseClient, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    rows = client._execute(f"EXPLAIN indexes = 1 {query}", params)
+    stages = parse_explain([row[0] for row in rows])
+
+    pruning = [s for s in stages if s["stage"] in PRUNING_STAGES]
+    prunes = any(s.get("condition", "true") != "true" for s in pruning)
+    return {"stages": stages, "prunes": prunes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN indexes = 1 for ClickHouseClient time-window queries")
+    parser.add_argument("--source", default=SOURCE_OTEL_TRACES, choices=[SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS])
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    client = ClickHouseClient(source=args.source, export_format="native")
+    if not client.test_connection():
+        raise SystemExit("❌ ClickHouse connection failed")
+
+    failed = 0
+    for name, queries in record_queries(args.source).items():
+        for query, params in queries:
+            # Rollup-таблиці мають власні партиції, перевіряємо лише запити до сирих даних
+            if client.table_name not in query:
+                continue
+
+            result = check_query(client, query, params)
+            failed += not result["prunes"]
+
+            summary = ", ".join(
+                f"{s['stage']}{'(' + s['name'] + ')' if 'name' in s else ''} {s.get('parts', '?')}"
+                for s in result["stages"]
+            )
+            print(f"{'✅' if result['prunes'] else '❌'} {name}: {summary}")
+            if args.verbose:
+                for stage in result["stages"]:
+                    print(f"      {stage}")
+
+    if failed:
+        print(f"\n❌ {failed} queries do not prune partitions by time")
+        sys.exit(1)
+    print("\n✅ All time-window queries prune partitions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+Генератор синтетичних передбачень YOLO для навантажувальних тестів.
+
+Пише реалістичні спани yolo_prediction (з подією object_detected на кожен
+об'єкт) та відповідні рядки yolo_predictions із заданим міксом класів,
+кількістю об'єктів і патерном дрифту. Два режими:
+  * clickhouse - генерація на сервері через INSERT ... SELECT FROM numbers(),
+    мільйони спанів за секунди без передачі рядків з Python;
+  * otlp - спани будує YOLOOpenTelemetryCollector і відправляє в OTLP колектор
+    із заданою швидкістю (перевірка всього конвеєра, лише otel_traces).
+
+Дрифт задається часткою вікна (--drift-start), після якої ознаки зсуваються:
+sudden - одразу повністю, gradual - лінійно до кінця вікна.
+
+Запуск (з директорії week-5, стек з docker-compose):
+    python -m monitoring.benchmarks.synthetic_spans --target clickhouse --spans 1000000 --drift gradual
+    python -m monitoring.benchmarks.synthetic_spans --target otlp --spans 20000 --rate 500
+"""
+
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Модулі аналізу дрейфу запускаються як скрипти з директорії evidently
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "evidently"))
+
+from clickhouse_client import ClickHouseClient  # noqa: E402
+from config import Config  # noqa: E402
+
+INIT_DIR = Path(__file__).resolve().parents[1] / "clickhouse" / "init"
+DEFAULT_DATABASE = "yolo_analytics"
+
+TARGET_CLICKHOUSE = "clickhouse"
+TARGET_OTLP = "otlp"
+
+DRIFT_NONE = "none"
+DRIFT_SUDDEN = "sudden"
+DRIFT_GRADUAL = "gradual"
+
+# Ознаки, які зсуває дрифт
+DRIFT_KINDS = ("confidence", "classes", "latency", "image")
+
+DEFAULT_CLASS_MIX = "car=0.45,person=0.25,truck=0.1,bus=0.05,bicycle=0.05,motorcycle=0.05,traffic light=0.05"
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+# Таблиці, які очищає reset (rollup-и заповнюються materialized views)
+TABLES = [
+    "otel_traces", "yolo_predictions",
+    "yolo_class_stats_1m", "yolo_prediction_stats_1m", "yolo_drift_scores"
+]
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def parse_class_mix(text: str) -> Dict[str, float]:
+    """'car=0.5,person=0.5' -> нормовані частки класів"""
+    mix = {}
+    for item in text.split(","):
+        name, _, share = item.partition("=")
+        mix[name.strip()] = float(share or 1.0)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("class mix must have positive shares")
+    return {name: share / total for name, share in mix.items()}
+
+
+class SyntheticProfile:
+    """
+    Параметри синтетичного трафіку. Одні й ті ж формули розподілів
+    використовуються в SQL (режим clickhouse) та в Python (режим otlp).
+    """
+
+    def __init__(self,
+                 class_mix: Dict[str, float],
+                 mean_objects: float = 4.0,
+                 days: float = 7.0,
+                 drift: str = DRIFT_NONE,
+                 drift_kinds: Optional[List[str]] = None,
+                 drift_start: float = 0.5,
+                 model_name: str = "yolo11n",
+                 service_name: str = "yolo-synthetic",
+                 seed: int = 42):
+        if drift not in (DRIFT_NONE, DRIFT_SUDDEN, DRIFT_GRADUAL):
+            raise ValueError(f"Unknown drift pattern: {drift}")
+        if not 0.0 <= drift_start < 1.0:
+            raise ValueError("drift_start must be in [0, 1)")
+
+        self.class_mix = class_mix
+        self.mean_objects = mean_objects
+        self.days = days
+        self.drift = drift
+        self.drift_kinds = list(drift_kinds or DRIFT_KINDS)
+        self.drift_start = drift_start
+        self.model_name = model_name
+        self.service_name = service_name
+        self.seed = seed
+
+        # Кінець вікна фіксується при створенні, тож догенерація лягає в те саме вікно
+        self.end = datetime.now()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "class_mix": self.class_mix,
+            "mean_objects": self.mean_objects,
+            "days": self.days,
+            "drift": self.drift,
+            "drift_kinds": self.drift_kinds if self.drift != DRIFT_NONE else [],
+            "drift_start": self.drift_start,
+            "model_name": self.model_name,
+            "seed": self.seed
+        }
+
+    def _weight(self, kind: str) -> float:
+        return 1.0 if self.drift != DRIFT_NONE and kind in self.drift_kinds else 0.0
+
+    # --- Python (режим otlp) ---
+
+    def drift_factor(self, position: float) -> float:
+        """Сила дрифту 0..1 для позиції в часовому вікні (0 - початок, 1 - кінець)"""
+        if self.drift == DRIFT_SUDDEN:
+            return 1.0 if position >= self.drift_start else 0.0
+        if self.drift == DRIFT_GRADUAL:
+            return max(0.0, (position - self.drift_start) / (1.0 - self.drift_start))
+        return 0.0
+
+    def make_record(self, rng: random.Random) -> Dict[str, Any]:
+        """Запис передбачення у форматі черги YOLOOpenTelemetryCollector"""
+        position = rng.random()
+        f = self.drift_factor(position)
+        start = self.end - timedelta(days=self.days * (1.0 - position))
+
+        width, height = RESOLUTIONS[rng.randrange(len(RESOLUTIONS))]
+        names = list(self.class_mix)
+        cumulative = []
+        total = 0.0
+        for share in self.class_mix.values():
+            total += share
+            cumulative.append(total)
+
+        detections = []
+        for _ in range(int(rng.random() * (2 * self.mean_objects + 1))):
+            u = rng.random() ** (1 + 2 * f * self._weight("classes"))
+            class_name = next((n for n, c in zip(names, cumulative) if u < c), names[-1])
+            confidence = 0.35 + 0.64 * rng.random() ** 0.6 - 0.3 * f * self._weight("confidence")
+            x1 = rng.random() * (width - 20)
+            y1 = rng.random() * (height - 20)
+            detections.append({
+                "class_name": class_name,
+                "confidence": min(max(confidence, 0.05), 0.99),
+                "bbox": [x1, y1, min(x1 + 10 + rng.random() * 200, width), min(y1 + 10 + rng.random() * 200, height)]
+            })
+
+        brightness = (60 + 140 * rng.random()) * (1 - 0.5 * f * self._weight("image"))
+        weights = [max(0.01, 1 - abs((j + 0.5) * 32 - brightness) / 64) for j in range(8)]
+        processing_time_ms = (30 + 70 * rng.random() ** 2) * (1 + 2 * f * self._weight("latency"))
+
+        return {
+            "prediction_id": str(uuid.uuid4()),
+            "start_time_ns": int(start.timestamp() * 1e9),
+            "timestamp": start.isoformat(),
+            "processing_time_ms": processing_time_ms,
+            "image_width": width,
+            "image_height": height,
+            "detections": detections,
+            "filename": "synthetic.jpg",
+            "model_name": self.model_name,
+            "error": None,
+            "sampling_weight": 1.0,
+            "sampling_reason": "synthetic",
+            "image_stats": {
+                "brightness": round(brightness, 2),
+                "contrast": round(20 + 50 * rng.random(), 2),
+                "blur": round((50 + 950 * rng.random()) * (1 - 0.8 * f * self._weight("image")), 2),
+                "brightness_hist": [round(w / sum(weights), 4) for w in weights]
+            }
+        }
+
+    # --- SQL (режим clickhouse) ---
+
+    def _uniform(self, tag: str, index: str = "") -> str:
+        """Детермінований рівномірний розподіл [0, 1) від номера рядка"""
+        extra = f", {index}" if index else ""
+        return f"(cityHash64({int(self.seed)}, number, '{tag}'{extra}) % 1000000) / 1000000."
+
+    def _factor_sql(self) -> str:
+        if self.drift == DRIFT_SUDDEN:
+            return f"if(position >= {self.drift_start}, 1., 0.)"
+        if self.drift == DRIFT_GRADUAL:
+            return f"greatest(0., (position - {self.drift_start}) / {1.0 - self.drift_start})"
+        return "0."
+
+    def _class_sql(self) -> str:
+        branches = []
+        total = 0.0
+        names = list(self.class_mix)
+        for name in names[:-1]:
+            total += self.class_mix[name]
+            branches.append(f"u < {total!r}, {self._quote(name)}")
+        branches.append(self._quote(names[-1]))
+        return "multiIf(" + ", ".join(branches) + ")" if len(branches) > 1 else branches[0]
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+    def predictions_sql(self, offset: int, count: int) -> str:
+        """
+        Підзапит передбачень з масивами детекцій для номерів [offset, offset + count).
+        Номер рядка однозначно визначає передбачення, тож otel_traces та
+        yolo_predictions отримують однакові дані.
+        """
+        window_ms = int(self.days * 86400 * 1000)
+        max_objects = int(2 * self.mean_objects + 1)
+        widths = [w for w, _ in RESOLUTIONS]
+        heights = [h for _, h in RESOLUTIONS]
+
+        return f"""
+        SELECT
+            number,
+            {self._uniform('t')} AS position,
+            {self._factor_sql()} AS f,
+            toDateTime64({{end:String}}, 3) - toIntervalMillisecond(toUInt64((1 - position) * {window_ms})) AS ts,
+            reinterpretAsUUID(concat(
+                reinterpretAsString(cityHash64({int(self.seed)}, number, 'id1')),
+                reinterpretAsString(cityHash64({int(self.seed)}, number, 'id2')))) AS prediction_id,
+            toUInt16(floor({self._uniform('n')} * {max_objects})) AS n,
+            1 + cityHash64({int(self.seed)}, number, 'r') % {len(RESOLUTIONS)} AS resolution,
+            toUInt16(arrayElement({widths}, resolution)) AS width,
+            toUInt16(arrayElement({heights}, resolution)) AS height,
+            (30 + 70 * pow({self._uniform('p')}, 2)) * (1 + 2 * f * {self._weight('latency')}) / 1000 AS processing_time,
+            round((60 + 140 * {self._uniform('b')}) * (1 - 0.5 * f * {self._weight('image')}), 2) AS brightness,
+            round(20 + 50 * {self._uniform('k')}, 2) AS contrast,
+            round((50 + 950 * {self._uniform('s')}) * (1 - 0.8 * f * {self._weight('image')}), 2) AS blur,
+            arrayMap(j -> greatest(0.01, 1 - abs((j + 0.5) * 32 - brightness) / 64), range(8)) AS hist_weights,
+            arrayMap(w -> round(w / arraySum(hist_weights), 4), hist_weights) AS brightness_hist,
+            arrayMap(u -> {self._class_sql()},
+                arrayMap(i -> pow({self._uniform('c', 'i')}, 1 + 2 * f * {self._weight('classes')}), range(n))) AS classes,
+            arrayMap(i -> least(0.99, greatest(0.05,
+                0.35 + 0.64 * pow({self._uniform('q', 'i')}, 0.6) - 0.3 * f * {self._weight('confidence')})),
+                range(n)) AS confidences,
+            arrayMap(i -> {self._uniform('x', 'i')} * (width - 20), range(n)) AS x1s,
+            arrayMap(i -> {self._uniform('y', 'i')} * (height - 20), range(n)) AS y1s,
+            arrayMap(i -> least(x1s[i + 1] + 10 + 200 * {self._uniform('w', 'i')}, width), range(n)) AS x2s,
+            arrayMap(i -> least(y1s[i + 1] + 10 + 200 * {self._uniform('h', 'i')}, height), range(n)) AS y2s,
+            concat('synthetic_', toString(number), '.jpg') AS filename
+        FROM numbers({int(offset)}, {int(count)})
+        """
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            'end': self.end.strftime(TIME_FORMAT),
+            'model_name': self.model_name,
+            'service_name': self.service_name
+        }
+
+
+def otel_insert_sql(database: str, predictions: str) -> str:
+    """INSERT спанів у форматі clickhouseexporter (подія на кожен об'єкт)"""
+    return f"""
+    INSERT INTO {database}.otel_traces
+        (Timestamp, TraceId, SpanId, ParentSpanId, TraceState, SpanName, SpanKind, ServiceName,
+         ResourceAttributes, ScopeName, ScopeVersion, SpanAttributes, Duration, StatusCode, StatusMessage,
+         `Events.Timestamp`, `Events.Name`, `Events.Attributes`)
+    SELECT
+        ts,
+        replaceAll(toString(prediction_id), '-', ''),
+        lower(leftPad(hex(cityHash64(number, 'span')), 16, '0')),
+        '', '', 'yolo_prediction', 'Internal', {{service_name:String}},
+        map('service.name', {{service_name:String}}, 'service.instance.id', 'synthetic'),
+        'monitoring.otel_collector', '',
+        map(
+            'prediction_id', toString(prediction_id),
+            'timestamp', toString(ts),
+            'processing_time_seconds', toString(processing_time),
+            'image_width', toString(width),
+            'image_height', toString(height),
+            'total_objects', toString(n),
+            'filename', filename,
+            'model_name', {{model_name:String}},
+            'sampling_weight', '1',
+            'sampling_reason', 'synthetic',
+            'image_brightness', toString(brightness),
+            'image_contrast', toString(contrast),
+            'image_blur', toString(blur),
+            'image_brightness_hist', toString(brightness_hist)
+        ),
+        toUInt64(processing_time * 1e9),
+        'Unset', '',
+        arrayMap(i -> ts, range(n)),
+        arrayMap(i -> 'object_detected', range(n)),
+        arrayMap(i -> map(
+            'object_index', toString(i),
+            'class_name', classes[i + 1],
+            'confidence', toString(confidences[i + 1]),
+            'bbox_x1', toString(x1s[i + 1]),
+            'bbox_y1', toString(y1s[i + 1]),
+            'bbox_x2', toString(x2s[i + 1]),
+            'bbox_y2', toString(y2s[i + 1])
+        ), range(n))
+    FROM ({predictions})
+    """
+
+
+def predictions_insert_sql(database: str, predictions: str) -> str:
+    """INSERT у yolo_predictions: рядок на детекцію, object_index = -1 для передбачень без об'єктів"""
+    return f"""
+    INSERT INTO {database}.yolo_predictions
+        (timestamp, prediction_id, model_name, filename, class_name, object_index, confidence,
+         bbox_x1, bbox_y1, bbox_x2, bbox_y2, processing_time_seconds, total_objects,
+         image_width, image_height, sampling_weight,
+         image_brightness, image_contrast, image_blur, image_brightness_hist)
+    SELECT
+        ts, prediction_id, {{model_name:String}}, filename,
+        if(object_index < 0, '', classes[object_index + 1]),
+        object_index,
+        if(object_index < 0, 0., confidences[object_index + 1]),
+        if(object_index < 0, 0., x1s[object_index + 1]),
+        if(object_index < 0, 0., y1s[object_index + 1]),
+        if(object_index < 0, 0., x2s[object_index + 1]),
+        if(object_index < 0, 0., y2s[object_index + 1]),
+        processing_time, n, width, height, 1,
+        brightness, contrast, blur, brightness_hist
+    FROM ({predictions})
+    ARRAY JOIN if(n = 0, [-1], arrayMap(i -> toInt16(i), range(n))) AS object_index
+    """
+
+
+def create_schema(client: ClickHouseClient, database: str):
+    """Створює таблиці з clickhouse/init у вказаній базі (для окремої бази бенчмарку)"""
+    for path in sorted(INIT_DIR.glob("*.sql")):
+        text = "\n".join(line for line in path.read_text().splitlines() if not line.strip().startswith("--"))
+        text = text.replace(f"{DEFAULT_DATABASE}.", f"{database}.").replace(
+            f"DATABASE IF NOT EXISTS {DEFAULT_DATABASE}", f"DATABASE IF NOT EXISTS {database}")
+        for statement in text.split(";"):
+            if statement.strip():
+                client._execute(statement)
+
+
+def reset_tables(client: ClickHouseClient, database: str):
+    """Очищає таблиці бенчмарку; робоча база yolo_analytics захищена"""
+    if database == DEFAULT_DATABASE:
+        raise ValueError(f"Refusing to truncate tables in {DEFAULT_DATABASE}")
+    for table in TABLES:
+        client._execute(f"TRUNCATE TABLE IF EXISTS {database}.{table}")
+
+
+def generate_clickhouse(client: ClickHouseClient,
+                        profile: SyntheticProfile,
+                        spans: int,
+                        offset: int = 0,
+                        chunk_spans: int = 1_000_000,
+                        database: Optional[str] = None) -> float:
+    """
+    Генерує spans передбачень на сервері частинами по chunk_spans (обмежує пам'ять
+    INSERT ... SELECT). Повертає час генерації в секундах.
+    """
+    database = database or Config.CLICKHOUSE_DATABASE
+    start = time.perf_counter()
+
+    for chunk_offset in range(offset, offset + spans, chunk_spans):
+        count = min(chunk_spans, offset + spans - chunk_offset)
+        predictions = profile.predictions_sql(chunk_offset, count)
+        client._execute(otel_insert_sql(database, predictions), profile.params())
+        client._execute(predictions_insert_sql(database, predictions), profile.params())
+        print(f"   ... {chunk_offset + count - offset:,}/{spans:,} spans")
+
+    return time.perf_counter() - start
+
+
+def generate_otlp(profile: SyntheticProfile, spans: int, rate: float, endpoint: str) -> float:
+    """
+    Відправляє spans передбачень через YOLOOpenTelemetryCollector в OTLP колектор
+    зі швидкістю rate спанів/с (0 - без обмеження). Повертає фактичну швидкість.
+    """
+    from monitoring.otel_collector import YOLOOpenTelemetryCollector
+
+    collector = YOLOOpenTelemetryCollector(
+        service_name=profile.service_name,
+        otel_endpoint=endpoint,
+        image_stats=False
+    )
+    rng = random.Random(profile.seed)
+
+    start = time.perf_counter()
+    for i in range(spans):
+        collector._write_span(profile.make_record(rng))
+        if rate:
+            delay = start + (i + 1) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    collector.tracer_provider.force_flush()
+    elapsed = time.perf_counter() - start
+    collector.close()
+    return spans / elapsed if elapsed else 0.0
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """Аргументи профілю трафіку (спільні з бенчмарком запитів)"""
+    parser.add_argument("--class-mix", default=DEFAULT_CLASS_MIX, help="name=share,... (normalized)")
+    parser.add_argument("--mean-objects", type=float, default=4.0)
+    parser.add_argument("--days", type=float, default=7.0, help="Time window the spans are spread over")
+    parser.add_argument("--drift", default=DRIFT_NONE, choices=[DRIFT_NONE, DRIFT_SUDDEN, DRIFT_GRADUAL])
+    parser.add_argument("--drift-kinds", nargs="+", default=list(DRIFT_KINDS), choices=DRIFT_KINDS)
+    parser.add_argument("--drift-start", type=float, default=0.5, help="Window fraction where drift begins")
+    parser.add_argument("--model-name", default="yolo11n")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def profile_from_args(args: argparse.Namespace) -> SyntheticProfile:
+    return SyntheticProfile(
+        class_mix=parse_class_mix(args.class_mix),
+        mean_objects=args.mean_objects,
+        days=args.days,
+        drift=args.drift,
+        drift_kinds=args.drift_kinds,
+        drift_start=args.drift_start,
+        model_name=args.model_name,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic YOLO prediction spans for load testing")
+    parser.add_argument("--target", default=TARGET_CLICKHOUSE, choices=[TARGET_CLICKHOUSE, TARGET_OTLP])
+    parser.add_argument("--spans", type=int, default=1_000_000)
+    parser.add_argument("--database", default=Config.CLICKHOUSE_DATABASE)
+    parser.add_argument("--offset", type=int, default=0, help="First span number (to append more data)")
+    parser.add_argument("--chunk-spans", type=int, default=1_000_000)
+    parser.add_argument("--reset", action="store_true", help="Truncate tables first (not allowed for yolo_analytics)")
+    parser.add_argument("--rate", type=float, default=500.0, help="OTLP target: spans per second (0 = unlimited)")
+    parser.add_argument("--otel-endpoint", default="http://localhost:4318")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    profile = profile_from_args(args)
+
+    if args.target == TARGET_OTLP:
+        print(f"📤 Sending {args.spans:,} spans to {args.otel_endpoint} at {args.rate or 'max'} spans/s")
+        achieved = generate_otlp(profile, args.spans, args.rate, args.otel_endpoint)
+        print(f"✅ Sent {args.spans:,} spans ({achieved:.0f} spans/s)")
+        return
+
+    Config.CLICKHOUSE_DATABASE = args.database
+    client = ClickHouseClient()
+    if not client.test_connection():
+        raise SystemExit("❌ ClickHouse connection failed")
+
+    if args.database != DEFAULT_DATABASE:
+        create_schema(client, args.database)
+    if args.reset:
+        reset_tables(client, args.database)
+
+    print(f"📥 Generating {args.spans:,} spans into {args.database} ({profile.drift} drift)")
+    seconds = generate_clickhouse(client, profile, args.spans, args.offset, args.chunk_spans, args.database)
+    print(f"✅ Generated {args.spans:,} spans in {seconds:.1f}s ({args.spans / seconds:,.0f} spans/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+-- Керована схема таблиці спанів otel_traces (у колекторі create_schema: false).
+-- Колонки сумісні з clickhouseexporter, додатково:
+--   * денні партиції: запити вікна часу (Timestamp >= now() - N днів) читають лише потрібні дні;
+--   * ключ сортування починається з SpanName, бо всі запити фільтрують SpanName = 'yolo_prediction';
+--   * ModelName матеріалізується з SpanAttributes для skip-індексу та фільтрів за моделлю;
+--   * TTL: через 3 дні перестиснення ZSTD(9), через 14 днів перенесення на том cold,
+--     через 30 днів видалення цілих партицій (ttl_only_drop_parts).
+-- Змінити терміни на існуючій таблиці: ALTER TABLE yolo_analytics.otel_traces MODIFY TTL ...
+CREATE DATABASE IF NOT EXISTS yolo_analytics;
+
+CREATE TABLE IF NOT EXISTS yolo_analytics.otel_traces
+(
+    Timestamp DateTime64(9) CODEC(Delta, ZSTD(1)),
+    TraceId String CODEC(ZSTD(1)),
+    SpanId String CODEC(ZSTD(1)),
+    ParentSpanId String CODEC(ZSTD(1)),
+    TraceState String CODEC(ZSTD(1)),
+    SpanName LowCardinality(String) CODEC(ZSTD(1)),
+    SpanKind LowCardinality(String) CODEC(ZSTD(1)),
+    ServiceName LowCardinality(String) CODEC(ZSTD(1)),
+    ResourceAttributes Map(LowCardinality(String), String) CODEC(ZSTD(1)),
+    ScopeName String CODEC(ZSTD(1)),
+    ScopeVersion String CODEC(ZSTD(1)),
+    SpanAttributes Map(LowCardinality(String), String) CODEC(ZSTD(1)),
+    Duration UInt64 CODEC(ZSTD(1)),
+    StatusCode LowCardinality(String) CODEC(ZSTD(1)),
+    StatusMessage String CODEC(ZSTD(1)),
+    Events Nested
+    (
+        Timestamp DateTime64(9),
+        Name LowCardinality(String),
+        Attributes Map(LowCardinality(String), String)
+    ) CODEC(ZSTD(1)),
+    Links Nested
+    (
+        TraceId String,
+        SpanId String,
+        TraceState String,
+        Attributes Map(LowCardinality(String), String)
+    ) CODEC(ZSTD(1)),
+
+    ModelName LowCardinality(String) MATERIALIZED SpanAttributes['model_name'] CODEC(ZSTD(1)),
+
+    INDEX idx_trace_id TraceId TYPE bloom_filter(0.001) GRANULARITY 1,
+    INDEX idx_span_name SpanName TYPE set(100) GRANULARITY 4,
+    INDEX idx_model_name ModelName TYPE set(100) GRANULARITY 4,
+    INDEX idx_span_attr_key mapKeys(SpanAttributes) TYPE bloom_filter(0.01) GRANULARITY 1,
+    INDEX idx_span_attr_value mapValues(SpanAttributes) TYPE bloom_filter(0.01) GRANULARITY 1,
+    INDEX idx_duration Duration TYPE minmax GRANULARITY 1
+)
+ENGINE = MergeTree
+PARTITION BY toDate(Timestamp)
+ORDER BY (SpanName, ServiceName, toDateTime(Timestamp))
+TTL toDateTime(Timestamp) + INTERVAL 3 DAY RECOMPRESS CODEC(ZSTD(9)),
+    toDateTime(Timestamp) + INTERVAL 14 DAY TO VOLUME 'cold',
+    toDateTime(Timestamp) + INTERVAL 30 DAY DELETE
+SETTINGS storage_policy = 'hot_cold', ttl_only_drop_parts = 1, index_granularity = 8192;
@@ -0,0 +1,35 @@
+-- Типізована таблиця передбачень YOLO: один рядок на детекцію.
+-- Передбачення без об'єктів зберігається одним рядком з object_index = -1,
+-- тому кожне передбачення має рівно один рядок з object_index <= 0.
+CREATE DATABASE IF NOT EXISTS yolo_analytics;
+
+CREATE TABLE IF NOT EXISTS yolo_analytics.yolo_predictions
+(
+    timestamp               DateTime64(3) CODEC(Delta, ZSTD(1)),
+    prediction_id           UUID,
+    model_name              LowCardinality(String),
+    filename                String CODEC(ZSTD(1)),
+    class_name              LowCardinality(String),
+    object_index            Int16,
+    confidence              Float32,
+    bbox_x1                 Float32,
+    bbox_y1                 Float32,
+    bbox_x2                 Float32,
+    bbox_y2                 Float32,
+    processing_time_seconds Float32,
+    total_objects           UInt16,
+    image_width             UInt16,
+    image_height            UInt16,
+    sampling_weight         Float32 DEFAULT 1,
+    -- Статистики зображення (monitoring/image_stats.py), NULL якщо вимкнені
+    image_brightness        Nullable(Float32),
+    image_contrast          Nullable(Float32),
+    image_blur              Nullable(Float32),
+    image_brightness_hist   Array(Float32)
+)
+ENGINE = MergeTree
+PARTITION BY toDate(timestamp)
+ORDER BY (toStartOfHour(timestamp), class_name, timestamp)
+-- Вікно дедуплікації вставок: повторна вставка з тим самим insert_deduplication_token
+-- (дозавантаження спулу, monitoring/telemetry_spool.py) ігнорується
+SETTINGS non_replicated_deduplication_window = 1000;
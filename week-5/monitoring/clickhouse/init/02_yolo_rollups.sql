@@ -0,0 +1,71 @@
+-- Похвилинні rollup-агрегати по моделі та класу, що підтримуються materialized views
+-- під час вставки в yolo_predictions. Клієнт та дашборди читають їх замість сирих рядків,
+-- тому час оновлення не росте з історією. Усі лічильники перезважені sampling_weight.
+
+-- Статистика детекцій за класами: кількість, сума впевненості та гістограма
+-- впевненості з 10 кошиків по 0.1 (кошик 10 = [0.9, 1.0]).
+CREATE TABLE IF NOT EXISTS yolo_analytics.yolo_class_stats_1m
+(
+    minute             DateTime,
+    model_name         LowCardinality(String),
+    class_name         LowCardinality(String),
+    detections         SimpleAggregateFunction(sum, Float64),
+    confidence_sum     SimpleAggregateFunction(sum, Float64),
+    confidence_buckets AggregateFunction(sumForEach, Array(Float64))
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY toDate(minute)
+ORDER BY (minute, model_name, class_name);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS yolo_analytics.yolo_class_stats_1m_mv
+TO yolo_analytics.yolo_class_stats_1m AS
+SELECT
+    toStartOfMinute(timestamp) AS minute,
+    model_name,
+    class_name,
+    sum(sampling_weight) AS detections,
+    sum(confidence * sampling_weight) AS confidence_sum,
+    sumForEachState(arrayMap(
+        i -> if(i = least(toUInt8(floor(confidence * 10)), 9), toFloat64(sampling_weight), 0.),
+        range(10)
+    )) AS confidence_buckets
+FROM yolo_analytics.yolo_predictions
+WHERE object_index >= 0
+GROUP BY minute, model_name, class_name;
+
+-- Статистика передбачень за моделями: кількість, сумарний час обробки
+-- та стан квантилів затримки. Кожне передбачення має один рядок з object_index <= 0.
+-- prediction_ids - стан оцінки унікальних prediction_id (повтори зі спулу рахуються один раз).
+CREATE TABLE IF NOT EXISTS yolo_analytics.yolo_prediction_stats_1m
+(
+    minute                  DateTime,
+    model_name              LowCardinality(String),
+    predictions             SimpleAggregateFunction(sum, Float64),
+    sampled_predictions     SimpleAggregateFunction(sum, UInt64),
+    prediction_ids          AggregateFunction(uniqCombined, UUID),
+    zero_object_predictions SimpleAggregateFunction(sum, Float64),
+    processing_time_sum     SimpleAggregateFunction(sum, Float64),
+    first_seen              SimpleAggregateFunction(min, DateTime64(3)),
+    last_seen               SimpleAggregateFunction(max, DateTime64(3)),
+    latency_quantiles       AggregateFunction(quantilesTDigestWeighted(0.5, 0.9, 0.99), Float32, UInt32)
+)
+ENGINE = AggregatingMergeTree
+PARTITION BY toDate(minute)
+ORDER BY (minute, model_name);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS yolo_analytics.yolo_prediction_stats_1m_mv
+TO yolo_analytics.yolo_prediction_stats_1m AS
+SELECT
+    toStartOfMinute(timestamp) AS minute,
+    model_name,
+    sum(sampling_weight) AS predictions,
+    count() AS sampled_predictions,
+    uniqCombinedState(prediction_id) AS prediction_ids,
+    sumIf(sampling_weight, object_index = -1) AS zero_object_predictions,
+    sum(processing_time_seconds * sampling_weight) AS processing_time_sum,
+    min(timestamp) AS first_seen,
+    max(timestamp) AS last_seen,
+    quantilesTDigestWeightedState(0.5, 0.9, 0.99)(processing_time_seconds, toUInt32(greatest(round(sampling_weight), 1))) AS latency_quantiles
+FROM yolo_analytics.yolo_predictions
+WHERE object_index <= 0
+GROUP BY minute, model_name;
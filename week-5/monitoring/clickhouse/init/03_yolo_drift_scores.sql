@@ -0,0 +1,23 @@
+-- Оцінки дрифту від drift_monitor.py: рядок на (вікно, модель, клас, ознака) для кожного
+-- кінця вікна. ReplacingMergeTree робить повторну обробку вікна після рестарту ідемпотентною.
+-- class_name = 'all' - зріз по всій моделі.
+CREATE TABLE IF NOT EXISTS yolo_analytics.yolo_drift_scores
+(
+    window_end       DateTime,
+    window           LowCardinality(String),
+    model_name       LowCardinality(String),
+    class_name       LowCardinality(String),
+    feature          LowCardinality(String),
+    psi              Nullable(Float64),
+    jensen_shannon   Nullable(Float64),
+    ks_statistic     Nullable(Float64),
+    chi2_p_value     Nullable(Float64),
+    drift_detected   UInt8,
+    current_rows     UInt64,
+    reference_rows   UInt64,
+    computed_at      DateTime DEFAULT now()
+)
+ENGINE = ReplacingMergeTree(computed_at)
+PARTITION BY toYYYYMM(window_end)
+ORDER BY (window, model_name, class_name, feature, window_end)
+TTL window_end + INTERVAL 90 DAY;
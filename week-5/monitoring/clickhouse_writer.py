@@ -0,0 +1,162 @@
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+from clickhouse_driver import Client
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_COLUMNS = [
+    "timestamp", "prediction_id", "model_name", "filename", "class_name",
+    "object_index", "confidence", "bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2",
+    "processing_time_seconds", "total_objects", "image_width", "image_height",
+    "sampling_weight", "image_brightness", "image_contrast", "image_blur", "image_brightness_hist"
+]
+
+class ClickHousePredictionsWriter:
+    """
+    Батчевий запис передбачень YOLO напряму в типізовану таблицю yolo_predictions.
+    Рядки накопичуються в буфері та вставляються фоновим потоком
+    пакетами по batch_size або раз на flush_interval секунд.
+    """
+
+    def __init__(self,
+                 host: str = "clickhouse",
+                 port: int = 9000,
+                 user: str = "default",
+                 password: str = "",
+                 database: str = "yolo_analytics",
+                 table: str = "yolo_predictions",
+                 batch_size: int = 1000,
+                 flush_interval: float = 2.0,
+                 max_buffer_rows: int = 100000,
+                 spool: Optional[Any] = None):
+
+        self.client = Client(host=host, port=port, user=user, password=password, database=database)
+        self.table = f"{database}.{table}"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer_rows = max_buffer_rows
+
+        # Необов'язковий локальний спул (monitoring/telemetry_spool.py) замість відкидання рядків
+        self.spool = spool
+
+        self._buffer: List[tuple] = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Лічильники запису
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_spooled = 0
+        self.insert_errors = 0
+
+        self._worker = threading.Thread(target=self._flush_loop, name="clickhouse-predictions-writer", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def record_to_rows(record: Dict[str, Any]) -> List[tuple]:
+        """Перетворює запис передбачення колектора на рядки таблиці (рядок на детекцію)"""
+        timestamp = datetime.fromtimestamp(record["start_time_ns"] / 1e9)
+        prediction_id = uuid.UUID(record["prediction_id"])
+        detections = record["detections"]
+        stats = record.get("image_stats") or {}
+        common = (
+            record["processing_time_ms"] / 1000.0,
+            len(detections),
+            int(record["image_width"]),
+            int(record["image_height"]),
+            float(record.get("sampling_weight", 1.0)),
+            stats.get("brightness"),
+            stats.get("contrast"),
+            stats.get("blur"),
+            stats.get("brightness_hist", [])
+        )
+
+        if not detections:
+            return [(timestamp, prediction_id, record["model_name"], record["filename"], "",
+                     -1, 0.0, 0.0, 0.0, 0.0, 0.0) + common]
+
+        rows = []
+        for i, detection in enumerate(detections):
+            x1, y1, x2, y2 = detection.get('bbox', [0, 0, 0, 0])
+            rows.append((timestamp, prediction_id, record["model_name"], record["filename"],
+                         detection.get('class_name', 'unknown'), i,
+                         float(detection.get('confidence', 0.0)),
+                         float(x1), float(y1), float(x2), float(y2)) + common)
+        return rows
+
+    def write(self, record: Dict[str, Any]):
+        """Додає передбачення в буфер на вставку (не блокує)"""
+        rows = self.record_to_rows(record)
+        with self._cond:
+            if self._closed:
+                return
+            self._buffer.extend(rows)
+
+            # Обмежуємо буфер, якщо ClickHouse недоступний
+            overflow = len(self._buffer) - self.max_buffer_rows
+            if overflow > 0:
+                self._discard(self._buffer[:overflow])
+                del self._buffer[:overflow]
+
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+                closed = self._closed
+
+            if batch:
+                self._insert(batch)
+            if closed:
+                return
+
+    def _insert(self, rows: List[tuple]):
+        try:
+            self.client.execute(
+                f"INSERT INTO {self.table} ({', '.join(PREDICTION_COLUMNS)}) VALUES",
+                rows
+            )
+            self.rows_written += len(rows)
+        except Exception as e:
+            self.insert_errors += 1
+            self._discard(rows)
+            logger.error(f"ClickHouse insert failed: {e}")
+
+    def _discard(self, rows: List[tuple]):
+        """Рядки, які не вдалося записати: у спул, якщо він є, інакше відкидаються"""
+        if self.spool:
+            self.spool.append_rows(rows)
+            self.rows_spooled += len(rows)
+        else:
+            self.rows_dropped += len(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Повертає статистику запису.
+        """
+        return {
+            "table": self.table,
+            "buffered_rows": len(self._buffer),
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "rows_spooled": self.rows_spooled,
+            "insert_errors": self.insert_errors
+        }
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """
+        Дописує буфер та закриває з'єднання.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        self.client.disconnect()
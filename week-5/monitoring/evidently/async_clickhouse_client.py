@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from clickhouse_client import ClickHouseClient
+from config import Config
+from drift_state import FeatureSketch
+
+logger = logging.getLogger(__name__)
+
+# Скільки останніх замірів кожного запиту зберігається для квантилів
+TIMING_WINDOW = 1000
+
+
+class AsyncClickHouseClient:
+    """
+    Асинхронний клієнт ClickHouse з пулом з'єднань.
+
+    Кожне з'єднання - окремий ClickHouseClient (clickhouse_driver.Client не
+    потокобезпечний), запити виконуються в потоках пулу, тож незалежні запити
+    (зведення, розподіл класів, поточний набір для кількох моделей) йдуть паралельно.
+    Кількість потоків дорівнює кількості з'єднань: запит, що чекає на вільне
+    з'єднання, чекає в черзі виконавця, і цей час рахується окремо від виконання.
+    """
+
+    def __init__(self,
+                 pool_size: Optional[int] = None,
+                 query_timeout: Optional[float] = None,
+                 source: Optional[str] = None,
+                 export_format: Optional[str] = None):
+        self.pool_size = pool_size or Config.CLICKHOUSE_POOL_SIZE
+        self.query_timeout = query_timeout or Config.CLICKHOUSE_QUERY_TIMEOUT
+
+        self._clients = [ClickHouseClient(source, export_format) for _ in range(self.pool_size)]
+        self.source = self._clients[0].source
+        self._idle: "queue.Queue[ClickHouseClient]" = queue.Queue()
+        for client in self._clients:
+            self._idle.put(client)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="clickhouse-pool")
+
+        # Метрики за назвою запиту (методу ClickHouseClient)
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    async def __aenter__(self) -> "AsyncClickHouseClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _record(self, name: str, wait: float, duration: Optional[float], outcome: str):
+        """Оновлює метрики запиту: outcome - ok, error або timeout"""
+        with self._stats_lock:
+            stats = self._stats.setdefault(name, {
+                'calls': 0, 'errors': 0, 'timeouts': 0,
+                'wait_seconds': 0.0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                'recent': deque(maxlen=TIMING_WINDOW)
+            })
+            if outcome == 'timeout':
+                stats['timeouts'] += 1
+                return
+
+            stats['calls'] += 1
+            stats['wait_seconds'] += wait
+            stats['total_seconds'] += duration
+            stats['max_seconds'] = max(stats['max_seconds'], duration)
+            stats['recent'].append(duration)
+            if outcome == 'error':
+                stats['errors'] += 1
+
+    def _call(self, method: str, submitted: float, deadline: float, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """
+        Виконується в потоці пулу: бере вільне з'єднання та викликає метод ClickHouseClient.
+        deadline - абсолютний час (time.perf_counter()), до якого запит має завершитися.
+        """
+        client = self._idle.get()
+        started = time.perf_counter()
+        remaining = deadline - started
+        if remaining <= 0:
+            # Викликач уже отримав таймаут, поки запит чекав у черзі: не виконуємо його
+            self._idle.put(client)
+            raise TimeoutError(f"ClickHouse query {method} expired in the pool queue")
+
+        client.last_error = None
+        try:
+            # Сервер сам перериває запит після залишку часу, і з'єднання повертається в пул
+            client.set_query_timeout(remaining)
+            result = getattr(client, method)(*args, **kwargs)
+        except Exception:
+            self._record(method, started - submitted, time.perf_counter() - started, 'error')
+            raise
+        finally:
+            self._idle.put(client)
+
+        # Частина методів ClickHouseClient логує помилку та повертає порожній результат
+        outcome = 'error' if client.last_error is not None else 'ok'
+        self._record(method, started - submitted, time.perf_counter() - started, outcome)
+        return result
+
+    async def query(self, method: str, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Виконує метод ClickHouseClient на вільному з'єднанні пулу.
+
+        Args:
+            method: Назва методу ClickHouseClient (напр. 'get_class_distribution')
+            timeout: Таймаут запиту в секундах, включно з очікуванням з'єднання
+                     (за замовчуванням CLICKHOUSE_QUERY_TIMEOUT)
+        """
+        timeout = timeout or self.query_timeout
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        future = loop.run_in_executor(
+            self._executor, self._call, method, submitted, submitted + timeout, args, kwargs
+        )
+
+        try:
+            # shield: після таймауту потік не запускає запит, що ще чекає в черзі, а запущений
+            # сервер перериває по max_execution_time (залишок до того ж дедлайну)
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            # Результат (або TimeoutError з черги) уже нікому не потрібен
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._record(method, 0.0, None, 'timeout')
+            logger.error(f"ClickHouse query {method} timed out after {timeout}s")
+            raise TimeoutError(f"ClickHouse query {method} timed out after {timeout}s")
+
+    async def test_connection(self) -> bool:
+        return await self.query('test_connection')
+
+    async def get_model_names(self, days_ago: Optional[int] = None) -> List[str]:
+        return await self.query('get_model_names', days_ago)
+
+    async def get_predictions_summary(self, model_name: Optional[str] = None) -> Dict[str, Any]:
+        return await self.query('get_predictions_summary', model_name)
+
+    async def get_class_distribution(self,
+                                     hours_ago: Optional[int] = None,
+                                     model_name: Optional[str] = None) -> pd.DataFrame:
+        return await self.query('get_class_distribution', hours_ago, model_name)
+
+    async def get_current_dataset(self, model_name: Optional[str] = None) -> pd.DataFrame:
+        return await self.query('get_current_dataset', model_name)
+
+    async def get_feature_sketch(self, days_ago: Optional[int] = None) -> FeatureSketch:
+        return await self.query('get_feature_sketch', days_ago)
+
+    async def get_models_overview(self,
+                                  model_names: Optional[List[str]] = None,
+                                  hours_ago: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Зведення, розподіл класів та поточний набір даних для кожної моделі.
+        Усі запити всіх моделей виконуються одночасно (в межах розміру пулу).
+
+        Returns:
+            {model_name: {'summary': dict, 'class_distribution': DataFrame, 'current_dataset': DataFrame}}
+        """
+        if model_names is None:
+            model_names = await self.get_model_names()
+
+        results = await asyncio.gather(*(
+            asyncio.gather(
+                self.get_predictions_summary(model_name),
+                self.get_class_distribution(hours_ago, model_name),
+                self.get_current_dataset(model_name)
+            )
+            for model_name in model_names
+        ))
+
+        return {
+            model_name: {
+                'summary': summary,
+                'class_distribution': distribution,
+                'current_dataset': current
+            }
+            for model_name, (summary, distribution, current) in zip(model_names, results)
+        }
+
+    def get_query_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Метрики запитів за назвою методу: кількість, помилки, таймаути, час виконання та очікування, мс"""
+        with self._stats_lock:
+            snapshot = {name: {**stats, 'recent': list(stats['recent'])} for name, stats in self._stats.items()}
+
+        report = {}
+        for name, stats in snapshot.items():
+            calls = stats['calls']
+            recent = np.array(stats['recent']) * 1000
+            report[name] = {
+                'calls': calls,
+                'errors': stats['errors'],
+                'timeouts': stats['timeouts'],
+                'avg_ms': round(stats['total_seconds'] / calls * 1000, 2) if calls else 0.0,
+                'p50_ms': round(float(np.percentile(recent, 50)), 2) if len(recent) else 0.0,
+                'p95_ms': round(float(np.percentile(recent, 95)), 2) if len(recent) else 0.0,
+                'max_ms': round(stats['max_seconds'] * 1000, 2),
+                'avg_wait_ms': round(stats['wait_seconds'] / calls * 1000, 2) if calls else 0.0
+            }
+        return report
+
+    def close(self):
+        """Зупиняє пул потоків та закриває з'єднання"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for client in self._clients:
+            try:
+                client.client.disconnect()
+            except Exception as e:
+                logger.warning(f"Error closing ClickHouse connection: {e}")
@@ -1,24 +1,131 @@
+import math
+import os
+import shutil
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
 from clickhouse_driver import Client
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import json
 from datetime import datetime, timedelta
 import logging
 
 from config import Config
+from drift_state import CONFIDENCE_BIN_EDGES, IMAGE_FEATURE_BIN_EDGES, LATENCY_BIN_EDGES, FeatureSketch
 
 logger = logging.getLogger(__name__)
 
+# Джерела даних передбачень
+SOURCE_OTEL_TRACES = "otel_traces"            # загальна OTel таблиця спанів
+SOURCE_YOLO_PREDICTIONS = "yolo_predictions"  # типізована таблиця yolo_predictions
+
+# Вага семплювання спану (1 / ймовірність збереження); старі спани без атрибута мають вагу 1
+SAMPLING_WEIGHT_EXPR = (
+    "if(SpanAttributes['sampling_weight'] = '', 1.0, "
+    "toFloat64OrZero(SpanAttributes['sampling_weight']))"
+)
+
+# Детекції спану як масив кортежів (class_name, confidence, object_index):
+# режим events пише подію на об'єкт, компактний режим - пакетні масиви в атрибутах
+# (OTel ClickHouse exporter зберігає масив атрибута як JSON рядок)
+PACKED_CLASS_NAMES_EXPR = "JSONExtract(SpanAttributes['detection_class_names'], 'Array(String)')"
+DETECTIONS_EXPR = (
+    "if(SpanAttributes['detection_class_names'] = '', "
+    "arrayMap(event -> (event['class_name'], toFloat64OrNull(event['confidence']), "
+    "toInt32OrNull(event['object_index'])), Events.Attributes), "
+    f"arrayZip({PACKED_CLASS_NAMES_EXPR}, "
+    "arrayMap(confidence -> toNullable(confidence), "
+    "JSONExtract(SpanAttributes['detection_confidences'], 'Array(Float64)')), "
+    f"arrayMap(index -> toNullable(toInt32(index - 1)), arrayEnumerate({PACKED_CLASS_NAMES_EXPR}))))"
+)
+
+# Кількість кошиків гістограми впевненості в rollup-таблиці (ширина 0.1)
+CONFIDENCE_BUCKETS = 10
+
+
+def confidence_buckets_expr(confidence: str, weight: str) -> str:
+    """Масив кошиків впевненості з вагою в кошику значення, як у yolo_class_stats_1m_mv"""
+    return (f"arrayMap(i -> if(i = least(toUInt8(floor({confidence} * {CONFIDENCE_BUCKETS})), "
+            f"{CONFIDENCE_BUCKETS - 1}), toFloat64({weight}), 0.), range({CONFIDENCE_BUCKETS}))")
+
+DATASET_COLUMNS = [
+    'timestamp', 'prediction_id', 'processing_time',
+    'filename', 'model_name', 'class_name', 'confidence', 'object_index',
+    'sampling_weight', 'image_brightness', 'image_contrast', 'image_blur'
+]
+
+# Типи колонок DataFrame; запити вже повертають типізовані значення (NULL -> NaN/<NA>)
+DATASET_DTYPES = {
+    'timestamp': 'datetime64[ns]',
+    'prediction_id': object,
+    'processing_time': np.float64,
+    'filename': object,
+    'model_name': object,
+    'class_name': object,
+    'confidence': np.float64,
+    'object_index': 'Int32',
+    'sampling_weight': np.float64,
+    'image_brightness': np.float64,
+    'image_contrast': np.float64,
+    'image_blur': np.float64
+}
+
+# Формати вивантаження: native - кортежі через clickhouse_driver,
+# arrow / parquet - колонкові формати ClickHouse через HTTP інтерфейс
+EXPORT_NATIVE = "native"
+EXPORT_ARROW = "arrow"
+EXPORT_PARQUET = "parquet"
+
 class ClickHouseClient:
-    def __init__(self):
+    """
+    Клієнт ClickHouse для даних передбачень YOLO.
+    Значення у запитах передаються як серверні параметри ({name:Type}),
+    тож текст запиту не змінюється між викликами, а фільтри виконуються на сервері.
+    """
+
+    def __init__(self, source: Optional[str] = None, export_format: Optional[str] = None):
         self.client = Client(
             host=Config.CLICKHOUSE_HOST,
             port=Config.CLICKHOUSE_PORT,
             user=Config.CLICKHOUSE_USER,
             password=Config.CLICKHOUSE_PASSWORD,
-            database=Config.CLICKHOUSE_DATABASE
+            database=Config.CLICKHOUSE_DATABASE,
+            settings={'server_side_params': True}
         )
-    
+
+        self.source = source or Config.CLICKHOUSE_SOURCE
+        if self.source not in (SOURCE_OTEL_TRACES, SOURCE_YOLO_PREDICTIONS):
+            raise ValueError(f"Unknown ClickHouse source: {self.source}")
+
+        # Повна назва таблиці з базою даних
+        if self.source == SOURCE_YOLO_PREDICTIONS:
+            self.table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_PREDICTIONS_TABLE}"
+            self.time_column = "timestamp"
+            self.model_column = "model_name"
+        else:
+            self.table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_TABLE}"
+            self.time_column = "Timestamp"
+            self.model_column = "SpanAttributes['model_name']"
+
+        self.export_format = export_format or Config.CLICKHOUSE_EXPORT_FORMAT
+        if self.export_format not in (EXPORT_NATIVE, EXPORT_ARROW, EXPORT_PARQUET):
+            raise ValueError(f"Unknown export format: {self.export_format}")
+        self.http_url = f"http://{Config.CLICKHOUSE_HOST}:{Config.CLICKHOUSE_HTTP_PORT}/"
+        # Налаштування, що додаються до кожного HTTP запиту (напр. max_execution_time)
+        self.http_settings: Dict[str, Any] = {}
+        # Остання помилка методів, що повертають порожній результат замість винятку
+        self.last_error: Optional[Exception] = None
+
+        # Агрегати (зведення, розподіл класів, гістограма впевненості, квантилі затримки) читаються
+        # з похвилинних rollup-таблиць за будь-якого джерела: їх наповнюють materialized views
+        # з yolo_predictions, куди API пише кожне передбачення (CLICKHOUSE_WRITER_ENABLED=true).
+        # Без rollup-таблиць агрегати рахуються по сирих рядках джерела
+        self.use_rollups = Config.CLICKHOUSE_USE_ROLLUPS
+        self.class_rollup_table = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_CLASS_ROLLUP_TABLE}"
+        self.prediction_rollup_table = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_PREDICTION_ROLLUP_TABLE}"
+
     def test_connection(self) -> bool:
         """Перевіряємо підключення до ClickHouse"""
         try:
@@ -26,216 +133,729 @@ class ClickHouseClient:
             return True
         except Exception as e:
             logger.error(f"Помилка підключення до ClickHouse: {e}")
+            self.last_error = e
             return False
-    
+
+    def set_query_timeout(self, seconds: Optional[float]):
+        """Обмежує час виконання запитів на сервері (max_execution_time; None - без обмеження)"""
+        timeout = int(math.ceil(seconds)) if seconds else 0
+        self.client.settings['max_execution_time'] = timeout
+        self.http_settings['max_execution_time'] = timeout
+
+    def _execute(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """Виконує запит з серверною підстановкою параметрів"""
+        return self.client.execute(query, params or {})
+
+    def _iter_dataset_chunks(self,
+                             query: str,
+                             params: Optional[Dict[str, Any]] = None,
+                             chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Потоково читає результат запиту детекцій частинами по chunk_size рядків.
+        Пікова пам'ять залежить від розміру частини, а не від довжини вікна.
+        """
+        chunk_size = chunk_size or Config.CLICKHOUSE_CHUNK_SIZE
+
+        if self.export_format == EXPORT_ARROW:
+            yield from self._iter_arrow_chunks(query, params, chunk_size)
+            return
+        if self.export_format == EXPORT_PARQUET:
+            table = self.fetch_parquet(query, params)
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield self._arrow_to_dataframe(batch)
+            return
+
+        rows_iter = self.client.execute_iter(
+            query, params or {},
+            settings={'max_block_size': chunk_size},
+            chunk_size=chunk_size
+        )
+        for rows in rows_iter:
+            yield self._to_dataframe(rows)
+
+    @staticmethod
+    def _http_param(value: Any) -> str:
+        """Текстове представлення параметра для param_<name> HTTP інтерфейсу"""
+        if isinstance(value, (list, tuple)):
+            return '[' + ','.join(repr(item) for item in value) + ']'
+        return str(value)
+
+    def _http_query(self,
+                    query: str,
+                    params: Optional[Dict[str, Any]],
+                    output_format: str,
+                    settings: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """
+        Виконує запит через HTTP інтерфейс ClickHouse та повертає потокову відповідь.
+        Параметри передаються як param_<name>, тож запит той самий, що й для native клієнта.
+        """
+        url_params = {
+            'database': Config.CLICKHOUSE_DATABASE,
+            'output_format_arrow_string_as_string': 1,
+            'output_format_parquet_string_as_string': 1,
+            **self.http_settings,
+            **(settings or {})
+        }
+        for name, value in (params or {}).items():
+            url_params[f'param_{name}'] = self._http_param(value)
+
+        response = requests.post(
+            self.http_url,
+            params=url_params,
+            data=f"{query} FORMAT {output_format}".encode('utf-8'),
+            headers={
+                'X-ClickHouse-User': Config.CLICKHOUSE_USER,
+                'X-ClickHouse-Key': Config.CLICKHOUSE_PASSWORD
+            },
+            stream=True,
+            timeout=Config.CLICKHOUSE_HTTP_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise Exception(f"ClickHouse HTTP error {response.status_code}: {response.text[:500]}")
+
+        response.raw.decode_content = True
+        return response
+
+    def _iter_arrow_chunks(self,
+                           query: str,
+                           params: Optional[Dict[str, Any]],
+                           chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Читає ArrowStream по блоках (блок ClickHouse = record batch) без Python об'єктів на рядок"""
+        response = self._http_query(query, params, 'ArrowStream', {'max_block_size': chunk_size})
+        with response:
+            for batch in pa.ipc.open_stream(response.raw):
+                yield self._arrow_to_dataframe(batch)
+
+    def fetch_arrow(self, query: str, params: Optional[Dict[str, Any]] = None) -> pa.Table:
+        """Виконує запит та повертає результат як pyarrow.Table (формат ArrowStream)"""
+        with self._http_query(query, params, 'ArrowStream') as response:
+            return pa.ipc.open_stream(response.raw).read_all()
+
+    def fetch_parquet(self, query: str, params: Optional[Dict[str, Any]] = None) -> pa.Table:
+        """Виконує запит та повертає результат як pyarrow.Table (формат Parquet)"""
+        with self._http_query(query, params, 'Parquet') as response:
+            return pq.read_table(pa.BufferReader(response.content))
+
+    @staticmethod
+    def _arrow_to_dataframe(data) -> pd.DataFrame:
+        """Перетворює Arrow таблицю/батч детекцій у DataFrame з типами DATASET_DTYPES"""
+        df = data.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype()}.get)
+
+        # Arrow повертає час з часовою зоною сервера; native клієнт - наївний час тієї ж зони
+        timestamp = df['timestamp']
+        if getattr(timestamp.dt, 'tz', None) is not None:
+            timestamp = timestamp.dt.tz_localize(None)
+        df['timestamp'] = timestamp.astype('datetime64[ns]')
+        return df
+
+    def spool_to_parquet(self, query: str, params: Optional[Dict[str, Any]], path: str) -> str:
+        """
+        Записує результат запиту в локальний Parquet файл.
+        Тіло відповіді (Parquet від ClickHouse) копіюється на диск потоково, без розбору в Python,
+        тож розмір вікна обмежений лише диском. Читати файл: pq.read_table(path, memory_map=True).
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+
+        with self._http_query(query, params, 'Parquet') as response, open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+        os.replace(tmp_path, path)
+
+        return path
+
+    def spool_current_dataset(self, path: Optional[str] = None) -> str:
+        """Вивантажує поточний набір даних (останні CURRENT_DAYS_AGO днів) у Parquet файл"""
+        path = path or os.path.join(
+            Config.CLICKHOUSE_SPOOL_DIR,
+            f"current_{self.source}_{Config.CURRENT_DAYS_AGO}d_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+        )
+        query = self._detections_query([
+            f"{self.time_column} >= now() - toIntervalDay({{days_ago:UInt32}})"
+        ], order=False)
+        return self.spool_to_parquet(query, {'days_ago': Config.CURRENT_DAYS_AGO}, path)
+
+    @staticmethod
+    def read_spooled(path: str) -> pd.DataFrame:
+        """Читає вивантажений Parquet файл через memory map"""
+        return ClickHouseClient._arrow_to_dataframe(pq.read_table(path, memory_map=True))
+
+    def _detections_query(self,
+                          conditions: Optional[List[str]] = None,
+                          limit: bool = False,
+                          order: bool = True) -> str:
+        """
+        Будує запит рядків детекцій (рядок на об'єкт) для поточного джерела.
+        Колонки мають однакові назви та типи для обох джерел, тому умови
+        можуть посилатися на class_name, confidence тощо.
+
+        Args:
+            conditions: Додаткові умови WHERE з параметрами {name:Type}
+            limit: Додати LIMIT {limit:UInt64}
+            order: Сортувати за часом (не потрібно для підзапитів агрегацій)
+        """
+        if self.source == SOURCE_YOLO_PREDICTIONS:
+            query = f"""
+            SELECT
+                timestamp,
+                toString(prediction_id) as prediction_id,
+                toFloat64(processing_time_seconds) as processing_time,
+                filename,
+                model_name,
+                toString(class_name) as class_name,
+                toFloat64(confidence) as confidence,
+                toInt32(object_index) as object_index,
+                toFloat64(sampling_weight) as sampling_weight,
+                toFloat64(image_brightness) as image_brightness,
+                toFloat64(image_contrast) as image_contrast,
+                toFloat64(image_blur) as image_blur
+            FROM {self.table_name}
+            WHERE object_index >= 0
+            """
+        else:
+            query = f"""
+            SELECT
+                Timestamp as timestamp,
+                SpanAttributes['prediction_id'] as prediction_id,
+                toFloat64OrNull(SpanAttributes['processing_time_seconds']) as processing_time,
+                SpanAttributes['filename'] as filename,
+                SpanAttributes['model_name'] as model_name,
+                detection.1 as class_name,
+                detection.2 as confidence,
+                detection.3 as object_index,
+                {SAMPLING_WEIGHT_EXPR} as sampling_weight,
+                toFloat64OrNull(SpanAttributes['image_brightness']) as image_brightness,
+                toFloat64OrNull(SpanAttributes['image_contrast']) as image_contrast,
+                toFloat64OrNull(SpanAttributes['image_blur']) as image_blur
+            FROM {self.table_name}
+            ARRAY JOIN {DETECTIONS_EXPR} as detection
+            WHERE SpanName = 'yolo_prediction'
+            """
+
+        for condition in conditions or []:
+            query += f" AND {condition}"
+
+        # Сортування та ліміт
+        if order:
+            query += f" ORDER BY {self.time_column} DESC"
+
+        if limit:
+            query += " LIMIT {limit:UInt64}"
+
+        return query
+
+    @staticmethod
+    def _to_dataframe(result: List[tuple]) -> pd.DataFrame:
+        """Створює DataFrame з рядків детекцій, будуючи типізовані колонки напряму"""
+        columns = list(zip(*result)) if result else [()] * len(DATASET_COLUMNS)
+        return pd.DataFrame({
+            name: pd.array(values, dtype=DATASET_DTYPES[name])
+            if DATASET_DTYPES[name] == 'Int32'
+            else np.array(values, dtype=DATASET_DTYPES[name])
+            for name, values in zip(DATASET_COLUMNS, columns)
+        })
+
+    @staticmethod
+    def _concat_chunks(chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+        """Об'єднує частини в один DataFrame"""
+        frames = list(chunks)
+        if not frames:
+            return ClickHouseClient._to_dataframe([])
+        return pd.concat(frames, ignore_index=True)
+
+    def fetch_dataframe(self,
+                        query: str,
+                        params: Optional[Dict[str, Any]] = None,
+                        chunk_size: Optional[int] = None) -> pd.DataFrame:
+        """Виконує запит з колонками DATASET_COLUMNS у поточному форматі вивантаження"""
+        return self._concat_chunks(self._iter_dataset_chunks(query, params, chunk_size))
+
     def get_yolo_predictions_data(self, hours_ago: int = None, limit: int = None) -> pd.DataFrame:
         """
-        Витягуємо дані YOLO передбачень з otel_traces
-        
+        Витягуємо дані YOLO передбачень
+
         Args:
             hours_ago: Отримати дані давніші за N годин тому
             limit: Обмежити кількість записів (для поточного набору даних)
         """
-        # Повна назва таблиці з базою даних
-        table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_TABLE}"
-        
-        query = f"""
-        SELECT 
-            Timestamp,
-            SpanAttributes['prediction_id'] as prediction_id,
-            SpanAttributes['processing_time_seconds'] as processing_time,
-            SpanAttributes['filename'] as filename,
-            SpanAttributes['model_name'] as model_name,
-            arrayJoin(Events.Attributes)['class_name'] as class_name,
-            arrayJoin(Events.Attributes)['confidence'] as confidence,
-            arrayJoin(Events.Attributes)['object_index'] as object_index
-        FROM {table_name}
-        WHERE SpanName = 'yolo_prediction'
-        """
-        
-        # Додаємо умову за часом, якщо вказано
-        if hours_ago:
-            query += f" AND Timestamp <= now() - INTERVAL {hours_ago} HOUR"
-            query += f" AND Timestamp >= now() - INTERVAL {hours_ago + 24} HOUR"  # За добу від точки відліку
-        
-        # Сортування та ліміт
-        query += " ORDER BY Timestamp DESC"
-        
-        if limit:
-            query += f" LIMIT {limit}"
-        
         try:
-            result = self.client.execute(query)
-            
-            # Створюємо DataFrame
-            columns = [
-                'timestamp', 'prediction_id', 'processing_time', 
-                'filename', 'model_name', 'class_name', 'confidence', 'object_index'
-            ]
-            
-            df = pd.DataFrame(result, columns=columns)
-            
-            # Перетворюємо типи даних
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['confidence'] = pd.to_numeric(df['confidence'], errors='coerce')
-            df['processing_time'] = pd.to_numeric(df['processing_time'], errors='coerce')
-            df['object_index'] = pd.to_numeric(df['object_index'], errors='coerce')
-            
-            return df
-            
+            return self._concat_chunks(self.iter_yolo_predictions_data(hours_ago, limit))
+
         except Exception as e:
             logger.error(f"Помилка запиту до ClickHouse: {e}")
             raise
-    
+
+    def iter_yolo_predictions_data(self,
+                                   hours_ago: int = None,
+                                   limit: int = None,
+                                   chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Потокова версія get_yolo_predictions_data: повертає DataFrame частинами"""
+        conditions = []
+        params = {}
+
+        # Додаємо умову за часом, якщо вказано
+        if hours_ago:
+            conditions.append(f"{self.time_column} <= now() - toIntervalHour({{hours_ago:UInt32}})")
+            conditions.append(f"{self.time_column} >= now() - toIntervalHour({{hours_ago:UInt32}} + 24)")  # За добу від точки відліку
+            params['hours_ago'] = hours_ago
+
+        if limit:
+            params['limit'] = limit
+
+        query = self._detections_query(conditions, limit=bool(limit))
+        return self._iter_dataset_chunks(query, params, chunk_size)
+
     def get_reference_dataset(self) -> pd.DataFrame:
         """Отримуємо референсний набір даних (специфічні дані з високою впевненістю)"""
-        # Повна назва таблиці з базою даних
-        table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_TABLE}"
-        
-        query = f"""
-        SELECT 
-            Timestamp,
-            SpanAttributes['prediction_id'] as prediction_id,
-            SpanAttributes['processing_time_seconds'] as processing_time,
-            SpanAttributes['filename'] as filename,
-            SpanAttributes['model_name'] as model_name,
-            arrayJoin(Events.Attributes)['class_name'] as class_name,
-            arrayJoin(Events.Attributes)['confidence'] as confidence,
-            arrayJoin(Events.Attributes)['object_index'] as object_index
-        FROM {table_name}
-        WHERE SpanName = 'yolo_prediction'
-        ORDER BY Timestamp DESC
-        """
-        
+        # Фільтр за класом, впевненістю та ліміт виконуються в ClickHouse
+        conditions = [
+            "class_name = {reference_class:String}",
+            "confidence > {reference_min_confidence:Float64}"
+        ]
+        params = {
+            'reference_class': Config.REFERENCE_CLASS_NAME,
+            'reference_min_confidence': Config.REFERENCE_MIN_CONFIDENCE,
+            'limit': Config.REFERENCE_LIMIT
+        }
+
+        if Config.REFERENCE_DAYS_AGO:
+            conditions.append(f"{self.time_column} >= now() - toIntervalDay({{reference_days:UInt32}})")
+            params['reference_days'] = Config.REFERENCE_DAYS_AGO
+
+        query = self._detections_query(conditions, limit=True)
+
         try:
-            result = self.client.execute(query)
-            
-            # Создаем DataFrame
-            columns = [
-                'timestamp', 'prediction_id', 'processing_time', 
-                'filename', 'model_name', 'class_name', 'confidence', 'object_index'
-            ]
-            
-            df = pd.DataFrame(result, columns=columns)
-            
-            # Преобразуем типы данных
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                df['confidence'] = pd.to_numeric(df['confidence'], errors='coerce')
-                df['processing_time'] = pd.to_numeric(df['processing_time'], errors='coerce')
-                df['object_index'] = pd.to_numeric(df['object_index'], errors='coerce')
-                
-                filtered_df = df[
-                    (df['class_name'] == Config.REFERENCE_CLASS_NAME) & 
-                    (df['confidence'] > Config.REFERENCE_MIN_CONFIDENCE)
-                ].head(Config.REFERENCE_LIMIT)
-                
-                return filtered_df
-            else:
-                return df
-            
+            result = self._execute(query, params)
+            return self._to_dataframe(result)
+
         except Exception as e:
             logger.error(f"Помилка запиту референсного набору даних: {e}")
             raise
-    
-    def get_current_dataset(self) -> pd.DataFrame:
-        """Отримуємо поточний набір даних (прогнози за останні N днів)"""
-        # Повна назва таблиці з базою даних
-        table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_TABLE}"
-        
-        # Спрощений запит, як у референсному наборі даних
-        query = f"""
-        SELECT 
-            Timestamp,
-            SpanAttributes['prediction_id'] as prediction_id,
-            SpanAttributes['processing_time_seconds'] as processing_time,
-            SpanAttributes['filename'] as filename,
-            SpanAttributes['model_name'] as model_name,
-            arrayJoin(Events.Attributes)['class_name'] as class_name,
-            arrayJoin(Events.Attributes)['confidence'] as confidence,
-            arrayJoin(Events.Attributes)['object_index'] as object_index
-        FROM {table_name}
-        WHERE SpanName = 'yolo_prediction'
-          AND Timestamp >= now() - INTERVAL {Config.CURRENT_DAYS_AGO} DAY
-        ORDER BY Timestamp DESC
-        """
-        
+
+    def get_current_dataset(self, model_name: Optional[str] = None) -> pd.DataFrame:
+        """Отримуємо поточний набір даних (прогнози за останні N днів, опційно однієї моделі)"""
         try:
-            result = self.client.execute(query)
-            
-            # Создаем DataFrame
-            columns = [
-                'timestamp', 'prediction_id', 'processing_time', 
-                'filename', 'model_name', 'class_name', 'confidence', 'object_index'
-            ]
-            
-            df = pd.DataFrame(result, columns=columns)
-            
-            # Преобразуем типы данных
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                df['confidence'] = pd.to_numeric(df['confidence'], errors='coerce')
-                df['processing_time'] = pd.to_numeric(df['processing_time'], errors='coerce')
-                df['object_index'] = pd.to_numeric(df['object_index'], errors='coerce')
-            
-            return df
-            
+            return self._concat_chunks(self.iter_current_dataset(model_name=model_name))
+
         except Exception as e:
             logger.error(f"Помилка запиту поточного набору даних: {e}")
             raise
-    
-    def get_predictions_summary(self) -> Dict[str, Any]:
-        """Отримуємо зведену статистику передбачень"""
-        table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_TABLE}"
-        
+
+    def iter_current_dataset(self,
+                             chunk_size: Optional[int] = None,
+                             model_name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Потоково читаємо поточний набір даних частинами по chunk_size рядків.
+        Використовується, коли вікно CURRENT_DAYS_AGO не вміщується в пам'ять.
+        """
+        conditions = [f"{self.time_column} >= now() - toIntervalDay({{days_ago:UInt32}})"]
+        params = {'days_ago': Config.CURRENT_DAYS_AGO}
+
+        if model_name:
+            conditions.append("model_name = {model_name:String}")
+            params['model_name'] = model_name
+
+        query = self._detections_query(conditions)
+        return self._iter_dataset_chunks(query, params, chunk_size)
+
+    def get_model_names(self, days_ago: Optional[int] = None) -> List[str]:
+        """Моделі, що мали передбачення за останні N днів"""
         query = f"""
-        SELECT 
-            count() as total_predictions,
-            countDistinct(SpanAttributes['prediction_id']) as unique_predictions,
-            min(Timestamp) as earliest_prediction,
-            max(Timestamp) as latest_prediction,
-            avg(SpanAttributes['processing_time_seconds']) as avg_processing_time
-        FROM {table_name}
-        WHERE SpanName = 'yolo_prediction'
-        """
-        
+        SELECT DISTINCT {self.model_column} as model_name
+        FROM {self.table_name}
+        WHERE {self.time_column} >= now() - toIntervalDay({{days_ago:UInt32}})
+        """
+        if self.source == SOURCE_OTEL_TRACES:
+            query += " AND SpanName = 'yolo_prediction'"
+        query += " ORDER BY model_name"
+
+        result = self._execute(query, {'days_ago': days_ago or Config.CURRENT_DAYS_AGO})
+        return [row[0] for row in result if row[0]]
+
+    def get_watermark_bound(self, lag_seconds: int = 0) -> str:
+        """
+        Повертає верхню межу інкрементального читання (час сервера мінус lag).
+        Відставання залишає запас для спанів, які ще в буферах експортера/writer'а.
+        """
+        result = self._execute(
+            "SELECT toString(now64(3) - toIntervalSecond({lag:UInt32}))",
+            {'lag': lag_seconds}
+        )
+        return result[0][0]
+
+    def iter_dataset_since(self,
+                           since: Optional[str],
+                           until: str,
+                           chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Потоково читаємо рядки з інтервалу [since, until].
+        Без since читається все вікно CURRENT_DAYS_AGO до until.
+
+        Args:
+            since: Початок повторного читання з DriftState.rewind() ('YYYY-MM-DD HH:00:00')
+            until: Поточна ватермарка з get_watermark_bound()
+        """
+        conditions = [f"{self.time_column} <= {{until:DateTime64(3)}}"]
+        params = {'until': until}
+
+        if since:
+            conditions.append(f"{self.time_column} >= {{since:DateTime64(3)}}")
+            params['since'] = since
+        else:
+            conditions.append(
+                f"{self.time_column} > {{until:DateTime64(3)}} - toIntervalDay({{days_ago:UInt32}})"
+            )
+            params['days_ago'] = Config.CURRENT_DAYS_AGO
+
+        query = self._detections_query(conditions)
+        return self._iter_dataset_chunks(query, params, chunk_size)
+
+    def get_feature_sketch(self, days_ago: Optional[int] = None) -> FeatureSketch:
+        """
+        Будує скетч ознак за останні N днів агрегацією на сервері:
+        з ClickHouse повертаються лише кошики гістограм та кількості класів,
+        а не сирі рядки. Кошики збігаються з кошиками FeatureSketch.
+        """
+        sketches = self._aggregate_sketches(
+            [f"{self.time_column} >= now() - toIntervalDay({{days_ago:UInt32}})"],
+            {'days_ago': days_ago or Config.CURRENT_DAYS_AGO}
+        )
+
+        sketch = FeatureSketch()
+        for slice_sketch in sketches.values():
+            sketch.merge(slice_sketch)
+        return sketch
+
+    def get_slice_sketches(self, start: str, end: str) -> Dict[Tuple[str, str], FeatureSketch]:
+        """
+        Скетчі ознак за інтервал [start, end) для кожної пари (model_name, class_name).
+
+        Args:
+            start, end: Межі інтервалу у часі сервера ('YYYY-MM-DD HH:MM:SS')
+        """
+        return self._aggregate_sketches(
+            [f"{self.time_column} >= {{start:DateTime64(3)}}",
+             f"{self.time_column} < {{end:DateTime64(3)}}"],
+            {'start': start, 'end': end}
+        )
+
+    def _aggregate_sketches(self,
+                            conditions: List[str],
+                            params: Dict[str, Any]) -> Dict[Tuple[str, str], FeatureSketch]:
+        """Агрегує кошики FeatureSketch на сервері з групуванням за (model_name, class_name)"""
+        detections = self._detections_query(conditions, order=False)
+        params = {
+            **params,
+            'confidence_bins': len(CONFIDENCE_BIN_EDGES) - 1,
+            # Остання межа нескінченна і в запит не передається
+            'latency_edges': LATENCY_BIN_EDGES[:-1].tolist()
+        }
+
+        confidence_query = f"""
+        SELECT
+            model_name,
+            class_name,
+            least(toUInt32(floor(greatest(confidence, 0) * {{confidence_bins:UInt32}})),
+                  {{confidence_bins:UInt32}} - 1) as bucket,
+            sum(sampling_weight) as weight,
+            count() as rows
+        FROM ({detections})
+        WHERE confidence IS NOT NULL
+        GROUP BY model_name, class_name, bucket
+        """
+
+        # Затримка рахується один раз на передбачення (перший об'єкт)
+        latency_query = f"""
+        SELECT
+            model_name,
+            class_name,
+            arrayCount(edge -> edge <= processing_time, {{latency_edges:Array(Float64)}}) - 1 as bucket,
+            sum(sampling_weight) as weight
+        FROM ({detections})
+        WHERE object_index = 0 AND processing_time IS NOT NULL
+        GROUP BY model_name, class_name, bucket
+        """
+
+        # Статистики зображення: по одному значенню на передбачення, як і затримка
+        image_query = " UNION ALL ".join(
+            f"""
+            SELECT
+                '{name}' as feature,
+                model_name,
+                class_name,
+                arrayCount(edge -> edge <= {name}, {{{name}_edges:Array(Float64)}}) - 1 as bucket,
+                sum(sampling_weight) as weight
+            FROM ({detections})
+            WHERE object_index = 0 AND {name} IS NOT NULL
+            GROUP BY model_name, class_name, bucket
+            """
+            for name in IMAGE_FEATURE_BIN_EDGES
+        )
+        params.update({
+            f'{name}_edges': [edge for edge in edges.tolist() if np.isfinite(edge)]
+            for name, edges in IMAGE_FEATURE_BIN_EDGES.items()
+        })
+
+        class_query = f"""
+        SELECT model_name, class_name, sum(sampling_weight) as weight
+        FROM ({detections})
+        WHERE class_name != ''
+        GROUP BY model_name, class_name
+        """
+
+        try:
+            sketches: Dict[Tuple[str, str], FeatureSketch] = {}
+            for model_name, class_name, bucket, weight, rows in self._execute(confidence_query, params):
+                sketch = sketches.setdefault((model_name, class_name), FeatureSketch())
+                sketch.confidence[bucket] += weight
+                sketch.rows += rows
+            for model_name, class_name, bucket, weight in self._execute(latency_query, params):
+                sketches.setdefault((model_name, class_name), FeatureSketch()).latency[bucket] += weight
+            for feature, model_name, class_name, bucket, weight in self._execute(image_query, params):
+                sketches.setdefault((model_name, class_name), FeatureSketch()).image[feature][bucket] += weight
+            for model_name, class_name, weight in self._execute(class_query, params):
+                sketches.setdefault((model_name, class_name), FeatureSketch()).classes[class_name] = float(weight)
+            return sketches
+
+        except Exception as e:
+            logger.error(f"Помилка агрегації ознак: {e}")
+            raise
+
+    def insert_rows(self, table: str, columns: List[str], rows: List[tuple]):
+        """Вставляє рядки в таблицю бази CLICKHOUSE_DATABASE"""
+        if not rows:
+            return
+        self.client.execute(
+            f"INSERT INTO {Config.CLICKHOUSE_DATABASE}.{table} ({', '.join(columns)}) VALUES",
+            rows
+        )
+
+    def get_predictions_summary(self, model_name: Optional[str] = None) -> Dict[str, Any]:
+        """Отримуємо зведену статистику передбачень (усіх моделей або однієї)"""
+        # Агрегати перезважуються вагою семплювання, щоб оцінювати весь трафік
+        conditions = []
+        if self.use_rollups:
+            query = f"""
+            SELECT
+                sum(predictions) as total_predictions,
+                uniqCombinedMerge(prediction_ids) as unique_predictions,
+                min(first_seen) as earliest_prediction,
+                max(last_seen) as latest_prediction,
+                sum(processing_time_sum) / sum(predictions) as avg_processing_time,
+                sum(sampled_predictions) as sampled_count
+            FROM {self.prediction_rollup_table}
+            """
+            model_column = "model_name"
+        elif self.source == SOURCE_YOLO_PREDICTIONS:
+            # Кожне передбачення має рівно один рядок з object_index <= 0
+            query = f"""
+            SELECT
+                sumIf(sampling_weight, object_index <= 0) as total_predictions,
+                uniqExact(prediction_id) as unique_predictions,
+                min(timestamp) as earliest_prediction,
+                max(timestamp) as latest_prediction,
+                avgWeightedIf(processing_time_seconds, sampling_weight, object_index <= 0) as avg_processing_time,
+                countIf(object_index <= 0) as sampled_predictions
+            FROM {self.table_name}
+            """
+            model_column = self.model_column
+        else:
+            query = f"""
+            SELECT
+                sum({SAMPLING_WEIGHT_EXPR}) as total_predictions,
+                countDistinct(SpanAttributes['prediction_id']) as unique_predictions,
+                min(Timestamp) as earliest_prediction,
+                max(Timestamp) as latest_prediction,
+                avgWeighted(toFloat64OrZero(SpanAttributes['processing_time_seconds']), {SAMPLING_WEIGHT_EXPR}) as avg_processing_time,
+                count() as sampled_predictions
+            FROM {self.table_name}
+            """
+            model_column = self.model_column
+            conditions.append("SpanName = 'yolo_prediction'")
+
+        params = {}
+        if model_name:
+            conditions.append(f"{model_column} = {{model_name:String}}")
+            params['model_name'] = model_name
+
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
         try:
-            result = self.client.execute(query)
+            result = self._execute(query, params)
             if result:
                 row = result[0]
                 return {
-                    'total_predictions': row[0],
-                    'unique_predictions': row[1], 
+                    'total_predictions': round(row[0]) if row[0] else 0,
+                    'unique_predictions': row[1],
                     'earliest_prediction': row[2],
                     'latest_prediction': row[3],
-                    'avg_processing_time': float(row[4]) if row[4] else 0
+                    'avg_processing_time': float(row[4]) if row[4] else 0,
+                    'sampled_predictions': row[5]
                 }
         except Exception as e:
             logger.error(f"Помилка отримання зведеної статистики передбачень: {e}")
+            self.last_error = e
             return {}
-    
-    def get_class_distribution(self, hours_ago: int = None) -> pd.DataFrame:
-        """Отримуємо розподіл класів об'єктів"""
-        table_name = f"{Config.CLICKHOUSE_DATABASE}.{Config.CLICKHOUSE_TABLE}"
-        
-        query = f"""
-        SELECT 
-            arrayJoin(Events.Attributes)['class_name'] as class_name,
-            count() as count,
-            avg(arrayJoin(Events.Attributes)['confidence']) as avg_confidence
-        FROM {table_name}
-        WHERE SpanName = 'yolo_prediction'
-        """
-        
+
+    def get_class_distribution(self, hours_ago: int = None, model_name: Optional[str] = None) -> pd.DataFrame:
+        """Отримуємо розподіл класів об'єктів (усіх моделей або однієї)"""
+        # Кількість та середня впевненість перезважуються вагою семплювання
+        if self.use_rollups:
+            query = f"""
+            SELECT
+                class_name,
+                sum(detections) as count,
+                sum(confidence_sum) / sum(detections) as avg_confidence
+            FROM {self.class_rollup_table}
+            WHERE class_name != ''
+            """
+            time_column = "minute"
+            model_column = "model_name"
+        elif self.source == SOURCE_YOLO_PREDICTIONS:
+            query = f"""
+            SELECT
+                class_name,
+                sum(sampling_weight) as count,
+                avgWeighted(confidence, sampling_weight) as avg_confidence
+            FROM {self.table_name}
+            WHERE object_index >= 0
+            """
+            time_column = self.time_column
+            model_column = self.model_column
+        else:
+            query = f"""
+            SELECT
+                detection.1 as class_name,
+                sum({SAMPLING_WEIGHT_EXPR}) as count,
+                avgWeighted(ifNull(detection.2, 0), {SAMPLING_WEIGHT_EXPR}) as avg_confidence
+            FROM {self.table_name}
+            ARRAY JOIN {DETECTIONS_EXPR} as detection
+            WHERE SpanName = 'yolo_prediction'
+            """
+            time_column = self.time_column
+            model_column = self.model_column
+
+        params = {}
         if hours_ago:
-            query += f" AND Timestamp >= now() - INTERVAL {hours_ago} HOUR"
-        
+            query += f" AND {time_column} >= now() - toIntervalHour({{hours_ago:UInt32}})"
+            params['hours_ago'] = hours_ago
+
+        if model_name:
+            query += f" AND {model_column} = {{model_name:String}}"
+            params['model_name'] = model_name
+
         query += " GROUP BY class_name ORDER BY count DESC"
-        
+
         try:
-            result = self.client.execute(query)
+            result = self._execute(query, params)
             df = pd.DataFrame(result, columns=['class_name', 'count', 'avg_confidence'])
             return df
         except Exception as e:
             logger.error(f"Помилка отримання розподілу класів: {e}")
-            return pd.DataFrame() 
\ No newline at end of file
+            self.last_error = e
+            return pd.DataFrame()
+
+    def get_confidence_histogram(self, hours_ago: int = None) -> pd.DataFrame:
+        """
+        Отримуємо гістограму впевненості за класами (з rollup-таблиці або по сирих рядках)
+
+        Returns:
+            DataFrame з колонками class_name та bucket_0..bucket_9 (перезважені кількості)
+        """
+        if self.use_rollups:
+            query = f"""
+            SELECT
+                class_name,
+                sumForEachMerge(confidence_buckets) as buckets
+            FROM {self.class_rollup_table}
+            WHERE 1
+            """
+            time_column = "minute"
+        elif self.source == SOURCE_YOLO_PREDICTIONS:
+            query = f"""
+            SELECT
+                class_name,
+                sumForEach({confidence_buckets_expr('confidence', 'sampling_weight')}) as buckets
+            FROM {self.table_name}
+            WHERE object_index >= 0
+            """
+            time_column = self.time_column
+        else:
+            query = f"""
+            SELECT
+                detection.1 as class_name,
+                sumForEach({confidence_buckets_expr('ifNull(detection.2, 0)', SAMPLING_WEIGHT_EXPR)}) as buckets
+            FROM {self.table_name}
+            ARRAY JOIN {DETECTIONS_EXPR} as detection
+            WHERE SpanName = 'yolo_prediction'
+            """
+            time_column = self.time_column
+
+        params = {}
+        if hours_ago:
+            query += f" AND {time_column} >= now() - toIntervalHour({{hours_ago:UInt32}})"
+            params['hours_ago'] = hours_ago
+
+        query += " GROUP BY class_name ORDER BY class_name"
+
+        try:
+            result = self._execute(query, params)
+            columns = [f'bucket_{i}' for i in range(CONFIDENCE_BUCKETS)]
+            rows = [[class_name] + list(buckets) for class_name, buckets in result]
+            return pd.DataFrame(rows, columns=['class_name'] + columns)
+        except Exception as e:
+            logger.error(f"Помилка отримання гістограми впевненості: {e}")
+            self.last_error = e
+            return pd.DataFrame()
+
+    def get_latency_quantiles(self, hours_ago: int = None) -> pd.DataFrame:
+        """Отримуємо квантилі часу обробки (p50, p90, p99) за моделями (з rollup-таблиці або по сирих рядках)"""
+        if self.use_rollups:
+            query = f"""
+            SELECT
+                model_name,
+                quantilesTDigestWeightedMerge(0.5, 0.9, 0.99)(latency_quantiles) as quantiles
+            FROM {self.prediction_rollup_table}
+            WHERE 1
+            """
+            time_column = "minute"
+        elif self.source == SOURCE_YOLO_PREDICTIONS:
+            # Кожне передбачення має рівно один рядок з object_index <= 0
+            query = f"""
+            SELECT
+                model_name,
+                quantilesTDigestWeighted(0.5, 0.9, 0.99)(
+                    processing_time_seconds, toUInt32(greatest(round(sampling_weight), 1))
+                ) as quantiles
+            FROM {self.table_name}
+            WHERE object_index <= 0
+            """
+            time_column = self.time_column
+        else:
+            query = f"""
+            SELECT
+                {self.model_column} as model_name,
+                quantilesTDigestWeighted(0.5, 0.9, 0.99)(
+                    toFloat64OrZero(SpanAttributes['processing_time_seconds']),
+                    toUInt32(greatest(round({SAMPLING_WEIGHT_EXPR}), 1))
+                ) as quantiles
+            FROM {self.table_name}
+            WHERE SpanName = 'yolo_prediction'
+            """
+            time_column = self.time_column
+
+        params = {}
+        if hours_ago:
+            query += f" AND {time_column} >= now() - toIntervalHour({{hours_ago:UInt32}})"
+            params['hours_ago'] = hours_ago
+
+        query += " GROUP BY model_name ORDER BY model_name"
+
+        try:
+            result = self._execute(query, params)
+            rows = [[model_name] + list(quantiles) for model_name, quantiles in result]
+            return pd.DataFrame(rows, columns=['model_name', 'p50', 'p90', 'p99'])
+        except Exception as e:
+            logger.error(f"Помилка отримання квантилів часу обробки: {e}")
+            self.last_error = e
+            return pd.DataFrame()
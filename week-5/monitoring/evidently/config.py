@@ -17,27 +17,94 @@ class Config:
     CLICKHOUSE_PASSWORD = os.getenv('CLICKHOUSE_PASSWORD', '')
     CLICKHOUSE_DATABASE = os.getenv('CLICKHOUSE_DATABASE', 'yolo_analytics')
     CLICKHOUSE_TABLE = os.getenv('CLICKHOUSE_TABLE', 'otel_traces')
+    CLICKHOUSE_PREDICTIONS_TABLE = os.getenv('CLICKHOUSE_PREDICTIONS_TABLE', 'yolo_predictions')
+    # Джерело даних передбачень: yolo_predictions (типізована таблиця, куди пише API з
+    # CLICKHOUSE_WRITER_ENABLED=true і куди дозавантажується спул телеметрії) або otel_traces
+    CLICKHOUSE_SOURCE = os.getenv('CLICKHOUSE_SOURCE', 'yolo_predictions')
+    # Похвилинні rollup-таблиці для агрегатів за будь-якого CLICKHOUSE_SOURCE
+    # (наповнюються materialized views з yolo_predictions, потрібен CLICKHOUSE_WRITER_ENABLED=true в API)
+    CLICKHOUSE_USE_ROLLUPS = os.getenv('CLICKHOUSE_USE_ROLLUPS', 'true').lower() == 'true'
+    CLICKHOUSE_CLASS_ROLLUP_TABLE = os.getenv('CLICKHOUSE_CLASS_ROLLUP_TABLE', 'yolo_class_stats_1m')
+    CLICKHOUSE_PREDICTION_ROLLUP_TABLE = os.getenv('CLICKHOUSE_PREDICTION_ROLLUP_TABLE', 'yolo_prediction_stats_1m')
+    # Розмір частини (рядків) при потоковому читанні наборів даних
+    CLICKHOUSE_CHUNK_SIZE = int(os.getenv('CLICKHOUSE_CHUNK_SIZE', '100000'))
+    # Формат вивантаження наборів даних: native (clickhouse_driver), arrow або parquet (HTTP інтерфейс)
+    CLICKHOUSE_EXPORT_FORMAT = os.getenv('CLICKHOUSE_EXPORT_FORMAT', 'native')
+    CLICKHOUSE_HTTP_PORT = int(os.getenv('CLICKHOUSE_HTTP_PORT', '30123'))
+    CLICKHOUSE_HTTP_TIMEOUT = float(os.getenv('CLICKHOUSE_HTTP_TIMEOUT', '300'))
+    # Каталог для локальних Parquet вивантажень великих вікон
+    CLICKHOUSE_SPOOL_DIR = os.getenv('CLICKHOUSE_SPOOL_DIR', 'spool')
+    # Пул з'єднань асинхронного клієнта (паралельні незалежні запити) та таймаут одного запиту, с
+    CLICKHOUSE_POOL_SIZE = int(os.getenv('CLICKHOUSE_POOL_SIZE', '4'))
+    CLICKHOUSE_QUERY_TIMEOUT = float(os.getenv('CLICKHOUSE_QUERY_TIMEOUT', '60'))
     
     # Конфігурація еталонного набору даних
     REFERENCE_CLASS_NAME = os.getenv('REFERENCE_CLASS_NAME', 'car')
     REFERENCE_MIN_CONFIDENCE = float(os.getenv('REFERENCE_MIN_CONFIDENCE', '0.85'))
     REFERENCE_LIMIT = int(os.getenv('REFERENCE_LIMIT', '10'))
+    # Обмеження вибірки референсу за часом (0 - без обмеження)
+    REFERENCE_DAYS_AGO = int(os.getenv('REFERENCE_DAYS_AGO', '0'))
     
     # Конфігурація поточного набору даних
     CURRENT_DAYS_AGO = int(os.getenv('CURRENT_DAYS_AGO', '7'))
     
     # Конфігурація аналізу дрейфу
     REFERENCE_DATASET_ID = os.getenv('REFERENCE_DATASET_ID', '019766dc-3620-7831-9e0a-0b061e642f85')
+    # Локальний Parquet кеш reference наборів (незмінні, ключ - dataset ID)
+    REFERENCE_CACHE_ENABLED = os.getenv('REFERENCE_CACHE_ENABLED', 'true').lower() == 'true'
+    REFERENCE_CACHE_DIR = os.getenv('REFERENCE_CACHE_DIR', 'reference_cache')
+    # Режим аналізу: full (повне вікно + звіт Evidently) або incremental (ватермарка + скетчі)
+    DRIFT_MODE = os.getenv('DRIFT_MODE', 'full')
+    DRIFT_STATE_PATH = os.getenv('DRIFT_STATE_PATH', 'drift_state/state.json')
+    # Відставання ватермарки від поточного часу для спанів, що ще не дійшли до ClickHouse
+    DRIFT_WATERMARK_LAG_SECONDS = int(os.getenv('DRIFT_WATERMARK_LAG_SECONDS', '60'))
+    # Скільки годин перед ватермаркою перечитувати, щоб врахувати рядки, що дійшли пізно
+    # (повтори OTLP колектора, дозавантаження спулу)
+    DRIFT_RESCAN_HOURS = int(os.getenv('DRIFT_RESCAN_HOURS', '3'))
+    # Рушій дрифту: evidently (DataDriftPreset + звіт у Cloud) або local (NumPy по кошиках, без мережі)
+    DRIFT_ENGINE = os.getenv('DRIFT_ENGINE', 'evidently')
+    # Звідки брати reference для локального рушія: evidently (Cloud, далі з REFERENCE_CACHE_DIR)
+    # або clickhouse (REFERENCE_* фільтри); за замовчуванням local рушій працює без Cloud
+    REFERENCE_SOURCE = os.getenv('REFERENCE_SOURCE', 'clickhouse' if DRIFT_ENGINE == 'local' else 'evidently')
+    # Відправляти результати local / incremental аналізу в Evidently Cloud (набір метрик по ознаках)
+    DRIFT_UPLOAD_RESULTS = os.getenv('DRIFT_UPLOAD_RESULTS', 'false').lower() == 'true'
+    DRIFT_RESULTS_PATH = os.getenv('DRIFT_RESULTS_PATH', 'drift_results/results.jsonl')
+    DRIFT_PSI_THRESHOLD = float(os.getenv('DRIFT_PSI_THRESHOLD', '0.2'))
+    DRIFT_JS_THRESHOLD = float(os.getenv('DRIFT_JS_THRESHOLD', '0.1'))
+    # Стратифікована вибірка current даних (class_name x часовий кошик) перед звітом Evidently
+    DRIFT_SAMPLE_ROWS = int(os.getenv('DRIFT_SAMPLE_ROWS', '50000'))  # 0 - без вибірки
+    DRIFT_SAMPLE_SEED = int(os.getenv('DRIFT_SAMPLE_SEED', '42'))
+    DRIFT_SAMPLE_TIME_BUCKET = os.getenv('DRIFT_SAMPLE_TIME_BUCKET', '1h')
+    # Перевірка, що PSI / JS на вибірці в межах допуску від повних даних (інакше звіт будується на всіх даних)
+    DRIFT_SAMPLE_CHECK = os.getenv('DRIFT_SAMPLE_CHECK', 'true').lower() == 'true'
+    DRIFT_SAMPLE_TOLERANCE = float(os.getenv('DRIFT_SAMPLE_TOLERANCE', '0.05'))
+
+    # Конфігурація сервісу безперервного моніторингу дрифту (drift_monitor.py)
+    DRIFT_MONITOR_TABLE = os.getenv('DRIFT_MONITOR_TABLE', 'yolo_drift_scores')
+    DRIFT_MONITOR_STATE_PATH = os.getenv('DRIFT_MONITOR_STATE_PATH', 'drift_state/monitor.json')
+    DRIFT_MONITOR_INTERVAL_SECONDS = int(os.getenv('DRIFT_MONITOR_INTERVAL_SECONDS', '300'))
+    DRIFT_MONITOR_BASELINE_HOURS = int(os.getenv('DRIFT_MONITOR_BASELINE_HOURS', '168'))
+    DRIFT_MONITOR_MAX_CATCHUP_HOURS = int(os.getenv('DRIFT_MONITOR_MAX_CATCHUP_HOURS', '24'))
+    DRIFT_MONITOR_MIN_ROWS = int(os.getenv('DRIFT_MONITOR_MIN_ROWS', '20'))
+    DRIFT_MONITOR_WORKERS = int(os.getenv('DRIFT_MONITOR_WORKERS', str(os.cpu_count() or 2)))
+    # Порт /metrics для Prometheus (0 - вимкнено)
+    DRIFT_MONITOR_PROMETHEUS_PORT = int(os.getenv('DRIFT_MONITOR_PROMETHEUS_PORT', '9108'))
 
     @classmethod
     def validate(cls) -> list:
         """Валідація обов'язкових налаштувань"""
         errors = []
         
-        if not cls.EVIDENTLY_API_KEY:
+        if cls.DRIFT_ENGINE not in ('evidently', 'local'):
+            errors.append("DRIFT_ENGINE must be 'evidently' or 'local'")
+
+        if cls.REFERENCE_SOURCE not in ('evidently', 'clickhouse'):
+            errors.append("REFERENCE_SOURCE must be 'evidently' or 'clickhouse'")
+
+        if cls.requires_evidently() and not cls.EVIDENTLY_API_KEY:
             errors.append("EVIDENTLY_API_KEY is required")
         
-        if not cls.REFERENCE_DATASET_ID:
+        if cls.REFERENCE_SOURCE == 'evidently' and not cls.REFERENCE_DATASET_ID:
             errors.append("REFERENCE_DATASET_ID is required (run create_reference_dataset.py first)")
             
         if cls.REFERENCE_MIN_CONFIDENCE < 0 or cls.REFERENCE_MIN_CONFIDENCE > 1:
@@ -45,17 +112,68 @@ class Config:
             
         if cls.REFERENCE_LIMIT <= 0:
             errors.append("REFERENCE_LIMIT must be positive")
+
+        if cls.REFERENCE_DAYS_AGO < 0:
+            errors.append("REFERENCE_DAYS_AGO must not be negative")
             
         if cls.CURRENT_DAYS_AGO <= 0:
             errors.append("CURRENT_DAYS_AGO must be positive")
+
+        if cls.CLICKHOUSE_CHUNK_SIZE <= 0:
+            errors.append("CLICKHOUSE_CHUNK_SIZE must be positive")
+
+        if cls.CLICKHOUSE_POOL_SIZE <= 0:
+            errors.append("CLICKHOUSE_POOL_SIZE must be positive")
+
+        if cls.CLICKHOUSE_QUERY_TIMEOUT <= 0:
+            errors.append("CLICKHOUSE_QUERY_TIMEOUT must be positive")
+
+        if cls.DRIFT_SAMPLE_ROWS < 0:
+            errors.append("DRIFT_SAMPLE_ROWS must not be negative")
+
+        if cls.DRIFT_SAMPLE_TOLERANCE <= 0:
+            errors.append("DRIFT_SAMPLE_TOLERANCE must be positive")
+
+        if cls.DRIFT_MODE not in ('full', 'incremental'):
+            errors.append("DRIFT_MODE must be 'full' or 'incremental'")
+
+        if cls.DRIFT_WATERMARK_LAG_SECONDS < 0:
+            errors.append("DRIFT_WATERMARK_LAG_SECONDS must not be negative")
+
+        if cls.DRIFT_RESCAN_HOURS < 0:
+            errors.append("DRIFT_RESCAN_HOURS must not be negative")
+
+        if cls.CLICKHOUSE_EXPORT_FORMAT not in ('native', 'arrow', 'parquet'):
+            errors.append("CLICKHOUSE_EXPORT_FORMAT must be 'native', 'arrow' or 'parquet'")
+
+        if cls.CLICKHOUSE_SOURCE not in ('otel_traces', 'yolo_predictions'):
+            errors.append("CLICKHOUSE_SOURCE must be 'otel_traces' or 'yolo_predictions'")
         
         return errors
     
+    @classmethod
+    def requires_evidently(cls) -> bool:
+        """
+        Чи потрібен доступ до Evidently Cloud: звіт Evidently, відправка результатів
+        або reference з Cloud, якого ще немає в локальному кеші
+        """
+        if cls.DRIFT_MODE == 'full' and cls.DRIFT_ENGINE == 'evidently':
+            return True
+        if cls.DRIFT_UPLOAD_RESULTS:
+            return True
+        return cls.REFERENCE_SOURCE == 'evidently' and not cls.reference_cached()
+
+    @classmethod
+    def reference_cached(cls) -> bool:
+        """Чи є reference набір REFERENCE_DATASET_ID у локальному кеші"""
+        from reference_cache import ReferenceCache
+        return cls.REFERENCE_CACHE_ENABLED and ReferenceCache(cls.REFERENCE_CACHE_DIR).contains(cls.REFERENCE_DATASET_ID)
+
     @classmethod
     def print_config(cls):
         """Виводить поточну конфігурацію"""
-        print(f"📊 Config: CH={cls.CLICKHOUSE_HOST}:{cls.CLICKHOUSE_PORT} | "
-              f"Days={cls.CURRENT_DAYS_AGO} | "
+        print(f"📊 Config: CH={cls.CLICKHOUSE_HOST}:{cls.CLICKHOUSE_PORT}/{cls.CLICKHOUSE_SOURCE} | "
+              f"Days={cls.CURRENT_DAYS_AGO} | Mode={cls.DRIFT_MODE}/{cls.DRIFT_ENGINE} | "
               f"Ref={cls.REFERENCE_DATASET_ID[:8]}... | "
               f"Key={'✅' if cls.EVIDENTLY_API_KEY else '❌'}") 
               
\ No newline at end of file
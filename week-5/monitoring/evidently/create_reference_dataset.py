@@ -63,6 +63,9 @@ def main():
         
         logger.info(f"Uploading reference dataset to Evidently Cloud...")
         dataset_id = ev_client.upload_dataset(reference_df, dataset_name, description)
+
+        # Одразу кладемо набір у локальний кеш, щоб аналізатор не завантажував його з Cloud
+        ev_client.cache_reference(dataset_id, reference_df)
         
         print("✅ Reference dataset created!")
         print(f"📊 Dataset ID: {dataset_id}")
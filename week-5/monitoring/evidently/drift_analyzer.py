@@ -1,9 +1,12 @@
 import logging
 import sys
 from datetime import datetime
+from typing import Any, Dict
 
 from clickhouse_client import ClickHouseClient
 from evidently_client import EvidentlyClient
+from drift_state import DriftState, FeatureSketch
+from local_drift import DriftResultStore, compare_sketches
 from config import Config
 
 # Налаштування логування
@@ -17,7 +20,11 @@ logger = logging.getLogger(__name__)
 class YoloDriftAnalyzer:
     def __init__(self):
         self.clickhouse_client = ClickHouseClient()
-        self.evidently_client = EvidentlyClient()
+        # Evidently Cloud потрібен лише для звіту Evidently, відправки результатів або reference з Cloud
+        # (клієнт підключається до Cloud лише при першому зверненні, reference з кешу читається офлайн)
+        needs_client = Config.requires_evidently() or Config.REFERENCE_SOURCE == 'evidently'
+        self.evidently_client = EvidentlyClient() if needs_client else None
+        self.result_store = DriftResultStore(Config.DRIFT_RESULTS_PATH)
         logger.info("YOLO Drift Analyzer initialized")
     
     def analyze_drift(self) -> str:
@@ -64,6 +71,128 @@ class YoloDriftAnalyzer:
             logger.error(f"Error during drift analysis: {e}")
             raise
 
+    def analyze_drift_incremental(self) -> Dict[str, Any]:
+        """
+        Інкрементальний аналіз дрифту:
+        1. Завантажує стан (ватермарка + годинні скетчі) з DRIFT_STATE_PATH
+        2. Перераховує скетчі годин від ватермарки мінус DRIFT_RESCAN_HOURS до поточного часу
+        3. Відкидає години поза вікном CURRENT_DAYS_AGO і порівнює вікно з reference
+        """
+        logger.info("Starting incremental drift analysis...")
+
+        try:
+            if not self.clickhouse_client.test_connection():
+                raise Exception("ClickHouse connection failed")
+
+            state = DriftState.load(Config.DRIFT_STATE_PATH, self.clickhouse_client.source)
+
+            # Reference дані незмінні: скетч будується один раз і зберігається у стані
+            reference_key = self._reference_key()
+            if state.reference_id != reference_key:
+                state.reference_id = reference_key
+                state.reference = self._load_reference_sketch()
+
+            until = self.clickhouse_client.get_watermark_bound(Config.DRIFT_WATERMARK_LAG_SECONDS)
+            # Останні DRIFT_RESCAN_HOURS годин перед ватермаркою перечитуються повністю
+            since = state.rewind(Config.DRIFT_RESCAN_HOURS)
+            logger.info(f"Fetching rows in [{since or f'-{Config.CURRENT_DAYS_AGO}d'}, {until}]...")
+
+            fetched = 0
+            for chunk in self.clickhouse_client.iter_dataset_since(since, until):
+                state.update(chunk)
+                fetched += len(chunk)
+
+            state.watermark = until
+            state.prune(until, Config.CURRENT_DAYS_AGO)
+            state.save()
+
+            result = compare_sketches(
+                state.reference, state.window(),
+                psi_threshold=Config.DRIFT_PSI_THRESHOLD,
+                js_threshold=Config.DRIFT_JS_THRESHOLD
+            )
+            result.update({'watermark': until, 'hours': len(state.hours), 'fetched_rows': fetched})
+
+            logger.info(f"Incremental drift analysis completed: {fetched} new rows")
+            return self._store_result('incremental', result)
+
+        except Exception as e:
+            logger.error(f"Error during incremental drift analysis: {e}")
+            raise
+
+    def analyze_drift_local(self) -> Dict[str, Any]:
+        """
+        Локальний аналіз дрифту без Evidently Cloud:
+        кошики current вікна агрегуються в ClickHouse, метрики (PSI, KS,
+        Jensen-Shannon, хі-квадрат) рахуються в NumPy, результат пишеться
+        в локальне сховище DRIFT_RESULTS_PATH.
+        """
+        logger.info("Starting local drift analysis...")
+
+        try:
+            if not self.clickhouse_client.test_connection():
+                raise Exception("ClickHouse connection failed")
+
+            reference = self._load_reference_sketch()
+
+            logger.info(f"Aggregating current window (last {Config.CURRENT_DAYS_AGO} days)...")
+            current = self.clickhouse_client.get_feature_sketch(Config.CURRENT_DAYS_AGO)
+
+            if current.rows == 0:
+                raise Exception(f"Current dataset is empty (no predictions in last {Config.CURRENT_DAYS_AGO} days)")
+
+            result = compare_sketches(
+                reference, current,
+                psi_threshold=Config.DRIFT_PSI_THRESHOLD,
+                js_threshold=Config.DRIFT_JS_THRESHOLD
+            )
+
+            logger.info("Local drift analysis completed")
+            return self._store_result('full', result)
+
+        except Exception as e:
+            logger.error(f"Error during local drift analysis: {e}")
+            raise
+
+    def _reference_key(self) -> str:
+        """Ідентифікатор reference набору для кешування його скетчу"""
+        if Config.REFERENCE_SOURCE == 'evidently':
+            return Config.REFERENCE_DATASET_ID
+        return (f"clickhouse:{Config.REFERENCE_CLASS_NAME}:{Config.REFERENCE_MIN_CONFIDENCE}:"
+                f"{Config.REFERENCE_LIMIT}:{Config.REFERENCE_DAYS_AGO}")
+
+    def _load_reference_sketch(self) -> FeatureSketch:
+        """Будує скетч reference набору з Evidently Cloud або з ClickHouse"""
+        logger.info(f"Building reference sketch ({self._reference_key()})...")
+
+        if Config.REFERENCE_SOURCE == 'evidently':
+            # Локальний кеш має пріоритет, Cloud використовується лише при першому запуску
+            reference_df = self.evidently_client.download_dataset(Config.REFERENCE_DATASET_ID)
+        else:
+            reference_df = self.clickhouse_client.get_reference_dataset()
+
+        if reference_df.empty:
+            raise Exception("Reference dataset is empty")
+
+        return FeatureSketch.from_dataframe(reference_df)
+
+    def _store_result(self, mode: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Додає метадані запуску та зберігає результат у локальне сховище,
+        з DRIFT_UPLOAD_RESULTS=true також відправляє його в Evidently Cloud
+        """
+        stored = self.result_store.append({
+            'mode': mode,
+            'source': self.clickhouse_client.source,
+            'reference': self._reference_key(),
+            'current_days_ago': Config.CURRENT_DAYS_AGO,
+            **result
+        })
+        if Config.DRIFT_UPLOAD_RESULTS:
+            dataset_id = self.evidently_client.upload_drift_result(stored)
+            logger.info(f"Drift result uploaded to Evidently Cloud: dataset {dataset_id}")
+        return stored
+
 def main():
     """Головна функція"""
     print("🚀 YOLO Drift Analysis")
@@ -79,6 +208,22 @@ def main():
     
     try:
         analyzer = YoloDriftAnalyzer()
+
+        if Config.DRIFT_MODE == 'incremental' or Config.DRIFT_ENGINE == 'local':
+            if Config.DRIFT_MODE == 'incremental':
+                result = analyzer.analyze_drift_incremental()
+            else:
+                result = analyzer.analyze_drift_local()
+
+            print("✅ Analysis completed!")
+            print(f"📊 Rows: reference={result['reference_rows']:.0f} current={result['current_rows']:.0f}")
+            for feature, metrics in result['features'].items():
+                print(f"   {'⚠️' if metrics['drift_detected'] else '✅'} {feature}: "
+                      f"PSI={metrics['psi']} JS={metrics['jensen_shannon']}")
+            print(f"📊 Dataset drift: {result['dataset_drift']}")
+            print(f"💾 Saved to {Config.DRIFT_RESULTS_PATH}")
+            return
+
         report_url = analyzer.analyze_drift()
         
         print("✅ Analysis completed!")
@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from clickhouse_client import ClickHouseClient
+from drift_state import FeatureSketch
+from local_drift import NUMERICAL_FEATURES, compare_sketches
+from config import Config
+
+# Налаштування логування
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+# Ковзні вікна (тривалість у годинах); обидва перераховуються на кожній межі години
+WINDOWS = {
+    'hourly': 1,
+    'daily': 24
+}
+
+# Зріз по всій моделі (усі класи разом)
+ALL_CLASSES = 'all'
+
+SCORE_COLUMNS = [
+    'window_end', 'window', 'model_name', 'class_name', 'feature',
+    'psi', 'jensen_shannon', 'ks_statistic', 'chi2_p_value',
+    'drift_detected', 'current_rows', 'reference_rows'
+]
+
+HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+
+
+def _compare_slice(task: Tuple[str, str, FeatureSketch, FeatureSketch, float, float]) -> Tuple[str, str, Dict[str, Any]]:
+    """Порівняння одного зрізу; виконується у воркері пулу процесів"""
+    model_name, class_name, reference, current, psi_threshold, js_threshold = task
+
+    # Всередині зрізу одного класу розподіл класів не має сенсу
+    features = None if class_name == ALL_CLASSES else NUMERICAL_FEATURES
+    result = compare_sketches(reference, current, psi_threshold, js_threshold, features=features)
+    return model_name, class_name, result
+
+
+def _with_model_totals(sketches: Dict[Tuple[str, str], FeatureSketch]) -> Dict[Tuple[str, str], FeatureSketch]:
+    """Додає зрізи (model_name, 'all') злиттям скетчів класів моделі"""
+    result = dict(sketches)
+    for (model_name, _), sketch in sketches.items():
+        result.setdefault((model_name, ALL_CLASSES), FeatureSketch()).merge(sketch)
+    return result
+
+
+class DriftMonitor:
+    """
+    Сервіс безперервного моніторингу дрифту.
+    На кожній межі години рахує дрифт для ковзних вікон (1 год та 24 год)
+    по кожній моделі та класу: current вікно порівнюється з попередніми
+    DRIFT_MONITOR_BASELINE_HOURS годинами того ж зрізу. Кошики ознак
+    агрегуються в ClickHouse, тож пам'ять залежить лише від кількості зрізів.
+    Результати пишуться в yolo_drift_scores та (опціонально) у Prometheus.
+    """
+
+    def __init__(self):
+        self.clickhouse_client = ClickHouseClient()
+        self.pool = ProcessPoolExecutor(max_workers=Config.DRIFT_MONITOR_WORKERS)
+        self.running = True
+
+        self.gauges = self._setup_prometheus() if Config.DRIFT_MONITOR_PROMETHEUS_PORT else None
+        logger.info("YOLO Drift Monitor initialized")
+
+    def _setup_prometheus(self) -> Dict[str, Any]:
+        """Піднімає /metrics endpoint для Prometheus (prometheus-client опціональний)"""
+        try:
+            from prometheus_client import Gauge, start_http_server
+        except ImportError:
+            logger.warning("prometheus-client is not installed, Prometheus export disabled")
+            return None
+
+        labels = ['window', 'model_name', 'class_name', 'feature']
+        gauges = {
+            'psi': Gauge('yolo_drift_psi', 'Population stability index', labels),
+            'jensen_shannon': Gauge('yolo_drift_jensen_shannon', 'Jensen-Shannon distance', labels),
+            'drift_detected': Gauge('yolo_drift_detected', 'Drift detected (0/1)', labels),
+            'watermark': Gauge('yolo_drift_monitor_watermark_seconds', 'Last processed window end (unix time)')
+        }
+        start_http_server(Config.DRIFT_MONITOR_PROMETHEUS_PORT)
+        logger.info(f"Prometheus metrics on :{Config.DRIFT_MONITOR_PROMETHEUS_PORT}/metrics")
+        return gauges
+
+    def _load_watermark(self) -> Optional[datetime]:
+        """Кінець останнього обробленого вікна з файлу стану"""
+        if not os.path.exists(Config.DRIFT_MONITOR_STATE_PATH):
+            return None
+        with open(Config.DRIFT_MONITOR_STATE_PATH) as f:
+            data = json.load(f)
+        if data.get('source') != self.clickhouse_client.source:
+            return None
+        return datetime.strptime(data['watermark'], HOUR_FORMAT)
+
+    def _save_watermark(self, window_end: datetime):
+        os.makedirs(os.path.dirname(os.path.abspath(Config.DRIFT_MONITOR_STATE_PATH)), exist_ok=True)
+        tmp_path = f"{Config.DRIFT_MONITOR_STATE_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'source': self.clickhouse_client.source,
+                'watermark': window_end.strftime(HOUR_FORMAT)
+            }, f)
+        os.replace(tmp_path, Config.DRIFT_MONITOR_STATE_PATH)
+
+        if self.gauges:
+            self.gauges['watermark'].set(window_end.timestamp())
+
+    def _pending_window_ends(self) -> List[datetime]:
+        """
+        Межі годин, які ще не оброблені. Після рестарту продовжуємо з ватермарки,
+        але не далі ніж на DRIFT_MONITOR_MAX_CATCHUP_HOURS назад.
+        З кожною новою межею перераховуються й останні DRIFT_RESCAN_HOURS вже оброблених,
+        щоб врахувати рядки, що дійшли пізно (ReplacingMergeTree замінює старі оцінки).
+        """
+        bound = self.clickhouse_client.get_watermark_bound(Config.DRIFT_WATERMARK_LAG_SECONDS)
+        latest = datetime.strptime(bound[:13], '%Y-%m-%d %H')
+
+        earliest = latest - timedelta(hours=Config.DRIFT_MONITOR_MAX_CATCHUP_HOURS - 1)
+        watermark = self._load_watermark()
+        if watermark is not None:
+            if watermark >= latest:
+                return []
+            earliest = max(earliest, watermark + timedelta(hours=1 - Config.DRIFT_RESCAN_HOURS))
+
+        ends = []
+        window_end = earliest
+        while window_end <= latest:
+            ends.append(window_end)
+            window_end += timedelta(hours=1)
+        return ends
+
+    def _score_rows(self, window: str, window_end: datetime,
+                    model_name: str, class_name: str, result: Dict[str, Any]) -> List[tuple]:
+        rows = []
+        for feature, metrics in result['features'].items():
+            ks = metrics.get('ks') or {}
+            chi2 = metrics.get('chi_square') or {}
+            rows.append((
+                window_end, window, model_name, class_name, feature,
+                metrics['psi'], metrics['jensen_shannon'],
+                ks.get('statistic'), chi2.get('p_value'),
+                int(metrics['drift_detected']),
+                int(result['current_rows']), int(result['reference_rows'])
+            ))
+
+            if self.gauges:
+                labels = (window, model_name, class_name, feature)
+                for name in ('psi', 'jensen_shannon'):
+                    if metrics[name] is not None:
+                        self.gauges[name].labels(*labels).set(metrics[name])
+                self.gauges['drift_detected'].labels(*labels).set(int(metrics['drift_detected']))
+        return rows
+
+    def evaluate_window(self, window: str, hours: int, window_end: datetime) -> List[tuple]:
+        """Рахує дрифт усіх зрізів для одного вікна, що закінчується в window_end"""
+        window_start = window_end - timedelta(hours=hours)
+        baseline_start = window_start - timedelta(hours=Config.DRIFT_MONITOR_BASELINE_HOURS)
+        fmt = '%Y-%m-%d %H:%M:%S'
+
+        current = _with_model_totals(self.clickhouse_client.get_slice_sketches(
+            window_start.strftime(fmt), window_end.strftime(fmt)))
+        baseline = _with_model_totals(self.clickhouse_client.get_slice_sketches(
+            baseline_start.strftime(fmt), window_start.strftime(fmt)))
+
+        # Зрізи без baseline або з надто малою кількістю рядків пропускаємо
+        tasks = [
+            (model_name, class_name, baseline[(model_name, class_name)], sketch,
+             Config.DRIFT_PSI_THRESHOLD, Config.DRIFT_JS_THRESHOLD)
+            for (model_name, class_name), sketch in current.items()
+            if (model_name, class_name) in baseline and sketch.rows >= Config.DRIFT_MONITOR_MIN_ROWS
+        ]
+
+        rows = []
+        for model_name, class_name, result in self.pool.map(_compare_slice, tasks):
+            rows.extend(self._score_rows(window, window_end, model_name, class_name, result))
+        return rows
+
+    def run_once(self) -> int:
+        """Обробляє всі нові межі годин; повертає кількість записаних рядків"""
+        written = 0
+        for window_end in self._pending_window_ends():
+            rows = []
+            for window, hours in WINDOWS.items():
+                rows.extend(self.evaluate_window(window, hours, window_end))
+
+            self.clickhouse_client.insert_rows(Config.DRIFT_MONITOR_TABLE, SCORE_COLUMNS, rows)
+            # Ватермарка зсувається лише після запису, тож після падіння вікно буде перераховане
+            self._save_watermark(window_end)
+            written += len(rows)
+
+            drifted = sum(row[9] for row in rows)
+            logger.info(f"Window end {window_end}: {len(rows)} scores, {drifted} drifted")
+
+        return written
+
+    def run_forever(self):
+        """Головний цикл сервісу"""
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+
+        while self.running:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Drift monitor iteration failed: {e}")
+
+            # Сон дрібними кроками, щоб швидко реагувати на зупинку
+            deadline = time.monotonic() + Config.DRIFT_MONITOR_INTERVAL_SECONDS
+            while self.running and time.monotonic() < deadline:
+                time.sleep(1)
+
+        self.pool.shutdown()
+        logger.info("Drift monitor stopped")
+
+    def stop(self):
+        self.running = False
+
+
+def main():
+    """Головна функція"""
+    print("🚀 YOLO Drift Monitor")
+    print("=" * 30)
+    Config.print_config()
+
+    try:
+        monitor = DriftMonitor()
+        monitor.run_forever()
+    except KeyboardInterrupt:
+        print("👋 Stopped")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Межі кошиків гістограми впевненості (ширина 0.1)
+CONFIDENCE_BIN_EDGES = np.linspace(0.0, 1.0, 11)
+
+# Логарифмічні межі кошиків затримки у секундах (1 мс .. 60 с) + кошики для викидів
+LATENCY_BIN_EDGES = np.concatenate(([0.0], np.geomspace(0.001, 60.0, 49), [np.inf]))
+
+# Межі кошиків статистик зображення (monitoring/image_stats.py); остання межа - для викидів
+IMAGE_FEATURE_BIN_EDGES = {
+    'image_brightness': np.linspace(0.0, 256.0, 17),
+    'image_contrast': np.concatenate((np.linspace(0.0, 128.0, 17), [np.inf])),
+    'image_blur': np.concatenate(([0.0], np.geomspace(1.0, 1e5, 21), [np.inf]))
+}
+
+# Формат ватермарки та ключів годинних кошиків (час сервера ClickHouse)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+
+STATE_VERSION = 1
+
+
+class FeatureSketch:
+    """
+    Злиттєві скетчі ознак для аналізу дрифту: гістограма впевненості,
+    кількості класів та гістограма затримки з фіксованими межами.
+    Усі лічильники зважені sampling_weight, тож семпльовані спани
+    дають оцінку повного трафіку.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.confidence = np.zeros(len(CONFIDENCE_BIN_EDGES) - 1)
+        self.latency = np.zeros(len(LATENCY_BIN_EDGES) - 1)
+        self.classes: Dict[str, float] = {}
+        self.image = {name: np.zeros(len(edges) - 1) for name, edges in IMAGE_FEATURE_BIN_EDGES.items()}
+
+    def update(self, df: pd.DataFrame):
+        """Додає рядки детекцій (колонки DATASET_COLUMNS)"""
+        if df.empty:
+            return
+
+        # Reference набір з Evidently Cloud містить лише class_name, confidence, processing_time
+        if 'sampling_weight' in df:
+            weights = df['sampling_weight'].fillna(1.0).to_numpy(dtype=np.float64)
+        else:
+            weights = np.ones(len(df))
+        self.rows += len(df)
+
+        confidence = df['confidence'].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(confidence)
+        # Індекс кошика рахується так само, як у ClickHouse: floor(confidence * bins)
+        bins = len(self.confidence)
+        buckets = np.minimum(np.floor(np.clip(confidence[valid], 0.0, 1.0) * bins), bins - 1).astype(np.int64)
+        self.confidence += np.bincount(buckets, weights=weights[valid], minlength=bins)
+
+        # Затримка належить передбаченню, а не об'єкту: беремо перший об'єкт кожного передбачення
+        if 'object_index' in df:
+            first = (df['object_index'] == 0).fillna(False).to_numpy(dtype=bool)
+        else:
+            first = np.ones(len(df), dtype=bool)
+        latency = df['processing_time'].to_numpy(dtype=np.float64, na_value=np.nan)
+        first &= ~np.isnan(latency)
+        self.latency += np.histogram(latency[first], bins=LATENCY_BIN_EDGES, weights=weights[first])[0]
+
+        # Статистики зображення також належать передбаченню; старі дані та reference їх не мають
+        for name, edges in IMAGE_FEATURE_BIN_EDGES.items():
+            if name not in df:
+                continue
+            values = df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+            mask = first & ~np.isnan(values)
+            self.image[name] += np.histogram(values[mask], bins=edges, weights=weights[mask])[0]
+
+        class_names = df['class_name'].astype(object)
+        has_class = class_names.notna() & (class_names != '')
+        counts = pd.Series(weights[has_class.to_numpy()]).groupby(
+            class_names[has_class].to_numpy()
+        ).sum()
+        for class_name, count in counts.items():
+            self.classes[class_name] = self.classes.get(class_name, 0.0) + float(count)
+
+    def merge(self, other: 'FeatureSketch'):
+        """Зливає інший скетч у поточний"""
+        self.rows += other.rows
+        self.confidence += other.confidence
+        self.latency += other.latency
+        for name, counts in other.image.items():
+            self.image[name] += counts
+        for class_name, count in other.classes.items():
+            self.classes[class_name] = self.classes.get(class_name, 0.0) + count
+
+    def latency_quantiles(self, quantiles: List[float]) -> Dict[str, Optional[float]]:
+        """Оцінює квантилі затримки (мс) інтерполяцією в межах логарифмічних кошиків"""
+        total = self.latency.sum()
+        if total <= 0:
+            return {f"p{int(q * 100)}": None for q in quantiles}
+
+        cumulative = np.cumsum(self.latency) / total
+        upper = LATENCY_BIN_EDGES[1:].copy()
+        upper[-1] = LATENCY_BIN_EDGES[-2]  # останній кошик відкритий, обмежуємо його лівою межею
+
+        result = {}
+        for q in quantiles:
+            i = int(np.searchsorted(cumulative, q))
+            lower_cum = cumulative[i - 1] if i > 0 else 0.0
+            fraction = (q - lower_cum) / max(cumulative[i] - lower_cum, 1e-12)
+            value = LATENCY_BIN_EDGES[i] + fraction * (upper[i] - LATENCY_BIN_EDGES[i])
+            result[f"p{int(q * 100)}"] = round(float(value) * 1000, 2)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'confidence': self.confidence.tolist(),
+            'latency': self.latency.tolist(),
+            'classes': self.classes,
+            'image': {name: counts.tolist() for name, counts in self.image.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FeatureSketch':
+        sketch = cls()
+        sketch.rows = data['rows']
+        sketch.confidence = np.asarray(data['confidence'], dtype=np.float64)
+        sketch.latency = np.asarray(data['latency'], dtype=np.float64)
+        sketch.classes = dict(data['classes'])
+        for name, counts in data.get('image', {}).items():
+            if name in sketch.image and len(counts) == len(sketch.image[name]):
+                sketch.image[name] = np.asarray(counts, dtype=np.float64)
+        return sketch
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'FeatureSketch':
+        sketch = cls()
+        sketch.update(df)
+        return sketch
+
+
+class DriftState:
+    """
+    Стан інкрементального аналізу дрифту, що зберігається в JSON файлі:
+    ватермарка (час останнього обробленого рядка) та скетчі по годинах.
+    Кожен запуск дочитує лише рядки після ватермарки, а вікно
+    CURRENT_DAYS_AGO збирається злиттям годинних скетчів.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.source: Optional[str] = None
+        self.watermark: Optional[str] = None
+        self.hours: Dict[str, FeatureSketch] = {}
+        self.reference_id: Optional[str] = None
+        self.reference: Optional[FeatureSketch] = None
+
+    @classmethod
+    def load(cls, path: str, source: str) -> 'DriftState':
+        """Завантажує стан; при зміні джерела даних починає з нуля"""
+        state = cls(path)
+        state.source = source
+
+        if not os.path.exists(path):
+            return state
+
+        with open(path) as f:
+            data = json.load(f)
+
+        if data.get('version') != STATE_VERSION:
+            return state
+
+        state.reference_id = data.get('reference_id')
+        if data.get('reference'):
+            state.reference = FeatureSketch.from_dict(data['reference'])
+
+        # Ватермарка та годинні скетчі прив'язані до конкретного джерела
+        if data.get('source') == source:
+            state.watermark = data.get('watermark')
+            state.hours = {
+                hour: FeatureSketch.from_dict(sketch)
+                for hour, sketch in data.get('hours', {}).items()
+            }
+
+        return state
+
+    def save(self):
+        """Атомарно зберігає стан (запис у тимчасовий файл + rename)"""
+        data = {
+            'version': STATE_VERSION,
+            'source': self.source,
+            'watermark': self.watermark,
+            'reference_id': self.reference_id,
+            'reference': self.reference.to_dict() if self.reference else None,
+            'hours': {hour: sketch.to_dict() for hour, sketch in sorted(self.hours.items())}
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def set_reference(self, reference_id: str, df: pd.DataFrame):
+        """Зберігає скетч reference набору, щоб не завантажувати його щоразу"""
+        self.reference_id = reference_id
+        self.reference = FeatureSketch.from_dataframe(df)
+
+    def update(self, df: pd.DataFrame):
+        """Розкладає нові рядки по годинних скетчах"""
+        if df.empty:
+            return
+
+        hours = df['timestamp'].dt.floor('h').dt.strftime(HOUR_FORMAT)
+        for hour, group in df.groupby(hours.to_numpy()):
+            self.hours.setdefault(hour, FeatureSketch()).update(group)
+
+    def rewind(self, hours: int) -> Optional[str]:
+        """
+        Готує повторне читання хвоста: видаляє скетчі годин, що починаються не раніше
+        ніж за hours годин до ватермарки, та повертає початок першої з них.
+        Рядки з часом до ватермарки, що дійшли пізніше (повтори колектора, спул),
+        потрапляють у скетчі, якщо відстають не більше ніж на hours годин.
+        Без ватермарки повертає None (читання всього вікна).
+        """
+        if not self.watermark:
+            return None
+
+        start = (datetime.strptime(self.watermark, TIME_FORMAT) - timedelta(hours=hours)).strftime(HOUR_FORMAT)
+        self.hours = {hour: sketch for hour, sketch in self.hours.items() if hour < start}
+        return start
+
+    def prune(self, until: str, days: int):
+        """Видаляє годинні скетчі, що вийшли за межі вікна"""
+        cutoff = (datetime.strptime(until, TIME_FORMAT) - timedelta(days=days)).strftime(HOUR_FORMAT)
+        self.hours = {hour: sketch for hour, sketch in self.hours.items() if hour >= cutoff}
+
+    def window(self) -> FeatureSketch:
+        """Зливає годинні скетчі у скетч усього вікна"""
+        merged = FeatureSketch()
+        for sketch in self.hours.values():
+            merged.merge(sketch)
+        return merged
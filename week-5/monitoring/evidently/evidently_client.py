@@ -7,19 +7,28 @@ from typing import Dict, Any
 from datetime import datetime
 
 from config import Config
+from reference_cache import ReferenceCache
+from sampling import sample_drift_deviation, stratified_sample
 
 logger = logging.getLogger(__name__)
 
 class EvidentlyClient:
     def __init__(self):
-        if not Config.EVIDENTLY_API_KEY:
-            raise ValueError("EVIDENTLY_API_KEY is required. Please set it in environment variables.")
-        
-        self.workspace = CloudWorkspace(
-            token=Config.EVIDENTLY_API_KEY,
-            url=Config.EVIDENTLY_URL
-        )
+        self._workspace = None
         self.project = None
+        self.reference_cache = ReferenceCache(Config.REFERENCE_CACHE_DIR) if Config.REFERENCE_CACHE_ENABLED else None
+
+    @property
+    def workspace(self) -> CloudWorkspace:
+        """Підключення до Evidently Cloud при першому зверненні: reference з кешу його не потребує"""
+        if self._workspace is None:
+            if not Config.EVIDENTLY_API_KEY:
+                raise ValueError("EVIDENTLY_API_KEY is required. Please set it in environment variables.")
+            self._workspace = CloudWorkspace(
+                token=Config.EVIDENTLY_API_KEY,
+                url=Config.EVIDENTLY_URL
+            )
+        return self._workspace
     
     def create_or_get_project(self) -> Any:
         """Створюємо або отримуємо існуючий проект"""
@@ -55,17 +64,16 @@ class EvidentlyClient:
         if df.empty:
             raise ValueError(f"DataFrame is empty for dataset: {dataset_name}")
         
-        # Очищуємо дані
-        df_clean = df.copy()
-        df_clean = df_clean.dropna(subset=['class_name', 'confidence'])
-        
-        # Залишаємо лише основні ознаки для аналізу дрейфу YOLO
-        features_df = df_clean[['class_name', 'confidence', 'processing_time']]
-        
         # Створюємо Dataset для Evidently
-        dataset = Dataset.from_pandas(pd.DataFrame(features_df))
+        dataset = Dataset.from_pandas(self.prepare_features(df))
         
         return dataset
+
+    @staticmethod
+    def prepare_features(df: pd.DataFrame) -> pd.DataFrame:
+        """Очищує дані та залишає лише основні ознаки для аналізу дрейфу YOLO"""
+        df_clean = df.dropna(subset=['class_name', 'confidence'])
+        return pd.DataFrame(df_clean[['class_name', 'confidence', 'processing_time']]).reset_index(drop=True)
     
     def upload_dataset(self, df: pd.DataFrame, dataset_name: str, description: str = "") -> str:
         """Завантажуємо набір даних у Evidently Cloud"""
@@ -90,14 +98,56 @@ class EvidentlyClient:
             logger.error(f"Error uploading dataset '{dataset_name}': {e}")
             raise
     
+    def upload_drift_result(self, result: Dict[str, Any]) -> str:
+        """Завантажує результат локального аналізу дрифту в Cloud як набір метрик по ознаках"""
+        self.create_or_get_project()
+
+        rows = [
+            {
+                'feature': feature,
+                'psi': metrics['psi'],
+                'jensen_shannon': metrics['jensen_shannon'],
+                'drift_detected': metrics['drift_detected']
+            }
+            for feature, metrics in result['features'].items()
+        ]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        try:
+            return self.workspace.add_dataset(
+                dataset=Dataset.from_pandas(pd.DataFrame(rows)),
+                name=f"drift_{result['mode']}_{timestamp}",
+                project_id=self.project.id,
+                description=(f"Local drift analysis ({result['source']}, reference {result['reference']}): "
+                             f"dataset drift {result['dataset_drift']}")
+            )
+        except Exception as e:
+            logger.error(f"Error uploading drift result: {e}")
+            raise
+
+    def cache_reference(self, dataset_id: str, df: pd.DataFrame):
+        """Зберігає reference набір у локальний кеш (ті ж ознаки, що й у Cloud)"""
+        if self.reference_cache is None:
+            return
+        path = self.reference_cache.store(str(dataset_id), self.prepare_features(df))
+        logger.info(f"Reference dataset {dataset_id} cached at {path}")
+
     def download_dataset(self, dataset_id: str) -> pd.DataFrame:
-        """Завантажуємо набір даних з Evidently Cloud"""
+        """Завантажуємо набір даних з локального кешу або з Evidently Cloud"""
+        if self.reference_cache is not None:
+            df = self.reference_cache.load(dataset_id)
+            if df is not None:
+                logger.info(f"Dataset {dataset_id} loaded from local cache")
+                return df
+
         try:
             # Завантажуємо набір даних
             dataset = self.workspace.load_dataset(dataset_id=dataset_id)
             
             # Преобразуем в DataFrame
             df = dataset.as_dataframe()
+
+            # Reference набори незмінні, тому кешуємо їх для наступних запусків
+            self.cache_reference(dataset_id, df)
             
             return df
             
@@ -105,6 +155,38 @@ class EvidentlyClient:
             logger.error(f"Error downloading dataset {dataset_id}: {e}")
             raise
     
+    def sample_current(self, reference_df: pd.DataFrame, current_df: pd.DataFrame):
+        """
+        Стратифікована вибірка current даних (DRIFT_SAMPLE_ROWS рядків, class_name x DRIFT_SAMPLE_TIME_BUCKET).
+        Якщо PSI / JS на вибірці відхиляються від повних даних більше за DRIFT_SAMPLE_TOLERANCE,
+        повертаються повні дані.
+
+        Returns:
+            (набір для звіту, опис вибірки з sampling_rate)
+        """
+        sample_df, sampling = stratified_sample(
+            current_df,
+            Config.DRIFT_SAMPLE_ROWS,
+            seed=Config.DRIFT_SAMPLE_SEED,
+            time_bucket=Config.DRIFT_SAMPLE_TIME_BUCKET or None
+        )
+        if sampling['sample_rows'] == sampling['rows']:
+            return current_df, sampling
+
+        logger.info(f"Current dataset sampled: {sampling['sample_rows']} of {sampling['rows']} rows "
+                    f"(rate {sampling['sampling_rate']}, {sampling['strata']} strata, seed {sampling['seed']})")
+
+        if Config.DRIFT_SAMPLE_CHECK:
+            check = sample_drift_deviation(reference_df, current_df, sample_df, Config.DRIFT_SAMPLE_TOLERANCE)
+            logger.info(f"Sample drift deviation: PSI {check['max_psi_delta']}, JS {check['max_js_delta']} "
+                        f"(tolerance {check['tolerance']})")
+            if not check['within_tolerance']:
+                logger.warning("Sample drift metrics are outside tolerance, using the full current dataset")
+                sampling.update({'sample_rows': sampling['rows'], 'sampling_rate': 1.0})
+                return current_df, sampling
+
+        return sample_df, sampling
+
     def create_and_upload_drift_report(self, reference_dataset_id: str, current_df: pd.DataFrame) -> str:
         """
         Створюємо звіт про дрейф, використовуючи reference з Cloud та поточні дані
@@ -123,6 +205,9 @@ class EvidentlyClient:
             # Завантажуємо reference набір даних з Cloud
             reference_df = self.download_dataset(reference_dataset_id)
             
+            # Великі вікна зменшуються стратифікованою вибіркою до побудови звіту
+            current_df, sampling = self.sample_current(reference_df, current_df)
+
             # Готуємо набори даних
             reference_dataset = self.prepare_dataset_for_evidently(reference_df, "reference")
             current_dataset = self.prepare_dataset_for_evidently(current_df, "current")
@@ -134,7 +219,9 @@ class EvidentlyClient:
                 tags=[
                     "yolo_monitoring",
                     f"reference_dataset:{reference_dataset_id}",
-                    f"created:{timestamp}"
+                    f"created:{timestamp}",
+                    f"current_rows:{sampling['rows']}",
+                    f"sampling_rate:{sampling['sampling_rate']}"
                 ]
             )
             
@@ -0,0 +1,191 @@
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from drift_state import IMAGE_FEATURE_BIN_EDGES, FeatureSketch
+
+# Ознаки, для яких рахується дрифт: ті ж, що й у звіті Evidently, плюс статистики зображення
+CATEGORICAL_FEATURES = ['class_name']
+NUMERICAL_FEATURES = ['confidence', 'processing_time'] + list(IMAGE_FEATURE_BIN_EDGES)
+
+# Частка ознак з дрифтом, після якої дрифт вважається дрифтом набору (як у DataDriftPreset)
+DATASET_DRIFT_SHARE = 0.5
+
+EPS = 1e-6
+
+
+def _normalize(counts: np.ndarray) -> np.ndarray:
+    return np.clip(counts / counts.sum(), EPS, None)
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray) -> Optional[float]:
+    """PSI між двома гістограмами з однаковими кошиками"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    if expected.sum() <= 0 or actual.sum() <= 0:
+        return None
+
+    p = _normalize(expected)
+    q = _normalize(actual)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def jensen_shannon_distance(expected: np.ndarray, actual: np.ndarray) -> Optional[float]:
+    """Відстань Дженсена-Шеннона (основа 2, в межах 0..1)"""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    if expected.sum() <= 0 or actual.sum() <= 0:
+        return None
+
+    p = expected / expected.sum()
+    q = actual / actual.sum()
+    m = (p + q) / 2
+
+    def kl(a: np.ndarray, b: np.ndarray) -> float:
+        mask = a > 0
+        return float(np.sum(a[mask] * np.log2(a[mask] / b[mask])))
+
+    return math.sqrt(max((kl(p, m) + kl(q, m)) / 2, 0.0))
+
+
+def kolmogorov_smirnov(expected: np.ndarray, actual: np.ndarray) -> Optional[Dict[str, float]]:
+    """
+    KS статистика за кумулятивними розподілами кошиків та асимптотичне p-value.
+    На кошиках статистика є нижньою оцінкою KS за сирими значеннями.
+    """
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    n, m = expected.sum(), actual.sum()
+    if n <= 0 or m <= 0:
+        return None
+
+    statistic = float(np.max(np.abs(np.cumsum(expected) / n - np.cumsum(actual) / m)))
+
+    # Розподіл Колмогорова з поправкою Стівенса для ефективного розміру вибірки
+    effective_n = math.sqrt(n * m / (n + m))
+    lam = (effective_n + 0.12 + 0.11 / effective_n) * statistic
+    if lam < 1e-3:
+        p_value = 1.0
+    else:
+        k = np.arange(1, 101)
+        p_value = float(2 * np.sum((-1) ** (k - 1) * np.exp(-2 * (k * lam) ** 2)))
+
+    return {'statistic': statistic, 'p_value': min(max(p_value, 0.0), 1.0)}
+
+
+def chi_square(expected: np.ndarray, actual: np.ndarray) -> Optional[Dict[str, float]]:
+    """
+    Хі-квадрат тест однорідності для таблиці 2 x k (порожні кошики відкидаються).
+    p-value через апроксимацію Вілсона-Гілферті.
+    """
+    table = np.vstack([np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64)])
+    table = table[:, table.sum(axis=0) > 0]
+    if table.shape[1] < 2 or (table.sum(axis=1) <= 0).any():
+        return None
+
+    expected_counts = np.outer(table.sum(axis=1), table.sum(axis=0)) / table.sum()
+    statistic = float(np.sum((table - expected_counts) ** 2 / expected_counts))
+    dof = table.shape[1] - 1
+
+    z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+    p_value = 0.5 * math.erfc(z / math.sqrt(2))
+
+    return {'statistic': statistic, 'dof': dof, 'p_value': p_value}
+
+
+def _feature_bins(reference: FeatureSketch, current: FeatureSketch, feature: str):
+    """Повертає узгоджені кошики ознаки для двох скетчів"""
+    if feature == 'class_name':
+        names = sorted(set(reference.classes) | set(current.classes))
+        return (np.array([reference.classes.get(name, 0.0) for name in names]),
+                np.array([current.classes.get(name, 0.0) for name in names]))
+    if feature == 'confidence':
+        return reference.confidence, current.confidence
+    if feature == 'processing_time':
+        return reference.latency, current.latency
+    if feature in IMAGE_FEATURE_BIN_EDGES:
+        return reference.image[feature], current.image[feature]
+    raise ValueError(f"Unknown feature: {feature}")
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 4)
+
+
+def compare_sketches(reference: FeatureSketch,
+                     current: FeatureSketch,
+                     psi_threshold: float = 0.2,
+                     js_threshold: float = 0.1,
+                     features: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Порівнює reference та current скетчі по всіх ознаках.
+    Ознака вважається дрифтуючою, якщо PSI або JS перевищує поріг;
+    p-values тестів наводяться для довідки (на великих вибірках вони
+    чутливі до будь-якого зсуву).
+
+    Args:
+        features: Підмножина ознак (за замовчуванням усі)
+    """
+    results = {}
+
+    for feature in features or CATEGORICAL_FEATURES + NUMERICAL_FEATURES:
+        expected, actual = _feature_bins(reference, current, feature)
+
+        # Ознаки без даних з будь-якого боку (наприклад, reference без статистик зображення) пропускаємо
+        if expected.sum() <= 0 or actual.sum() <= 0:
+            continue
+
+        psi = population_stability_index(expected, actual)
+        js = jensen_shannon_distance(expected, actual)
+
+        result = {
+            'type': 'cat' if feature in CATEGORICAL_FEATURES else 'num',
+            'psi': _round(psi),
+            'jensen_shannon': _round(js),
+            'chi_square': chi_square(expected, actual),
+            'drift_detected': bool((psi is not None and psi >= psi_threshold) or
+                                   (js is not None and js >= js_threshold))
+        }
+        if feature in NUMERICAL_FEATURES:
+            result['ks'] = kolmogorov_smirnov(expected, actual)
+
+        results[feature] = result
+
+    drifted = [name for name, result in results.items() if result['drift_detected']]
+    return {
+        'reference_rows': reference.rows,
+        'current_rows': current.rows,
+        'reference_latency_ms': reference.latency_quantiles([0.5, 0.9, 0.99]),
+        'current_latency_ms': current.latency_quantiles([0.5, 0.9, 0.99]),
+        'features': results,
+        'drifted_features': drifted,
+        'dataset_drift': bool(results) and len(drifted) / len(results) >= DATASET_DRIFT_SHARE
+    }
+
+
+class DriftResultStore:
+    """Локальне сховище результатів дрифту: один JSON рядок на запуск"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        record = {'created_at': datetime.now().isoformat(), **result}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        return record
+
+    def read(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Повертає останні limit результатів (найновіші в кінці)"""
+        if not os.path.exists(self.path):
+            return []
+
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return records[-limit:] if limit else records
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceCache:
+    """
+    Локальний кеш reference наборів даних у форматі Parquet.
+    Reference набори в Evidently Cloud незмінні, тож файл з ключем
+    dataset_id можна використовувати повторно без завантаження з мережі.
+    Поруч з файлом зберігається {dataset_id}.json з контрольною сумою SHA-256.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _paths(self, dataset_id: str):
+        # dataset_id - UUID, але не дозволяємо вийти за межі каталогу кешу
+        safe_id = os.path.basename(str(dataset_id))
+        base = os.path.join(self.cache_dir, safe_id)
+        return f"{base}.parquet", f"{base}.json"
+
+    @staticmethod
+    def _checksum(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def contains(self, dataset_id: str) -> bool:
+        """Чи є набір у кеші (без перевірки контрольної суми)"""
+        return all(os.path.exists(path) for path in self._paths(dataset_id))
+
+    def load(self, dataset_id: str) -> Optional[pd.DataFrame]:
+        """
+        Повертає набір з кешу або None, якщо його немає чи контрольна сума не збігається.
+        Parquet читається через memory map, без копіювання файлу в буфер.
+        """
+        data_path, meta_path = self._paths(dataset_id)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+
+            if meta.get('sha256') != self._checksum(data_path):
+                logger.warning(f"Reference cache checksum mismatch for {dataset_id}, ignoring cached file")
+                return None
+
+            table = pq.read_table(data_path, memory_map=True)
+            return table.to_pandas()
+
+        except Exception as e:
+            logger.warning(f"Failed to read reference cache for {dataset_id}: {e}")
+            return None
+
+    def store(self, dataset_id: str, df: pd.DataFrame) -> str:
+        """Записує набір у кеш (атомарно: тимчасовий файл + rename) та повертає шлях"""
+        data_path, meta_path = self._paths(dataset_id)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        tmp_path = f"{data_path}.tmp"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        checksum = self._checksum(tmp_path)
+        os.replace(tmp_path, data_path)
+
+        meta = {
+            'dataset_id': str(dataset_id),
+            'sha256': checksum,
+            'rows': len(df),
+            'columns': list(df.columns),
+            'cached_at': datetime.now().isoformat()
+        }
+        with open(f"{meta_path}.tmp", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+        return data_path
@@ -0,0 +1,158 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from drift_state import FeatureSketch
+from local_drift import compare_sketches
+
+# Ознаки звіту Evidently (див. EvidentlyClient.prepare_features)
+REPORT_FEATURES = ['class_name', 'confidence', 'processing_time']
+
+
+def _allocate(sizes: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Пропорційний розподіл бюджету рядків між стратами (метод найбільших залишків).
+    Кожна непорожня страта отримує хоча б один рядок, якщо страт не більше за бюджет,
+    тож рідкісні класи та години не зникають з вибірки. Сума не перевищує budget:
+    рядки, додані малим стратам, забираються у страт, що найбільше перевищують квоту.
+    """
+    quotas = budget * sizes / sizes.sum()
+    counts = np.floor(quotas).astype(np.int64)
+    if len(sizes) <= budget:
+        counts = np.maximum(counts, 1)
+    counts = np.minimum(counts, sizes)
+
+    excess = counts.sum() - budget
+    while excess > 0:
+        # Страти з одним рядком не зменшуємо; страт не більше за бюджет, тож цикл завершується
+        over = np.where(counts > 1, counts - quotas, -np.inf)
+        take = np.argsort(-over, kind='stable')[:excess]
+        take = take[over[take] > -np.inf]
+        counts[take] -= 1
+        excess -= len(take)
+
+    remaining = budget - counts.sum()
+    if remaining > 0:
+        # Залишок віддаємо стратам з найбільшою дробовою частиною квоти, що ще мають рядки
+        remainders = np.where(counts < sizes, quotas - counts, -np.inf)
+        for index in np.argsort(-remainders, kind='stable')[:remaining]:
+            if remainders[index] == -np.inf:
+                break
+            counts[index] += 1
+    return counts
+
+
+def stratified_sample(df: pd.DataFrame,
+                      budget: int,
+                      seed: int = 42,
+                      time_bucket: Optional[str] = '1h',
+                      strata: Optional[List[str]] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Стратифікована вибірка рядків детекцій не більше budget рядків.
+    Страти - class_name та часовий кошик timestamp (floor до time_bucket),
+    частка кожної страти у вибірці пропорційна її частці в наборі.
+    sampling_weight рядків вибірки множиться на 1 / частку відібраних у страті,
+    тож зважені скетчі дають оцінку повного набору.
+
+    Args:
+        budget: Максимальна кількість рядків вибірки (0 - без вибірки)
+        seed: Seed генератора: той самий набір дає ту саму вибірку
+        time_bucket: Частота pandas для часових кошиків (None - лише за класами)
+        strata: Колонки страт (за замовчуванням ['class_name'])
+
+    Returns:
+        (вибірка, опис: кількість рядків, частка вибірки, кількість страт)
+    """
+    rows = len(df)
+    info = {'rows': rows, 'sample_rows': rows, 'sampling_rate': 1.0, 'strata': 0,
+            'budget': budget, 'seed': seed, 'time_bucket': time_bucket}
+    if budget <= 0 or rows <= budget:
+        return df, info
+
+    keys = [df[column].astype(object).fillna('') for column in strata or ['class_name']]
+    if time_bucket and 'timestamp' in df:
+        keys.append(df['timestamp'].dt.floor(time_bucket))
+
+    group = pd.DataFrame({i: key.to_numpy() for i, key in enumerate(keys)}).groupby(
+        list(range(len(keys))), sort=True, dropna=False
+    ).ngroup().to_numpy()
+    sizes = np.bincount(group)
+    counts = _allocate(sizes, budget)
+
+    # Випадковий ранг рядка всередині страти; відбираються рядки з рангом < квоти страти
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(rows), group))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.empty(rows, dtype=np.int64)
+    rank[order] = np.arange(rows) - starts[group[order]]
+    keep = rank < counts[group]
+
+    sample = df[keep].reset_index(drop=True)
+    if 'sampling_weight' in sample:
+        scale = sizes[group[keep]] / counts[group[keep]]
+        sample['sampling_weight'] = sample['sampling_weight'].fillna(1.0).to_numpy(dtype=np.float64) * scale
+
+    info.update({
+        'sample_rows': len(sample),
+        'sampling_rate': round(len(sample) / rows, 6),
+        'strata': len(sizes)
+    })
+    return sample, info
+
+
+def sample_drift_deviation(reference_df: pd.DataFrame,
+                           full_df: pd.DataFrame,
+                           sample_df: pd.DataFrame,
+                           tolerance: float,
+                           features: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Порівнює метрики дрифту (PSI, Jensen-Shannon) reference проти повного
+    current набору та проти вибірки. Рахується без ваг, як у звіті Evidently.
+    Вибірка в межах допуску, якщо відхилення кожної метрики не більше tolerance.
+
+    Returns:
+        Різниці по ознаках, максимальні різниці та within_tolerance
+    """
+    features = features or REPORT_FEATURES
+
+    def sketch(df: pd.DataFrame) -> FeatureSketch:
+        return FeatureSketch.from_dataframe(df[[column for column in REPORT_FEATURES if column in df]])
+
+    reference = sketch(reference_df)
+    full = compare_sketches(reference, sketch(full_df), features=features)['features']
+    sampled = compare_sketches(reference, sketch(sample_df), features=features)['features']
+
+    deviations = {}
+    for feature, result in full.items():
+        sample_result = sampled.get(feature, {})
+        deviations[feature] = {
+            'psi_full': result['psi'],
+            'psi_sample': sample_result.get('psi'),
+            'psi_delta': _delta(result['psi'], sample_result.get('psi')),
+            'js_full': result['jensen_shannon'],
+            'js_sample': sample_result.get('jensen_shannon'),
+            'js_delta': _delta(result['jensen_shannon'], sample_result.get('jensen_shannon')),
+            'drift_full': result['drift_detected'],
+            'drift_sample': sample_result.get('drift_detected')
+        }
+
+    max_psi_delta = max((d['psi_delta'] for d in deviations.values()), default=0.0)
+    max_js_delta = max((d['js_delta'] for d in deviations.values()), default=0.0)
+    return {
+        'features': deviations,
+        'max_psi_delta': max_psi_delta,
+        'max_js_delta': max_js_delta,
+        'tolerance': tolerance,
+        'within_tolerance': max(max_psi_delta, max_js_delta) <= tolerance
+    }
+
+
+def _delta(full: Optional[float], sample: Optional[float]) -> float:
+    """
+    Відхилення метрики вибірки від повного набору: абсолютне для значень до 1,
+    відносне для більших (PSI між дуже різними розподілами може бути десятками)
+    """
+    if full is None or sample is None:
+        return float('inf') if full != sample else 0.0
+    return round(abs(full - sample) / max(1.0, abs(full)), 4)
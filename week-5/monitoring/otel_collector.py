@@ -1,137 +1,514 @@
 import os
+import random
+import time
 import uuid
+import threading
+from collections import deque
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 import logging
 
-from opentelemetry import trace
+from opentelemetry import trace, metrics
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import MetricReader, PeriodicExportingMetricReader
 from opentelemetry.sdk.resources import Resource
+from opentelemetry.trace import Status, StatusCode
+
+from monitoring.image_stats import compute_image_stats, downsample
 
 logger = logging.getLogger(__name__)
 
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+# Режими запису детекцій
+RECORDING_EVENTS = "events"    # подія object_detected на кожен об'єкт
+RECORDING_COMPACT = "compact"  # пакетні масиви в атрибутах спану + OTLP гістограми
+
+# Причини збереження передбачення при семплюванні
+SAMPLE_ERROR = "error"
+SAMPLE_LOW_CONFIDENCE = "low_confidence"
+SAMPLE_ZERO_OBJECTS = "zero_objects"
+SAMPLE_SLOW_REQUEST = "slow_request"
+SAMPLE_HEAD = "head"
+
 class YOLOOpenTelemetryCollector:
     """
     OpenTelemetry колектор для передбачень YOLO.
     Записує лише спани з даними про кожне передбачення.
+    Передбачення потрапляють в обмежену чергу в пам'яті, а спани
+    будуються фоновим потоком, тому запит не чекає на OTLP.
     """
-    
-    def __init__(self, 
+
+    def __init__(self,
                  service_name: str = "yolo-detection-api",
                  otel_endpoint: str = "http://otel-collector:4318",
-                 instance_id: Optional[str] = None):
-        
+                 instance_id: Optional[str] = None,
+                 queue_size: int = 1024,
+                 drop_policy: str = DROP_OLDEST,
+                 recording_mode: str = RECORDING_EVENTS,
+                 metrics_export_interval_millis: int = 10000,
+                 sample_rate: float = 1.0,
+                 low_confidence_threshold: float = 0.5,
+                 slow_request_ms: float = 1000.0,
+                 predictions_writer: Optional[Any] = None,
+                 image_stats: bool = True,
+                 bsp_max_queue_size: int = 256,
+                 bsp_max_export_batch_size: int = 32,
+                 bsp_schedule_delay_millis: int = 1000,
+                 bsp_export_timeout_millis: int = 3000,
+                 spool: Optional[Any] = None,
+                 span_exporter: Optional[SpanExporter] = None,
+                 metric_reader: Optional[MetricReader] = None):
+
+        if recording_mode not in (RECORDING_EVENTS, RECORDING_COMPACT):
+            raise ValueError(f"recording_mode must be '{RECORDING_EVENTS}' or '{RECORDING_COMPACT}'")
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"drop_policy must be '{DROP_OLDEST}' or '{DROP_NEWEST}'")
+        if queue_size <= 0:
+            raise ValueError("queue_size must be positive")
+        if not 0.0 < sample_rate <= 1.0:
+            raise ValueError("sample_rate must be in (0, 1]")
+
         self.session_id = str(uuid.uuid4())
         self.instance_id = instance_id or f"yolo-{uuid.uuid4().hex[:8]}"
         self.service_name = service_name
-        
+        self.recording_mode = recording_mode
+
+        # Head-семплювання: цікаві випадки зберігаються завжди, решта з ймовірністю sample_rate
+        self.sample_rate = sample_rate
+        self.low_confidence_threshold = low_confidence_threshold
+        self.slow_request_ms = slow_request_ms
+        self._rng = random.Random()
+
+        # Статистики зображення: у запиті лише зменшена копія, розрахунок у фоновому потоці
+        self.image_stats = image_stats
+
+        # Необов'язковий прямий запис у типізовану таблицю ClickHouse
+        self.predictions_writer = predictions_writer
+
+        # Необов'язковий локальний спул: передбачення, які не дійдуть до OTLP, дозавантажуються пізніше
+        self.spool = spool
+
+        # Обмежена черга записів передбачень
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self._queue = deque()
+        self._queue_cond = threading.Condition()
+        # Витіснені з черги записи: у спул їх пише фоновий потік, а не запит
+        self._evicted = deque()
+        self._closed = False
+
+        # Лічильники черги
+        self.records_enqueued = 0
+        self.records_exported = 0
+        self.records_dropped_oldest = 0
+        self.records_dropped_newest = 0
+        self.records_failed = 0
+        self.records_sampled_out = 0
+        self.records_spooled = 0
+
+        # Черга BatchSpanProcessor: при переповненні SDK мовчки відкидає спани
+        self.span_processor = None
+        self.bsp_max_queue_size = bsp_max_queue_size
+
         resource = Resource.create({
             "service.name": service_name,
             "service.instance.id": self.instance_id,
         })
-        
+
         try:
             # Налаштування провайдера трасування
-            trace.set_tracer_provider(TracerProvider(resource=resource))
-            
-            # OTLP експортер спанів
-            span_exporter = OTLPSpanExporter(
+            self.tracer_provider = TracerProvider(resource=resource)
+            trace.set_tracer_provider(self.tracer_provider)
+
+            # OTLP експортер спанів (або переданий ззовні, наприклад для бенчмарку)
+            span_exporter = span_exporter or OTLPSpanExporter(
                 endpoint=f"{otel_endpoint}/v1/traces"
             )
-            
-            # Батчевий процесор спанів
-            span_processor = BatchSpanProcessor(
+            if spool:
+                from monitoring.telemetry_spool import SpoolingSpanExporter
+
+                # Спани з невдалого експорту записуються у спул
+                span_exporter = SpoolingSpanExporter(span_exporter, spool)
+
+            # Батчевий процесор спанів (розміри підбираються під навантаження, див. ingest_benchmark)
+            self.span_processor = BatchSpanProcessor(
                 span_exporter,
-                max_queue_size=256,
-                max_export_batch_size=32,
-                export_timeout_millis=3000,
-                schedule_delay_millis=1000
+                max_queue_size=bsp_max_queue_size,
+                max_export_batch_size=bsp_max_export_batch_size,
+                export_timeout_millis=bsp_export_timeout_millis,
+                schedule_delay_millis=bsp_schedule_delay_millis
             )
-            
-            trace.get_tracer_provider().add_span_processor(span_processor)
-            self.tracer = trace.get_tracer(__name__)
-            
+
+            self.tracer_provider.add_span_processor(self.span_processor)
+            self.tracer = self.tracer_provider.get_tracer(__name__)
+
             print(f"✅ OpenTelemetry: {service_name} [{self.instance_id}]")
-            
+
         except Exception as e:
             print(f"❌ OpenTelemetry failed: {e}")
             self.tracer = None
-    
-    async def record_prediction(self, 
+
+        # OTLP гістограми для компактного режиму
+        self.meter_provider = None
+        if self.tracer and recording_mode == RECORDING_COMPACT:
+            try:
+                self._setup_metrics(resource, otel_endpoint, metrics_export_interval_millis, metric_reader)
+            except Exception as e:
+                print(f"❌ OpenTelemetry metrics failed: {e}")
+                self.meter_provider = None
+
+        # Фоновий потік, що перетворює записи на спани
+        self._worker = None
+        if self.tracer:
+            self._worker = threading.Thread(
+                target=self._drain_loop, name="otel-prediction-drain", daemon=True
+            )
+            self._worker.start()
+
+    def _setup_metrics(self,
+                       resource: Resource,
+                       otel_endpoint: str,
+                       export_interval_millis: int,
+                       metric_reader: Optional[MetricReader]):
+        """Налаштовує OTLP метрики: гістограми впевненості, затримки та кількості об'єктів"""
+        reader = metric_reader or PeriodicExportingMetricReader(
+            OTLPMetricExporter(endpoint=f"{otel_endpoint}/v1/metrics"),
+            export_interval_millis=export_interval_millis
+        )
+        self.meter_provider = MeterProvider(resource=resource, metric_readers=[reader])
+        metrics.set_meter_provider(self.meter_provider)
+        meter = self.meter_provider.get_meter(__name__)
+
+        self.confidence_histogram = meter.create_histogram(
+            "yolo.detection.confidence",
+            unit="1",
+            description="Впевненість детекцій за класами"
+        )
+        self.latency_histogram = meter.create_histogram(
+            "yolo.prediction.latency",
+            unit="ms",
+            description="Час обробки передбачення"
+        )
+        self.objects_histogram = meter.create_histogram(
+            "yolo.prediction.objects",
+            unit="1",
+            description="Кількість об'єктів класу на зображенні"
+        )
+
+    async def record_prediction(self,
                                image: Any,
                                detections: List[Dict],
                                processing_time_ms: float,
                                filename: str = "unknown",
                                model_name: str = "yolo11n",
-                               confidence_threshold: float = 0.90) -> Optional[str]:
+                               confidence_threshold: Optional[float] = None,
+                               error: Optional[str] = None) -> Optional[str]:
         """
-        Записує дані передбачення у спан.
+        Ставить дані передбачення в чергу на запис у спан.
+        Не блокує запит: спан будується фоновим потоком.
+        Повертає prediction_id або None, якщо запис відкинуто чи не потрапив у вибірку.
         """
-        
+
         if not self.tracer:
             return None
-        
-        prediction_id = str(uuid.uuid4())
-        
-        # Створюємо спан з даними передбачення
-        with self.tracer.start_as_current_span("yolo_prediction") as span:
+
+        keep, weight, reason = self._sampling_decision(
+            detections, processing_time_ms,
+            self.low_confidence_threshold if confidence_threshold is None else confidence_threshold,
+            error
+        )
+        # Гістограми компактного режиму рахуються по всіх передбаченнях один раз, до семплювання
+        # та черги: передбачення поза вибіркою, витіснені з черги чи записані у спул теж враховуються
+        self._record_metrics({
+            "model_name": model_name,
+            "processing_time_ms": processing_time_ms,
+            "detections": detections
+        })
+        if not keep:
+            self.records_sampled_out += 1
+            return None
+
+        # Отримуємо розміри зображення одразу, щоб не тримати зображення в черзі
+        height, width = image.shape[:2] if hasattr(image, 'shape') else (0, 0)
+        thumbnail = downsample(image) if self.image_stats else None
+
+        record = {
+            "prediction_id": str(uuid.uuid4()),
+            "start_time_ns": time.time_ns(),
+            "timestamp": datetime.now().isoformat(),
+            "processing_time_ms": processing_time_ms,
+            "image_width": width,
+            "image_height": height,
+            "detections": detections,
+            "filename": filename,
+            "model_name": model_name,
+            "error": error,
+            "sampling_weight": weight,
+            "sampling_reason": reason,
+            "thumbnail": thumbnail,
+            "image_stats": None
+        }
+
+        if not self._enqueue(record):
+            return None
+        return record["prediction_id"]
+
+    def _sampling_decision(self,
+                           detections: List[Dict],
+                           processing_time_ms: float,
+                           confidence_threshold: float,
+                           error: Optional[str]):
+        """
+        Вирішує, чи зберігати передбачення.
+        Повертає (зберегти, вага, причина). Вага = 1 / ймовірність збереження,
+        щоб агрегати в ClickHouse можна було перезважити.
+        """
+        if error:
+            return True, 1.0, SAMPLE_ERROR
+        if not detections:
+            return True, 1.0, SAMPLE_ZERO_OBJECTS
+        # Найменша впевненість передбачення нижче порогу (значно нижче типових 0.6-0.9 для об'єктів)
+        if min(d.get('confidence', 0.0) for d in detections) < confidence_threshold:
+            return True, 1.0, SAMPLE_LOW_CONFIDENCE
+        if processing_time_ms >= self.slow_request_ms:
+            return True, 1.0, SAMPLE_SLOW_REQUEST
+        if self.sample_rate >= 1.0 or self._rng.random() < self.sample_rate:
+            return True, 1.0 / self.sample_rate, SAMPLE_HEAD
+        return False, 0.0, SAMPLE_HEAD
+
+    def _enqueue(self, record: Dict[str, Any]) -> bool:
+        """Додає запис у чергу згідно з політикою відкидання"""
+        with self._queue_cond:
+            if self._closed:
+                return False
+
+            if len(self._queue) >= self.queue_size:
+                if self.drop_policy == DROP_NEWEST:
+                    self.records_dropped_newest += 1
+                    self._evict(record)
+                    return False
+                self._evict(self._queue.popleft())
+                self.records_dropped_oldest += 1
+
+            self._queue.append(record)
+            self.records_enqueued += 1
+            self._queue_cond.notify()
+            return True
+
+    def _evict(self, record: Dict[str, Any]):
+        """Передає витіснений запис фоновому потоку для спулу (викликається під _queue_cond)"""
+        if self.spool:
+            self._evicted.append(record)
+
+    def _spool_evicted(self):
+        """Пише у спул витіснені з черги записи (у фоновому потоці, поза блокуванням черги)"""
+        while self._evicted:
+            self._spool_record(self._evicted.popleft())
+
+    def _drain_loop(self):
+        """Фоновий цикл: забирає записи з черги та пише їх у спани"""
+        while True:
+            self._spool_evicted()
+            with self._queue_cond:
+                while not self._queue and not self._evicted and not self._closed:
+                    self._queue_cond.wait()
+                if not self._queue:
+                    if self._closed and not self._evicted:
+                        return
+                    continue
+                record = self._queue.popleft()
+
             try:
-                # Отримуємо розміри зображення
-                height, width = image.shape[:2] if hasattr(image, 'shape') else (0, 0)
-                
-                # Встановлюємо основні атрибути для спану
-                span.set_attributes({
-                    "prediction_id": prediction_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "processing_time_seconds": processing_time_ms / 1000.0,
-                    "image_width": width,
-                    "image_height": height,
-                    "total_objects": len(detections),
-                    "filename": filename,
-                    "model_name": model_name
-                })
-                
-                # Додаємо кожен об'єкт як подію до спану
-                for i, detection in enumerate(detections):
-                    bbox = detection.get('bbox', [0, 0, 0, 0])
-                    span.add_event(
-                        name="object_detected",
-                        attributes={
-                            "object_index": i,
-                            "class_name": detection.get('class_name', 'unknown'),
-                            "confidence": detection.get('confidence', 0.0),
-                            "bbox_x1": bbox[0],
-                            "bbox_y1": bbox[1],
-                            "bbox_x2": bbox[2],
-                            "bbox_y2": bbox[3]
-                        }
-                    )
-                
-                print(f"📊 OTEL: {len(detections)} objects | {processing_time_ms:.0f}ms")
-                return prediction_id
-                
+                record["image_stats"] = compute_image_stats(record.pop("thumbnail", None))
+                if self.spool and self._exporter_backed_up():
+                    # Черга SDK заповнена і спан буде відкинутий, тому передбачення йде у спул
+                    self._spool_record(record)
+                else:
+                    self._write_span(record)
+                    self.records_exported += 1
+                if self.predictions_writer:
+                    self.predictions_writer.write(record)
+                print(f"📊 OTEL: {len(record['detections'])} objects | {record['processing_time_ms']:.0f}ms")
             except Exception as e:
-                span.record_exception(e)
+                self.records_failed += 1
                 logger.error(f"OTEL recording failed: {e}")
-                return None
-    
+
+    def _exporter_backed_up(self) -> bool:
+        size = self.exporter_queue_size()
+        return size is not None and size >= self.bsp_max_queue_size
+
+    def _spool_record(self, record: Dict[str, Any]):
+        """Записує у спул передбачення, яке не потрапить у спан"""
+        if not self.spool:
+            return
+        try:
+            self.spool.write_record(record)
+            self.records_spooled += 1
+        except Exception as e:
+            logger.error(f"Spool write failed: {e}")
+
+    def _write_span(self, record: Dict[str, Any]):
+        """Створює спан передбачення у вибраному режимі запису"""
+        detections = record["detections"]
+
+        # Час спану береться з моменту запиту, а не з моменту експорту
+        span = self.tracer.start_span("yolo_prediction", start_time=record["start_time_ns"])
+        try:
+            # Встановлюємо основні атрибути для спану
+            span.set_attributes({
+                "prediction_id": record["prediction_id"],
+                "timestamp": record["timestamp"],
+                "processing_time_seconds": record["processing_time_ms"] / 1000.0,
+                "image_width": record["image_width"],
+                "image_height": record["image_height"],
+                "total_objects": len(detections),
+                "filename": record["filename"],
+                "model_name": record["model_name"],
+                "sampling_weight": record["sampling_weight"],
+                "sampling_reason": record["sampling_reason"]
+            })
+
+            stats = record.get("image_stats")
+            if stats:
+                span.set_attributes({
+                    "image_brightness": stats["brightness"],
+                    "image_contrast": stats["contrast"],
+                    "image_blur": stats["blur"],
+                    "image_brightness_hist": stats["brightness_hist"]
+                })
+
+            if record["error"]:
+                span.set_status(Status(StatusCode.ERROR, record["error"]))
+
+            if self.recording_mode == RECORDING_COMPACT:
+                self._set_packed_detections(span, detections)
+                return
+
+            # Додаємо кожен об'єкт як подію до спану
+            for i, detection in enumerate(detections):
+                bbox = detection.get('bbox', [0, 0, 0, 0])
+                span.add_event(
+                    name="object_detected",
+                    attributes={
+                        "object_index": i,
+                        "class_name": detection.get('class_name', 'unknown'),
+                        "confidence": detection.get('confidence', 0.0),
+                        "bbox_x1": bbox[0],
+                        "bbox_y1": bbox[1],
+                        "bbox_x2": bbox[2],
+                        "bbox_y2": bbox[3]
+                    },
+                    timestamp=record["start_time_ns"]
+                )
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.end(end_time=record["start_time_ns"] + int(record["processing_time_ms"] * 1e6))
+
+    @staticmethod
+    def _set_packed_detections(span, detections: List[Dict]):
+        """
+        Записує детекції як масиви атрибутів спану замість окремих подій.
+        bbox пакується плоским масивом [x1, y1, x2, y2, x1, y1, ...].
+        """
+        class_names = []
+        confidences = []
+        bboxes = []
+        for detection in detections:
+            class_names.append(detection.get('class_name', 'unknown'))
+            confidences.append(float(detection.get('confidence', 0.0)))
+            bboxes.extend(float(v) for v in detection.get('bbox', [0, 0, 0, 0]))
+
+        span.set_attributes({
+            "detection_class_names": class_names,
+            "detection_confidences": confidences,
+            "detection_bboxes": bboxes
+        })
+
+    def _record_metrics(self, record: Dict[str, Any]):
+        """Оновлює OTLP гістограми впевненості, затримки та кількості об'єктів за класами"""
+        if not self.meter_provider:
+            return
+
+        model_name = record["model_name"]
+        self.latency_histogram.record(record["processing_time_ms"], {"model_name": model_name})
+
+        class_counts = {}
+        for detection in record["detections"]:
+            class_name = detection.get('class_name', 'unknown')
+            class_counts[class_name] = class_counts.get(class_name, 0) + 1
+            self.confidence_histogram.record(
+                float(detection.get('confidence', 0.0)),
+                {"model_name": model_name, "class_name": class_name}
+            )
+
+        for class_name, count in class_counts.items():
+            self.objects_histogram.record(count, {"model_name": model_name, "class_name": class_name})
+
+    def exporter_queue_size(self) -> Optional[int]:
+        """
+        Кількість спанів у черзі BatchSpanProcessor (внутрішній стан SDK,
+        None, якщо версія SDK його не надає).
+        """
+        processor = getattr(self.span_processor, "_batch_processor", self.span_processor)
+        # Порожня deque хибна, тому порівнюємо з None явно
+        queue = getattr(processor, "_queue", None)
+        if queue is None:
+            queue = getattr(processor, "queue", None)
+        return len(queue) if queue is not None else None
+
     def get_stats(self) -> Dict[str, Any]:
         """
-        Повертає інформацію про поточний колектор.
+        Повертає інформацію про поточний колектор та стан черги.
         """
         return {
             "status": "initialized" if self.tracer else "failed",
-            "instance_id": self.instance_id
+            "instance_id": self.instance_id,
+            "recording_mode": self.recording_mode,
+            "queue_size": len(self._queue),
+            "queue_capacity": self.queue_size,
+            "drop_policy": self.drop_policy,
+            "records_enqueued": self.records_enqueued,
+            "records_exported": self.records_exported,
+            "records_dropped_oldest": self.records_dropped_oldest,
+            "records_dropped_newest": self.records_dropped_newest,
+            "records_dropped": self.records_dropped_oldest + self.records_dropped_newest,
+            "records_failed": self.records_failed,
+            "records_sampled_out": self.records_sampled_out,
+            "records_spooled": self.records_spooled,
+            "exporter_queue_size": self.exporter_queue_size(),
+            "exporter_queue_capacity": self.bsp_max_queue_size,
+            "sample_rate": self.sample_rate,
+            "image_stats": self.image_stats,
+            "predictions_writer": self.predictions_writer.get_stats() if self.predictions_writer else None,
+            "spool": self.spool.get_stats() if self.spool else None
         }
-    
-    def close(self):
+
+    def close(self, timeout: float = 5.0):
         """
-        Закриває та завершує роботу OpenTelemetry.
+        Дописує чергу та завершує роботу OpenTelemetry.
         """
+        with self._queue_cond:
+            self._closed = True
+            self._queue_cond.notify_all()
+
+        if self._worker:
+            self._worker.join(timeout)
+
+        if self.predictions_writer:
+            self.predictions_writer.close()
+
         try:
             if self.tracer:
-                trace.get_tracer_provider().shutdown()
+                self.tracer_provider.shutdown()
+            if self.meter_provider:
+                self.meter_provider.shutdown()
         except Exception as e:
-            logger.error(f"OTEL close error: {e}") 
\ No newline at end of file
+            logger.error(f"OTEL close error: {e}")
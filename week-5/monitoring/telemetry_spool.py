@@ -0,0 +1,413 @@
+import hashlib
+import logging
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from monitoring.clickhouse_writer import PREDICTION_COLUMNS, ClickHousePredictionsWriter
+
+logger = logging.getLogger(__name__)
+
+# Рядки спулу мають ту ж структуру, що й yolo_predictions (PREDICTION_COLUMNS)
+SPOOL_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("ms")),
+    ("prediction_id", pa.string()),
+    ("model_name", pa.string()),
+    ("filename", pa.string()),
+    ("class_name", pa.string()),
+    ("object_index", pa.int16()),
+    ("confidence", pa.float32()),
+    ("bbox_x1", pa.float32()),
+    ("bbox_y1", pa.float32()),
+    ("bbox_x2", pa.float32()),
+    ("bbox_y2", pa.float32()),
+    ("processing_time_seconds", pa.float32()),
+    ("total_objects", pa.uint16()),
+    ("image_width", pa.uint16()),
+    ("image_height", pa.uint16()),
+    ("sampling_weight", pa.float32()),
+    ("image_brightness", pa.float32()),
+    ("image_contrast", pa.float32()),
+    ("image_blur", pa.float32()),
+    ("image_brightness_hist", pa.list_(pa.float32())),
+])
+
+OPEN_SUFFIX = ".arrows.open"
+SEALED_SUFFIX = ".arrows"
+
+# Кількість prediction_id в одному запиті перевірки дублікатів
+DEDUP_CHUNK = 10000
+
+
+def record_from_span(span: ReadableSpan) -> Optional[Dict[str, Any]]:
+    """
+    Відновлює запис передбачення колектора зі спану yolo_prediction
+    (події object_detected або упаковані масиви компактного режиму).
+    """
+    if span.name != "yolo_prediction":
+        return None
+    attributes = dict(span.attributes or {})
+    if "prediction_id" not in attributes:
+        return None
+
+    detections = []
+    if "detection_class_names" in attributes:
+        bboxes = list(attributes.get("detection_bboxes", []))
+        for i, (class_name, confidence) in enumerate(zip(attributes["detection_class_names"],
+                                                         attributes["detection_confidences"])):
+            detections.append({"class_name": class_name, "confidence": confidence,
+                               "bbox": bboxes[i * 4:i * 4 + 4] or [0, 0, 0, 0]})
+    else:
+        for event in span.events:
+            if event.name != "object_detected":
+                continue
+            event_attributes = event.attributes or {}
+            detections.append({
+                "class_name": event_attributes.get("class_name", "unknown"),
+                "confidence": event_attributes.get("confidence", 0.0),
+                "bbox": [event_attributes.get(f"bbox_{name}", 0.0) for name in ("x1", "y1", "x2", "y2")]
+            })
+
+    image_stats = None
+    if "image_brightness" in attributes:
+        image_stats = {
+            "brightness": attributes["image_brightness"],
+            "contrast": attributes.get("image_contrast"),
+            "blur": attributes.get("image_blur"),
+            "brightness_hist": list(attributes.get("image_brightness_hist", []))
+        }
+
+    return {
+        "prediction_id": attributes["prediction_id"],
+        "start_time_ns": span.start_time,
+        "processing_time_ms": float(attributes.get("processing_time_seconds", 0.0)) * 1000.0,
+        "image_width": attributes.get("image_width", 0),
+        "image_height": attributes.get("image_height", 0),
+        "detections": detections,
+        "filename": attributes.get("filename", "unknown"),
+        "model_name": attributes.get("model_name", "unknown"),
+        "sampling_weight": attributes.get("sampling_weight", 1.0),
+        "image_stats": image_stats
+    }
+
+
+class PredictionSpool:
+    """
+    Локальний append-only спул передбачень у форматі Arrow IPC stream.
+    Рядки накопичуються в пам'яті та дописуються у поточний сегмент пакетами
+    по batch_rows; сегмент закривається після max_file_bytes (або rotate())
+    і стає доступним для SpoolReplayer. Якщо спул перевищує max_total_bytes,
+    найстаріші закриті сегменти видаляються.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 max_file_bytes: int = 64 * 1024 * 1024,
+                 max_total_bytes: int = 1024 * 1024 * 1024,
+                 batch_rows: int = 1000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.batch_rows = batch_rows
+
+        self._lock = threading.Lock()
+        self._buffer: List[tuple] = []
+        self._sink = None
+        self._writer = None
+        self._path: Optional[Path] = None
+        self._segment_rows = 0
+
+        # Лічильники спулу
+        self.rows_spooled = 0
+        self.segments_dropped = 0
+        self.bytes_dropped = 0
+
+        # Сегменти, що лишилися відкритими після падіння процесу, закриваються як є
+        for path in self.directory.glob(f"*{OPEN_SUFFIX}"):
+            path.rename(path.with_name(path.name[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX))
+
+    def write_record(self, record: Dict[str, Any]):
+        """Додає запис передбачення колектора (рядок на детекцію)"""
+        self.append_rows(ClickHousePredictionsWriter.record_to_rows(record))
+
+    def append_rows(self, rows: List[tuple]):
+        """Додає рядки у форматі PREDICTION_COLUMNS"""
+        if not rows:
+            return
+        # prediction_id зберігається рядком (writer передає uuid.UUID)
+        rows = [(row[0], str(row[1])) + tuple(row[2:]) for row in rows]
+        with self._lock:
+            self._buffer.extend(rows)
+            self.rows_spooled += len(rows)
+            if len(self._buffer) >= self.batch_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def rotate(self):
+        """Дописує буфер і закриває поточний сегмент"""
+        with self._lock:
+            self._flush_locked()
+            self._seal_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, SPOOL_SCHEMA)],
+            schema=SPOOL_SCHEMA
+        )
+
+        if self._writer is None:
+            name = f"spool-{datetime.now():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+            self._path = self.directory / f"{name}{OPEN_SUFFIX}"
+            self._sink = pa.OSFile(str(self._path), "wb")
+            self._writer = ipc.new_stream(self._sink, SPOOL_SCHEMA)
+            self._segment_rows = 0
+
+        self._writer.write_batch(batch)
+        self._sink.flush()
+        self._segment_rows += batch.num_rows
+
+        if self._sink.tell() >= self.max_file_bytes:
+            self._seal_locked()
+        self._enforce_limit_locked()
+
+    def _seal_locked(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._sink.close()
+        self._path.rename(self._path.with_name(self._path.name[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX))
+        self._writer = self._sink = self._path = None
+
+    def _enforce_limit_locked(self):
+        """Обмеження диска: видаляє найстаріші закриті сегменти"""
+        sealed = self.segments()
+        total = sum(path.stat().st_size for path in sealed)
+        if self._sink is not None:
+            total += self._sink.tell()
+
+        for path in sealed:
+            if total <= self.max_total_bytes:
+                break
+            size = path.stat().st_size
+            path.unlink()
+            total -= size
+            self.segments_dropped += 1
+            self.bytes_dropped += size
+            logger.warning(f"Spool limit exceeded, dropped segment {path.name}")
+
+    def segments(self) -> List[Path]:
+        """Закриті сегменти від найстарішого до найновішого"""
+        return sorted(self.directory.glob(f"*{SEALED_SUFFIX}"))
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._buffer) or self._writer is not None or bool(self.segments())
+
+    @staticmethod
+    def read_segment(path: Path) -> pa.Table:
+        """
+        Читає сегмент; обрізаний останній пакет (падіння під час запису)
+        відкидається, решта пакетів повертається.
+        """
+        batches = []
+        with pa.OSFile(str(path), "rb") as source:
+            try:
+                reader = ipc.open_stream(source)
+                for batch in reader:
+                    batches.append(batch)
+            except (pa.ArrowInvalid, OSError) as e:
+                logger.warning(f"Truncated spool segment {path.name}: {e}")
+        return pa.Table.from_batches(batches, schema=SPOOL_SCHEMA)
+
+    def get_stats(self) -> Dict[str, Any]:
+        segments = self.segments()
+        return {
+            "directory": str(self.directory),
+            "buffered_rows": len(self._buffer),
+            "open_segment_rows": self._segment_rows if self._writer is not None else 0,
+            "sealed_segments": len(segments),
+            "sealed_bytes": sum(path.stat().st_size for path in segments),
+            "rows_spooled": self.rows_spooled,
+            "segments_dropped": self.segments_dropped,
+            "bytes_dropped": self.bytes_dropped
+        }
+
+    def close(self):
+        self.rotate()
+
+
+class SpoolingSpanExporter(SpanExporter):
+    """Обгортка експортера спанів: спани з невдалого експорту записуються у спул"""
+
+    def __init__(self, exporter: SpanExporter, spool: PredictionSpool):
+        self.exporter = exporter
+        self.spool = spool
+        self.spans_spooled = 0
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        try:
+            result = self.exporter.export(spans)
+        except Exception as e:
+            logger.error(f"Span export failed: {e}")
+            result = SpanExportResult.FAILURE
+
+        if result != SpanExportResult.SUCCESS:
+            for span in spans:
+                record = record_from_span(span)
+                if record:
+                    self.spool.write_record(record)
+                    self.spans_spooled += 1
+        return result
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.exporter.force_flush(timeout_millis)
+
+
+class SpoolReplayer:
+    """
+    Фонове дозавантаження спулу в yolo_predictions після відновлення ClickHouse.
+    Exactly-once: перед вставкою відкидаються рядки, пара (prediction_id, object_index)
+    яких вже є в таблиці (повтор після падіння між вставкою та видаленням сегмента,
+    або частина передбачення, яку writer встиг вставити в іншому батчі),
+    а сама вставка має insert_deduplication_token від вмісту, тож повтор тієї ж
+    вставки ClickHouse відкидає. Сегмент видаляється лише після успішної вставки.
+    У otel_traces спул не дозавантажується: аналіз дрифту бачить ці дані з джерелом
+    yolo_predictions (CLICKHOUSE_SOURCE за замовчуванням).
+    """
+
+    def __init__(self,
+                 spool: PredictionSpool,
+                 client: Any,
+                 table: str = "yolo_analytics.yolo_predictions",
+                 interval: float = 10.0,
+                 max_backoff: float = 300.0):
+        self.spool = spool
+        self.client = client
+        self.table = table
+        self.interval = interval
+        self.max_backoff = max_backoff
+
+        # Лічильники дозавантаження
+        self.rows_replayed = 0
+        self.rows_deduplicated = 0
+        self.segments_replayed = 0
+        self.replay_errors = 0
+
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._replay_loop, name="telemetry-spool-replayer", daemon=True)
+
+    def start(self):
+        self._worker.start()
+
+    def _replay_loop(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
+            if not self.spool.has_pending():
+                delay = self.interval
+                continue
+            try:
+                self.client.execute("SELECT 1")
+                self.spool.rotate()
+                self.replay_all()
+                delay = self.interval
+            except Exception as e:
+                # Бекенд ще недоступний: експоненційна пауза
+                self.replay_errors += 1
+                delay = min(delay * 2, self.max_backoff)
+                logger.warning(f"Spool replay postponed ({delay:.1f}s): {e}")
+
+    def replay_all(self) -> int:
+        """Дозавантажує всі закриті сегменти; повертає кількість вставлених рядків"""
+        inserted = 0
+        for path in self.spool.segments():
+            inserted += self.replay_segment(path)
+        return inserted
+
+    def _existing_keys(self, table: pa.Table) -> set:
+        """Пари (prediction_id, object_index) сегмента, які вже є в ClickHouse"""
+        ids = sorted(set(table.column("prediction_id").to_pylist()))
+        timestamps = table.column("timestamp").to_pylist()
+        # Рядком з мілісекундами: datetime параметр драйвер обрізає до секунд
+        params = {
+            'start': min(timestamps).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'end': max(timestamps).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        }
+
+        existing = set()
+        for i in range(0, len(ids), DEDUP_CHUNK):
+            params['ids'] = tuple(ids[i:i + DEDUP_CHUNK])
+            rows = self.client.execute(
+                f"SELECT DISTINCT toString(prediction_id), object_index FROM {self.table} "
+                "WHERE timestamp >= %(start)s AND timestamp <= %(end)s "
+                "AND prediction_id IN %(ids)s",
+                params
+            )
+            existing.update((row[0], row[1]) for row in rows)
+        return existing
+
+    def replay_segment(self, path: Path) -> int:
+        """Дозавантажує один сегмент і видаляє його; повертає кількість вставлених рядків"""
+        table = self.spool.read_segment(path)
+        inserted = 0
+        if table.num_rows:
+            # Дублікати всередині спулу (один запис від колектора та writer'а)
+            rows = {}
+            for row in zip(*(table.column(name).to_pylist() for name in PREDICTION_COLUMNS)):
+                rows.setdefault((row[1], row[5]), row)
+
+            existing = self._existing_keys(table)
+            rows = [row for key, row in sorted(rows.items()) if key not in existing]
+            self.rows_deduplicated += table.num_rows - len(rows)
+
+            if rows:
+                token = hashlib.sha256(
+                    "\n".join(f"{row[1]}:{row[5]}" for row in rows).encode()
+                ).hexdigest()
+                self.client.execute(
+                    f"INSERT INTO {self.table} ({', '.join(PREDICTION_COLUMNS)}) VALUES",
+                    [(row[0], uuid.UUID(row[1])) + row[2:] for row in rows],
+                    settings={
+                        'insert_deduplication_token': token,
+                        'deduplicate_blocks_in_dependent_materialized_views': 1
+                    }
+                )
+                self.rows_replayed += len(rows)
+                inserted = len(rows)
+
+        path.unlink()
+        self.segments_replayed += 1
+        logger.info(f"Replayed spool segment {path.name}: {inserted}/{table.num_rows} rows inserted")
+        return inserted
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rows_replayed": self.rows_replayed,
+            "rows_deduplicated": self.rows_deduplicated,
+            "segments_replayed": self.segments_replayed,
+            "replay_errors": self.replay_errors,
+            "spool": self.spool.get_stats()
+        }
+
+    def close(self, timeout: Optional[float] = 10.0):
+        self._stop.set()
+        if self._worker.is_alive():
+            self._worker.join(timeout)
@@ -5,11 +5,16 @@ from typing import Dict, Any
 import cv2
 import numpy as np
 import uvicorn
+from clickhouse_driver import Client
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from ultralytics import YOLO
 
+from batcher import MicroBatcher
+
 # Моніторинг OpenTelemetry
 from monitoring.otel_collector import YOLOOpenTelemetryCollector
+from monitoring.clickhouse_writer import ClickHousePredictionsWriter
+from monitoring.telemetry_spool import PredictionSpool, SpoolReplayer
 
 app = FastAPI(title="YOLO11 Detection API", version="3.0.0")
 
@@ -17,14 +22,92 @@ app = FastAPI(title="YOLO11 Detection API", version="3.0.0")
 MODEL_NAME = "yolo11n"
 model = YOLO(f"{MODEL_NAME}.pt")
 
+# Мікробатчинг запитів: один прохід моделі на групу зображень
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+def predict_batch(images):
+    """Батчевий інференс YOLO (виконується у потоці батчера)"""
+    return model(images, verbose=False)
+
+batcher = MicroBatcher(predict_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+
+# Локальний спул телеметрії: передбачення, які не вдалося експортувати, дозавантажуються в ClickHouse пізніше
+telemetry_spool = None
+spool_replayer = None
+if os.getenv("TELEMETRY_SPOOL_ENABLED", "false").lower() == "true":
+    try:
+        telemetry_spool = PredictionSpool(
+            directory=os.getenv("TELEMETRY_SPOOL_DIR", "/app/spool"),
+            max_file_bytes=int(os.getenv("TELEMETRY_SPOOL_MAX_FILE_MB", "64")) * 1024 * 1024,
+            max_total_bytes=int(os.getenv("TELEMETRY_SPOOL_MAX_TOTAL_MB", "1024")) * 1024 * 1024
+        )
+        database = os.getenv("CLICKHOUSE_DATABASE", "yolo_analytics")
+        spool_replayer = SpoolReplayer(
+            telemetry_spool,
+            Client(host=os.getenv("CLICKHOUSE_HOST", "clickhouse"), port=int(os.getenv("CLICKHOUSE_PORT", "9000")),
+                   database=database),
+            table=f"{database}.yolo_predictions",
+            interval=float(os.getenv("TELEMETRY_SPOOL_REPLAY_INTERVAL", "10"))
+        )
+        spool_replayer.start()
+        print("✅ Telemetry spool enabled")
+    except Exception as e:
+        print(f"❌ Telemetry spool failed: {e}")
+        telemetry_spool = None
+
+# Прямий батчевий запис у таблицю yolo_predictions
+predictions_writer = None
+if os.getenv("CLICKHOUSE_WRITER_ENABLED", "false").lower() == "true":
+    try:
+        predictions_writer = ClickHousePredictionsWriter(
+            host=os.getenv("CLICKHOUSE_HOST", "clickhouse"),
+            port=int(os.getenv("CLICKHOUSE_PORT", "9000")),
+            database=os.getenv("CLICKHOUSE_DATABASE", "yolo_analytics"),
+            batch_size=int(os.getenv("CLICKHOUSE_WRITER_BATCH_SIZE", "1000")),
+            flush_interval=float(os.getenv("CLICKHOUSE_WRITER_FLUSH_INTERVAL", "2")),
+            spool=telemetry_spool
+        )
+        print("✅ ClickHouse predictions writer enabled")
+    except Exception as e:
+        print(f"❌ ClickHouse predictions writer failed: {e}")
+
 # OpenTelemetry колектор
 try:
-    otel_collector = YOLOOpenTelemetryCollector()
+    otel_collector = YOLOOpenTelemetryCollector(
+        queue_size=int(os.getenv("OTEL_QUEUE_SIZE", "1024")),
+        drop_policy=os.getenv("OTEL_DROP_POLICY", "drop_oldest"),
+        recording_mode=os.getenv("OTEL_RECORDING_MODE", "events"),
+        sample_rate=float(os.getenv("OTEL_SAMPLE_RATE", "1.0")),
+        low_confidence_threshold=float(os.getenv("OTEL_LOW_CONFIDENCE", "0.5")),
+        slow_request_ms=float(os.getenv("OTEL_SLOW_REQUEST_MS", "1000")),
+        predictions_writer=predictions_writer,
+        image_stats=os.getenv("OTEL_IMAGE_STATS", "true").lower() == "true",
+        bsp_max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "256")),
+        bsp_max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "32")),
+        bsp_schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        bsp_export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "3000")),
+        spool=telemetry_spool
+    )
     print("✅ OpenTelemetry monitoring enabled")
 except Exception as e:
     print(f"❌ OpenTelemetry failed: {e}")
     otel_collector = None
 
+@app.on_event("startup")
+async def start_batcher():
+    await batcher.start()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+    if otel_collector:
+        otel_collector.close()
+    if spool_replayer:
+        spool_replayer.close()
+    if telemetry_spool:
+        telemetry_spool.close()
+
 @app.get("/")
 async def root():
     return {
@@ -39,7 +122,10 @@ async def health():
     return {
         "status": "healthy", 
         "model": f"{MODEL_NAME}.pt",
-        "monitoring": "opentelemetry" if otel_collector else "disabled"
+        "monitoring": "opentelemetry" if otel_collector else "disabled",
+        "monitoring_stats": otel_collector.get_stats() if otel_collector else None,
+        "spool_replay": spool_replayer.get_stats() if spool_replayer else None,
+        "batching": batcher.get_stats()
     }
 
 @app.post("/detect")
@@ -62,8 +148,8 @@ async def detect_objects(file: UploadFile = File(...)) -> Dict[str, Any]:
         if image is None:
             raise HTTPException(status_code=400, detail="Invalid image format")
         
-        # YOLO детекція
-        results = model(image)[0]
+        # YOLO детекція через мікробатчер
+        results, queue_wait_ms, inference_time_ms = await batcher.submit(image)
         processing_time = (time.time() - start_time) * 1000
         
         # Обробка результатів
@@ -81,7 +167,7 @@ async def detect_objects(file: UploadFile = File(...)) -> Dict[str, Any]:
                     "class_name": model.names[class_id]
                 })
         
-        # Запис у ClickHouse через OpenTelemetry
+        # Запис у ClickHouse через OpenTelemetry (лише постановка в чергу)
         if otel_collector:
             try:
                 await otel_collector.record_prediction(
@@ -95,6 +181,8 @@ async def detect_objects(file: UploadFile = File(...)) -> Dict[str, Any]:
         return {
             "success": True,
             "processing_time_ms": round(processing_time, 2),
+            "queue_wait_ms": round(queue_wait_ms, 2),
+            "inference_time_ms": round(inference_time_ms, 2),
             "objects_detected": len(detections),
             "detections": detections
         }
@@ -102,6 +190,15 @@ async def detect_objects(file: UploadFile = File(...)) -> Dict[str, Any]:
     except HTTPException:
         raise
     except Exception as e:
+        # Помилки завжди потрапляють у вибірку моніторингу
+        if otel_collector:
+            try:
+                await otel_collector.record_prediction(
+                    None, [], (time.time() - start_time) * 1000,
+                    file.filename or "unknown", MODEL_NAME, error=str(e)
+                )
+            except Exception:
+                pass
         raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
 
 if __name__ == "__main__":
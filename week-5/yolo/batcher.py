@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """
+    Мікробатчер для YOLO інференсу.
+    Групує зображення з одночасних запитів у батч (до max_batch_size
+    або до спливання max_wait_ms) та виконує один прохід моделі.
+    """
+
+    def __init__(self,
+                 predict_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be positive")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be non-negative")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Статистика батчування
+        self.batches_processed = 0
+        self.images_processed = 0
+
+    async def start(self):
+        """Запускає фонову задачу, що формує батчі"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Зупиняє фонову задачу та відхиляє запити, що залишились у черзі"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, image: Any) -> Tuple[Any, float, float]:
+        """
+        Ставить зображення в чергу та чекає на результат батчу.
+
+        Returns:
+            (результат моделі, час очікування в черзі мс, час інференсу батчу мс)
+        """
+        if self._worker is None:
+            raise RuntimeError("Batcher is not started")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, time.perf_counter(), future))
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[Any, float, asyncio.Future]]:
+        """Чекає перший елемент, потім добирає батч до ліміту розміру чи часу"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            # Спочатку забираємо все, що вже чекає в черзі
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect_batch()
+
+            # Запити, які вже скасовані клієнтом, не передаємо в модель
+            batch = [item for item in batch if not item[2].cancelled()]
+            if not batch:
+                continue
+
+            images = [image for image, _, _ in batch]
+            compute_start = time.perf_counter()
+
+            try:
+                # Інференс у потоці, щоб не блокувати event loop
+                results = await loop.run_in_executor(None, self.predict_fn, images)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            compute_ms = (time.perf_counter() - compute_start) * 1000
+
+            self.batches_processed += 1
+            self.images_processed += len(batch)
+
+            for (_, enqueued_at, future), result in zip(batch, results):
+                if not future.done():
+                    queue_wait_ms = (compute_start - enqueued_at) * 1000
+                    future.set_result((result, queue_wait_ms, compute_ms))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Повертає налаштування та статистику батчування.
+        """
+        avg_batch_size = (self.images_processed / self.batches_processed
+                          if self.batches_processed else 0.0)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "batches_processed": self.batches_processed,
+            "images_processed": self.images_processed,
+            "avg_batch_size": round(avg_batch_size, 2)
+        }
@@ -205,7 +205,8 @@ def main():
     if response.status_code == 200:
         result = response.json()
         print(f"✅ Детекція завершена!")
-        print(f"   Час обробки: {result['processing_time_ms']:.1f}мс")
+        print(f"   Час обробки: {result['processing_time_ms']:.1f}мс "
+              f"(черга: {result.get('queue_wait_ms', 0):.1f}мс, інференс: {result.get('inference_time_ms', 0):.1f}мс)")
         print(f"   Виявлено об'єктів: {result['objects_detected']}")
         
         # Показуємо всі детекції
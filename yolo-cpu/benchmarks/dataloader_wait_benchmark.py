@@ -0,0 +1,140 @@
+"""
+Час очікування DataLoader за епоху: декодування PNG / JPEG проти кешу зображень.
+
+Тренує кілька епох зі стандартним DetectionTrainer та з CachedDetectionTrainer
+(image_cache.py) з однаковими параметрами з config.yaml і вимірює, скільки
+часу цикл тренування чекає на наступний батч (від кінця кроку до отримання
+батчу). Час побудови кешу виводиться окремо - він платиться один раз
+для датасету та imgsz.
+
+Запуск (з директорії yolo-cpu):
+    python benchmarks/dataloader_wait_benchmark.py --epochs 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Скрипти тренування лежать у батьківській директорії
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ultralytics import YOLO  # noqa: E402
+from ultralytics.data.utils import check_det_dataset  # noqa: E402
+from ultralytics.models.yolo.detect import DetectionTrainer  # noqa: E402
+from ultralytics.utils import SETTINGS  # noqa: E402
+
+import image_cache  # noqa: E402
+import train_yolo  # noqa: E402
+
+
+def with_loader_timer(base):
+    """Тренер, що рахує очікування батчів за кожну епоху"""
+
+    class LoaderTimedTrainer(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.epoch_stats = []
+            self.add_callback("on_train_epoch_start", self._start_epoch)
+            self.add_callback("on_train_batch_end", self._mark_batch_end)
+            self.add_callback("on_train_epoch_end", self._end_epoch)
+
+        def _start_epoch(self, trainer):
+            self._epoch_started = self._batch_end = time.perf_counter()
+            self._wait = 0.0
+            self._batches = 0
+
+        def _mark_batch_end(self, trainer):
+            self._batch_end = time.perf_counter()
+
+        def _end_epoch(self, trainer):
+            seconds = time.perf_counter() - self._epoch_started
+            self.epoch_stats.append({
+                'epoch': self.epoch + 1,
+                'batches': self._batches,
+                'loader_wait_seconds': round(self._wait, 3),
+                'epoch_seconds': round(seconds, 3),
+                'wait_share': round(self._wait / seconds, 4) if seconds else 0.0
+            })
+
+        def preprocess_batch(self, batch):
+            # Батч щойно отримано з DataLoader
+            self._wait += time.perf_counter() - self._batch_end
+            self._batches += 1
+            return super().preprocess_batch(batch)
+
+    return LoaderTimedTrainer
+
+
+def run(variant, trainer_class, config, args, project):
+    print(f"\n📏 {variant}: {args.epochs} epoch(s), imgsz {args.imgsz}, batch {args.batch}, workers {args.workers}")
+    model = YOLO(args.model)
+    model.train(
+        trainer=with_loader_timer(trainer_class),
+        data=config['data'],
+        epochs=args.epochs,
+        batch=args.batch,
+        imgsz=args.imgsz,
+        workers=args.workers,
+        device='cpu',
+        val=False,
+        plots=False,
+        save=False,
+        project=project,
+        name=variant,
+        verbose=False
+    )
+    return model.trainer.epoch_stats
+
+
+def main():
+    config = train_yolo.load_config()
+    parser = argparse.ArgumentParser(description="DataLoader wait per epoch: image files vs memory-mapped image cache")
+    parser.add_argument("--model", default=config['model'])
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--imgsz", type=int, default=config['imgsz'])
+    parser.add_argument("--batch", type=int, default=config['batch'])
+    parser.add_argument("--workers", type=int, default=config['workers'])
+    parser.add_argument("--cache-dir", default=None,
+                        help="каталог кешу (за замовчуванням тимчасовий, щоб виміряти побудову)")
+    parser.add_argument("--output", default="dataloader_wait.json")
+    args = parser.parse_args()
+
+    SETTINGS['wandb'] = False
+    project = tempfile.mkdtemp(prefix="yolo-loader-bench-")
+    cache_dir = args.cache_dir or str(Path(project) / "image_cache")
+
+    # Побудова кешу заздалегідь, щоб вона не потрапила в час першої епохи
+    data = check_det_dataset(config['data'])
+    build = {}
+    for split in ('train', 'val'):
+        started = time.perf_counter()
+        image_cache.get_image_store(data[split], args.imgsz,
+                                    channels=data.get('channels', 3), cache_dir=cache_dir, workers=args.workers)
+        build[split] = round(time.perf_counter() - started, 3)
+    os.environ['IMAGE_CACHE_DIR'] = cache_dir
+
+    results = {
+        'files': run('files', DetectionTrainer, config, args, project),
+        'cache': run('cache', image_cache.CachedDetectionTrainer, config, args, project)
+    }
+
+    print(f"\n🧱 Cache build: train {build['train']:.2f}s, val {build['val']:.2f}s (once per dataset and imgsz)")
+    print(f"{'epoch':>6}{'files wait s':>14}{'cache wait s':>14}{'files epoch s':>15}{'cache epoch s':>15}"
+          f"{'files wait %':>14}{'cache wait %':>14}")
+    for files, cache in zip(results['files'], results['cache']):
+        print(f"{files['epoch']:>6}{files['loader_wait_seconds']:>14.3f}{cache['loader_wait_seconds']:>14.3f}"
+              f"{files['epoch_seconds']:>15.3f}{cache['epoch_seconds']:>15.3f}"
+              f"{files['wait_share']:>14.1%}{cache['wait_share']:>14.1%}")
+
+    with open(args.output, 'w') as f:
+        json.dump({'cache_build_seconds': build, 'imgsz': args.imgsz, 'batch': args.batch,
+                   'workers': args.workers, **results}, f, indent=2)
+    print(f"💾 Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Синхронізація датасету з кластером Ray за вмістом файлів
+
+Драйвер будує маніфест (відносний шлях -> SHA-256 та розмір) і завантажує
+в кеш кластера лише файли, яких там ще немає. Кеш - detached актор на головному
+вузлі, що тримає частини файлів в object store Ray під ключем SHA-256, тож дані
+переживають відключення драйвера і не пересилаються повторно. Кеш пам'ятає
+останні маніфести і звільняє вміст, на який вони вже не посилаються.
+Воркер зберігає файли в локальному кеші вузла та збирає датасет
+жорсткими посиланнями на них.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import ray
+from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+
+# Іменований актор кешу датасету
+CACHE_ACTOR_NAME = "yolo-dataset-cache"
+CACHE_NAMESPACE = "yolo-training"
+
+# Розмір частини файлу в object store
+CHUNK_BYTES = 8 * 1024 * 1024
+# Обсяг одного виклику завантаження та кількість викликів у польоті (обмежує пам'ять драйвера)
+UPLOAD_BATCH_BYTES = 64 * 1024 * 1024
+MAX_INFLIGHT_UPLOADS = 4
+
+# Межі кешу кластера: кількість останніх маніфестів та обсяг вмісту (задаються при створенні актора)
+CACHE_KEEP_MANIFESTS = int(os.getenv("DATASET_CACHE_KEEP_MANIFESTS", "3"))
+CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_MB", "4096")) * 1024 * 1024
+
+# Ресурс, який Ray додає лише головному вузлу
+HEAD_NODE_RESOURCE = "node:__internal_head__"
+
+# Локальний кеш вузла за замовчуванням, спільний для всіх завдань на цьому вузлі
+DEFAULT_NODE_CACHE_DIR = "/tmp/yolo_dataset_cache"
+
+# Індекс хешів у корені датасету: файл не перераховується, поки не змінились розмір та mtime
+HASH_INDEX_FILE = ".dataset_sync_index.json"
+
+
+def file_digest(path):
+    """SHA-256 файлу, читання частинами"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(dataset_dir):
+    """
+    Будує маніфест датасету: {'id': хеш маніфесту, 'files': {шлях: {'sha256', 'size'}}}
+    Приховані файли пропускаються, як і раніше в prepare_dataset_files.
+    """
+    dataset_dir = Path(dataset_dir)
+    index_path = dataset_dir / HASH_INDEX_FILE
+
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    files = {}
+    rehashed = 0
+    for file_path in sorted(dataset_dir.rglob("*")):
+        if not file_path.is_file() or file_path.name.startswith('.'):
+            continue
+
+        relative_path = file_path.relative_to(dataset_dir).as_posix()
+        stat = file_path.stat()
+        cached = index.get(relative_path)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            digest = cached['sha256']
+        else:
+            digest = file_digest(file_path)
+            rehashed += 1
+
+        index[relative_path] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        files[relative_path] = {'sha256': digest, 'size': stat.st_size}
+
+    # Індекс зберігаємо лише для наявних файлів
+    index = {path: entry for path, entry in index.items() if path in files}
+    try:
+        with open(index_path, 'w') as f:
+            json.dump(index, f)
+    except OSError as e:
+        print(f"  ⚠️  Could not save hash index: {e}")
+
+    manifest_id = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+    print(f"  📊 Manifest: {len(files)} files, {sum(e['size'] for e in files.values()) / 1e6:.1f} MB "
+          f"({rehashed} hashed, {len(files) - rehashed} from index)")
+    return {'id': manifest_id, 'files': files}
+
+
+@ray.remote(num_cpus=0)
+class DatasetCache:
+    """
+    Кеш вмісту файлів у object store: SHA-256 -> список ObjectRef частин.
+    Актор сам виконує ray.put, тож є власником об'єктів, і вони живуть,
+    поки живе актор (detached), незалежно від драйвера, що їх завантажив.
+
+    Живі маніфести - останні keep_manifests зареєстрованих (LRU). Вміст, на який
+    вони не посилаються, звільняється (ObjectRef відпускаються), а якщо вміст
+    живих маніфестів більший за max_bytes, найдавніші маніфести теж відкидаються.
+    """
+
+    def __init__(self, keep_manifests=CACHE_KEEP_MANIFESTS, max_bytes=CACHE_MAX_BYTES):
+        self.keep_manifests = max(keep_manifests, 1)
+        self.max_bytes = max_bytes
+        self.manifests = OrderedDict()
+        self.blobs = {}
+        self.pending = {}
+        self.sizes = {}
+        self.stored_bytes = 0
+        self.evicted_bytes = 0
+
+    def register(self, manifest_id, sizes):
+        """
+        Реєструє маніфест ({sha256: розмір}) як останній використаний, звільняє вміст
+        маніфестів поза межами кешу та повертає хеші, вмісту яких ще немає в кеші.
+        """
+        self.manifests[manifest_id] = set(sizes)
+        self.manifests.move_to_end(manifest_id)
+        self.sizes.update(sizes)
+
+        while len(self.manifests) > self.keep_manifests:
+            self.manifests.popitem(last=False)
+        while len(self.manifests) > 1 and self._live_bytes() > self.max_bytes:
+            self.manifests.popitem(last=False)
+        self._evict_unreferenced()
+
+        return [digest for digest in sizes if digest not in self.blobs]
+
+    def _live_bytes(self):
+        live = set().union(*self.manifests.values())
+        return sum(self.sizes.get(digest, 0) for digest in live)
+
+    def _evict_unreferenced(self):
+        """Відпускає частини вмісту, на який не посилається жоден живий маніфест"""
+        live = set().union(*self.manifests.values())
+        for digest in [digest for digest in self.pending if digest not in live]:
+            del self.pending[digest]
+        for digest in [digest for digest in self.blobs if digest not in live]:
+            del self.blobs[digest]
+            size = self.sizes.get(digest, 0)
+            self.stored_bytes -= size
+            self.evicted_bytes += size
+        self.sizes = {digest: size for digest, size in self.sizes.items() if digest in live}
+
+    def missing(self, digests):
+        """Хеші, вмісту яких ще немає в кеші"""
+        return [digest for digest in digests if digest not in self.blobs]
+
+    def put_chunks(self, chunks):
+        """
+        Приймає частини файлів [(sha256, індекс, кількість частин, numpy uint8)]
+        Файл стає доступним, коли отримано всі його частини.
+        """
+        completed = 0
+        for digest, index, count, data in chunks:
+            # Вже збережений вміст або вміст маніфесту, який встигли витіснити
+            if digest in self.blobs or digest not in self.sizes:
+                continue
+            parts = self.pending.setdefault(digest, {})
+            if index not in parts:
+                parts[index] = ray.put(data)
+            if len(parts) == count:
+                self.blobs[digest] = [parts[i] for i in range(count)]
+                del self.pending[digest]
+                self.stored_bytes += self.sizes.get(digest, 0)
+                completed += 1
+        return completed
+
+    def get_refs(self, digests, manifest_id=None):
+        """ObjectRef частин для кожного хешу; маніфест стає останнім використаним"""
+        if manifest_id in self.manifests:
+            self.manifests.move_to_end(manifest_id)
+        evicted = [digest for digest in digests if digest not in self.blobs]
+        if evicted:
+            raise KeyError(f"{len(evicted)} dataset blobs were evicted from the cluster cache, "
+                           f"sync the dataset again")
+        return {digest: self.blobs[digest] for digest in digests}
+
+    def stats(self):
+        return {'manifests': len(self.manifests), 'blobs': len(self.blobs), 'pending': len(self.pending),
+                'stored_bytes': self.stored_bytes, 'evicted_bytes': self.evicted_bytes}
+
+
+def head_node_id():
+    """ID головного вузла кластера (None, якщо Ray його не позначає)"""
+    for node in ray.nodes():
+        if node.get('Alive') and HEAD_NODE_RESOURCE in node.get('Resources', {}):
+            return node['NodeID']
+    return None
+
+
+def get_cache_actor():
+    """
+    Повертає актор кешу датасету, створюючи його при першому зверненні.
+    Актор закріплений за головним вузлом: робочі вузли autoscaler може
+    прибрати разом з усім вмістом кешу.
+    """
+    options = {}
+    node_id = head_node_id()
+    if node_id:
+        options['scheduling_strategy'] = NodeAffinitySchedulingStrategy(node_id=node_id, soft=False)
+
+    return DatasetCache.options(
+        name=CACHE_ACTOR_NAME,
+        namespace=CACHE_NAMESPACE,
+        lifetime="detached",
+        get_if_exists=True,
+        **options
+    ).remote(CACHE_KEEP_MANIFESTS, CACHE_MAX_BYTES)
+
+
+def sync_dataset(dataset_dir):
+    """
+    Завантажує в кеш кластера файли датасету, яких там ще немає.
+    Повертає маніфест, який передається в завдання замість вмісту файлів.
+    """
+    dataset_dir = Path(dataset_dir)
+    if not dataset_dir.exists():
+        print(f"  ⚠️  Dataset directory not found: {dataset_dir}")
+        return None
+
+    started = time.time()
+    manifest = build_manifest(dataset_dir)
+
+    # Один шлях на кожен унікальний вміст
+    paths_by_digest = {}
+    for relative_path, entry in manifest['files'].items():
+        paths_by_digest.setdefault(entry['sha256'], (relative_path, entry['size']))
+
+    cache = get_cache_actor()
+    missing = ray.get(cache.register.remote(
+        manifest['id'], {digest: size for digest, (_, size) in paths_by_digest.items()}
+    ))
+
+    uploaded_bytes = 0
+    inflight = []
+    batch, batch_bytes = [], 0
+
+    def flush_batch():
+        nonlocal batch, batch_bytes
+        if not batch:
+            return
+        inflight.append(cache.put_chunks.remote(batch))
+        batch, batch_bytes = [], 0
+        # Обмежуємо кількість викликів у польоті, щоб не тримати весь датасет у пам'яті драйвера
+        while len(inflight) >= MAX_INFLIGHT_UPLOADS:
+            ready, _ = ray.wait(inflight, num_returns=1)
+            ray.get(ready)
+            inflight.remove(ready[0])
+
+    for digest in missing:
+        relative_path, size = paths_by_digest[digest]
+        count = max(1, -(-size // CHUNK_BYTES))
+        with open(dataset_dir / relative_path, 'rb') as f:
+            for index in range(count):
+                data = f.read(CHUNK_BYTES)
+                batch.append((digest, index, count, np.frombuffer(data, dtype=np.uint8)))
+                batch_bytes += len(data)
+                uploaded_bytes += len(data)
+                if batch_bytes >= UPLOAD_BATCH_BYTES:
+                    flush_batch()
+    flush_batch()
+    ray.get(inflight)
+
+    print(f"  ✅ Dataset synced: {len(missing)} of {len(paths_by_digest)} unique files uploaded "
+          f"({uploaded_bytes / 1e6:.1f} MB), {len(paths_by_digest) - len(missing)} already cached "
+          f"in {time.time() - started:.1f}s")
+    return manifest
+
+
+def materialize_dataset(manifest, target_dir, cache_dir=None):
+    """
+    Збирає датасет з маніфесту на воркері.
+    Вміст, якого немає в локальному кеші вузла, читається з object store
+    (numpy масиви відображаються зі спільної пам'яті без копіювання) і
+    записується в кеш; файли датасету - жорсткі посилання на файли кешу.
+    """
+    started = time.time()
+    # Каталог кешу визначається на воркері (DATASET_NODE_CACHE_DIR з runtime_env)
+    cache_dir = cache_dir or os.getenv("DATASET_NODE_CACHE_DIR", DEFAULT_NODE_CACHE_DIR)
+    blobs_dir = Path(cache_dir) / "blobs"
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(digest):
+        return blobs_dir / digest[:2] / digest
+
+    digests = sorted({entry['sha256'] for entry in manifest['files'].values()})
+    missing = [digest for digest in digests if not blob_path(digest).exists()]
+
+    fetched_bytes = 0
+    if missing:
+        cache = ray.get_actor(CACHE_ACTOR_NAME, namespace=CACHE_NAMESPACE)
+        refs = ray.get(cache.get_refs.remote(missing, manifest['id']))
+        for digest in missing:
+            path = blob_path(digest)
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{digest}.{os.getpid()}.tmp")
+
+            hasher = hashlib.sha256()
+            with open(tmp_path, 'wb') as f:
+                for part in ray.get(refs[digest]):
+                    f.write(part.data)
+                    hasher.update(part.data)
+                    fetched_bytes += part.nbytes
+
+            if hasher.hexdigest() != digest:
+                os.remove(tmp_path)
+                raise ValueError(f"Checksum mismatch for cached dataset blob {digest}")
+
+            # Файли кешу спільні для всіх завдань вузла: лише читання, атомарна заміна
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, path)
+
+    linked = copied = 0
+    target_dir = Path(target_dir)
+    for relative_path, entry in manifest['files'].items():
+        destination = target_dir / relative_path
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            destination.unlink()
+        try:
+            os.link(blob_path(entry['sha256']), destination)
+            linked += 1
+        except OSError:
+            # Інша файлова система - копіюємо
+            shutil.copyfile(blob_path(entry['sha256']), destination)
+            copied += 1
+
+    print(f"✅ Dataset materialized: {len(manifest['files'])} files ({linked} linked, {copied} copied), "
+          f"{len(missing)} blobs fetched ({fetched_bytes / 1e6:.1f} MB), "
+          f"{len(digests) - len(missing)} from node cache in {time.time() - started:.1f}s")
+    return {'files': len(manifest['files']), 'fetched': len(missing), 'fetched_bytes': fetched_bytes}
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Кеш попередньо оброблених зображень для тренування на CPU
+
+Зображення кожної частини датасету (train / val) декодуються та масштабуються
+до imgsz один раз і зберігаються в memory-mapped масиві images.npy
+(N x imgsz x imgsz x C, зображення в лівому верхньому куті слоту) разом з
+розмірами та мітками. Ключ кешу - SHA-256 вмісту зображень та міток частини
+разом з imgsz, тож будь-яка зміна файлів або розміру створює новий кеш.
+Датасет тренування читає зображення зі спільної пам'яті замість PNG / JPEG.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics.data import YOLODataset
+from ultralytics.data.utils import IMG_FORMATS, img2label_paths
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.utils import colorstr
+from ultralytics.utils.ops import segments2boxes
+from ultralytics.utils.patches import imread
+from ultralytics.utils.torch_utils import de_parallel
+
+# Каталог кешу за замовчуванням, спільний для всіх запусків на вузлі
+DEFAULT_CACHE_DIR = "/tmp/yolo_image_cache"
+
+# Версія формату кешу: зміна інвалідує всі наявні кеші
+CACHE_VERSION = 1
+COMPLETE_MARKER = "meta.json"
+
+
+def find_label_file(image_path):
+    """Файл міток зображення за тим самим шляхом, що й у YOLODataset (images -> labels), або None"""
+    label_file = Path(img2label_paths([str(image_path)])[0])
+    return label_file if label_file.exists() else None
+
+
+def read_labels(label_file):
+    """Мітки YOLO (cls, x, y, w, h) з файлу; полігони перетворюються на рамки"""
+    if label_file is None:
+        return np.zeros((0, 5), dtype=np.float32)
+
+    rows = [line.split() for line in Path(label_file).read_text().splitlines() if line.strip()]
+    if any(len(row) > 5 for row in rows):
+        classes = np.array([row[0] for row in rows], dtype=np.float32)
+        segments = [np.array(row[1:], dtype=np.float32).reshape(-1, 2) for row in rows]
+        labels = np.concatenate((classes.reshape(-1, 1), segments2boxes(segments)), 1)
+    else:
+        labels = np.array(rows, dtype=np.float32).reshape(-1, 5)
+    # Дублікати прибираємо, як verify_image_label в ultralytics
+    return np.unique(labels, axis=0) if len(labels) else labels
+
+
+def resize_long_side(im, imgsz):
+    """Масштабує довшу сторону до imgsz зі збереженням пропорцій (як BaseDataset.load_image)"""
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(int(np.ceil(w0 * r)), imgsz), min(int(np.ceil(h0 * r)), imgsz)
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+    return im
+
+
+def list_images(images_dir):
+    """Зображення частини датасету, відсортовані, як у BaseDataset.get_img_files"""
+    return sorted(
+        path for path in Path(images_dir).rglob("*.*")
+        if path.suffix[1:].lower() in IMG_FORMATS and not path.name.startswith('.')
+    )
+
+
+def cache_key(images_dir, imgsz, channels):
+    """
+    Ключ кешу: SHA-256 вмісту зображень та їхніх міток (з відносними шляхами),
+    imgsz, кількість каналів та версія формату
+    """
+    digest = hashlib.sha256(json.dumps(
+        {'imgsz': imgsz, 'channels': channels, 'version': CACHE_VERSION}, sort_keys=True
+    ).encode('utf-8'))
+    for path in list_images(images_dir):
+        label_file = find_label_file(path)
+        for name, file_path in ((path.relative_to(images_dir).as_posix(), path), ('labels', label_file)):
+            digest.update(name.encode('utf-8'))
+            if file_path is not None:
+                with open(file_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class ImageStore:
+    """
+    Кеш однієї частини датасету на диску.
+    images.npy відкривається як memmap при першому зверненні в кожному процесі,
+    тож воркери DataLoader не копіюють масив при pickle (spawn).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / COMPLETE_MARKER, 'r') as f:
+            self.meta = json.load(f)
+        index = np.load(self.path / "index.npz")
+        self.ori_shapes = index['ori_shapes']
+        self.shapes = index['shapes']
+        self.label_offsets = index['label_offsets']
+        self.labels = np.load(self.path / "labels.npy")
+        self.rows = {name: row for row, name in enumerate(self.meta['files'])}
+        self._images = None
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(self.path / "images.npy", mmap_mode='r')
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def image(self, row):
+        """Зображення рядка без порожньої частини слоту (копія: аугментації змінюють масив)"""
+        h, w = self.shapes[row]
+        return np.array(self.images[row, :h, :w])
+
+    def image_labels(self, row):
+        start, end = self.label_offsets[row], self.label_offsets[row + 1]
+        return self.labels[start:end]
+
+
+def build_image_store(images_dir, imgsz, channels, target, workers=4):
+    """
+    Декодує та масштабує всі зображення частини датасету в images.npy.
+    Кеш збирається в тимчасовому каталозі та атомарно перейменовується,
+    тож паралельні процеси на вузлі не бачать недобудований кеш.
+    """
+    started = time.time()
+    images_dir = Path(images_dir)
+    files = list_images(images_dir)
+    if not files:
+        raise FileNotFoundError(f"No images found in {images_dir}")
+
+    target = Path(target)
+    tmp_dir = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    images = np.lib.format.open_memmap(
+        tmp_dir / "images.npy", mode='w+', dtype=np.uint8, shape=(len(files), imgsz, imgsz, channels)
+    )
+    ori_shapes = np.zeros((len(files), 2), dtype=np.int32)
+    shapes = np.zeros((len(files), 2), dtype=np.int32)
+    flags = cv2.IMREAD_GRAYSCALE if channels == 1 else cv2.IMREAD_COLOR
+
+    def process(row):
+        im = imread(str(files[row]), flags=flags)
+        if im is None:
+            raise FileNotFoundError(f"Image Not Found {files[row]}")
+        ori_shapes[row] = im.shape[:2]
+        im = resize_long_side(im, imgsz)
+        h, w = im.shape[:2]
+        shapes[row] = (h, w)
+        images[row, :h, :w] = im.reshape(h, w, channels)
+
+    # cv2 відпускає GIL під час декодування та масштабування
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(process, range(len(files))))
+    images.flush()
+    del images
+
+    labels = [read_labels(find_label_file(path)) for path in files]
+    label_offsets = np.concatenate([[0], np.cumsum([len(lb) for lb in labels])]).astype(np.int64)
+    np.save(tmp_dir / "labels.npy", np.concatenate(labels) if labels else np.zeros((0, 5), np.float32))
+    np.savez(tmp_dir / "index.npz", ori_shapes=ori_shapes, shapes=shapes, label_offsets=label_offsets)
+
+    # Маркер завершеності записується останнім
+    with open(tmp_dir / COMPLETE_MARKER, 'w') as f:
+        json.dump({
+            'files': [path.relative_to(images_dir).as_posix() for path in files],
+            'imgsz': imgsz,
+            'channels': channels,
+            'version': CACHE_VERSION,
+            'build_seconds': round(time.time() - started, 2)
+        }, f)
+
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Інший процес встиг зібрати той самий кеш
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"✅ Image cache built: {len(files)} images at {imgsz}px, "
+          f"{int(label_offsets[-1])} labels in {time.time() - started:.1f}s -> {target}")
+    return ImageStore(target)
+
+
+def get_image_store(images_dir, imgsz, channels=3, cache_dir=None, workers=4):
+    """Повертає кеш частини датасету, збираючи його при першому зверненні"""
+    # Каталог кешу визначається під час виклику (IMAGE_CACHE_DIR з runtime_env на воркері)
+    cache_dir = Path(cache_dir or os.getenv("IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR))
+    target = cache_dir / cache_key(Path(images_dir), imgsz, channels)
+
+    if (target / COMPLETE_MARKER).exists():
+        store = ImageStore(target)
+        print(f"✅ Image cache hit: {len(store.rows)} images at {imgsz}px ({target})")
+        return store
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return build_image_store(images_dir, imgsz, channels, target, workers=workers)
+
+
+class CachedYOLODataset(YOLODataset):
+    """YOLODataset, що читає зображення та мітки з ImageStore замість файлів"""
+
+    def __init__(self, *args, store=None, **kwargs):
+        self.store = store
+        super().__init__(*args, **kwargs)
+
+    def _store_row(self, im_file):
+        return self.store.rows[Path(im_file).relative_to(self.img_path).as_posix()]
+
+    def get_labels(self):
+        """Мітки з кешу: той самий формат, що повертає YOLODataset.cache_labels"""
+        labels = []
+        for im_file in self.im_files:
+            row = self._store_row(im_file)
+            lb = self.store.image_labels(row)
+            labels.append({
+                'im_file': im_file,
+                'shape': tuple(int(x) for x in self.store.ori_shapes[row]),
+                'cls': lb[:, 0:1].copy(),
+                'bboxes': lb[:, 1:].copy(),
+                'segments': [],
+                'keypoints': None,
+                'normalized': True,
+                'bbox_format': 'xywh'
+            })
+        return labels
+
+    def load_image(self, i, rect_mode=True):
+        """Зображення з memmap; buffer ведеться як у BaseDataset, бо з нього вибирає Mosaic"""
+        row = self._store_row(self.im_files[i])
+        im = self.store.image(row)
+        h0, w0 = (int(x) for x in self.store.ori_shapes[row])
+        if not rect_mode and im.shape[:2] != (self.imgsz, self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        if im.ndim == 2:
+            im = im[..., None]
+
+        if self.augment:
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return im, (h0, w0), im.shape[:2]
+
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """DetectionTrainer, що будує датасети з кешу зображень imgsz"""
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        store = get_image_store(img_path, self.args.imgsz,
+                                channels=self.data.get('channels', 3), workers=self.args.workers or 1)
+        gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+        return CachedYOLODataset(
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            # Кеш ultralytics в RAM / на диску не потрібен: зображення вже в memmap
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=gs,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+            store=store
+        )
+
+
+def detection_trainer(config):
+    """Клас тренера за config.yaml: з кешем зображень (image_cache: true) або стандартний"""
+    return CachedDetectionTrainer if config.get('image_cache') else DetectionTrainer
@@ -4,11 +4,48 @@
 Цей скрипт запускається як завдання Ray на кластері
 """
 
+import fcntl
+import hashlib
+import json
 import os
+import platform
+import shutil
 import sys
 import subprocess
+import time
 from pathlib import Path
 
+import yaml
+
+# Системні пакети, потрібні OpenCV
+SYSTEM_PACKAGES = ["libgl1-mesa-glx", "libglib2.0-0", "libsm6", "libxext6", "libxrender-dev", "libgomp1"]
+
+# Кеш середовищ на вузлі: <cache>/<hash>/venv. Каталог можна змонтувати з PVC
+# або підготувати в образі воркера - тоді навіть перше завдання не встановлює пакети
+ENV_CACHE_DIR = os.getenv("TRAINING_ENV_CACHE_DIR", "/tmp/yolo_env_cache")
+# Скільки останніх середовищ зберігати на вузлі
+ENV_CACHE_KEEP = int(os.getenv("TRAINING_ENV_CACHE_KEEP", "3"))
+COMPLETE_MARKER = "build.json"
+# Інтерпретатор, яким Ray запускає воркери (з ним скрипт тренування готує середовище на інших вузлах)
+BASE_PYTHON_ENV = "TRAINING_ENV_BASE_PYTHON"
+
+def environment_hash(requirements_path="requirements.txt"):
+    """
+    Хеш середовища тренування: requirements.txt (без коментарів та порожніх рядків),
+    системні пакети, версія Python та платформа
+    """
+    with open(requirements_path, 'r') as f:
+        requirements = sorted(
+            line.split('#')[0].strip() for line in f if line.split('#')[0].strip()
+        )
+    key = {
+        'requirements': requirements,
+        'system_packages': sorted(SYSTEM_PACKAGES),
+        'python': platform.python_version(),
+        'platform': f"{platform.system()}-{platform.machine()}"
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
 def install_system_dependencies():
     """Встановлює системні залежності, необхідні для OpenCV"""
     print("🔧 Installing system dependencies...")
@@ -21,7 +58,7 @@ def install_system_dependencies():
         
         # Встановлюємо libgl1 та інші залежності OpenCV
         result = subprocess.run(
-            "sudo apt update && sudo apt install -y libgl1-mesa-glx libglib2.0-0 libsm6 libxext6 libxrender-dev libgomp1",
+            f"sudo apt update && sudo apt install -y {' '.join(SYSTEM_PACKAGES)}",
             shell=True, capture_output=True, text=True, check=True
         )
         print("✅ System dependencies installed successfully")
@@ -36,12 +73,12 @@ def install_system_dependencies():
         print(f"⚠️  Error installing system dependencies: {e}")
         return True  # Продовжуємо в будь-якому випадку
 
-def install_requirements():
-    """Встановлює Python вимоги на воркері"""
+def install_requirements(python=sys.executable, requirements_path="requirements.txt"):
+    """Встановлює Python вимоги інтерпретатором python"""
     print("📦 Installing Python requirements...")
     try:
         result = subprocess.run([
-            sys.executable, "-m", "pip", "install", "-r", "requirements.txt"
+            python, "-m", "pip", "install", "-r", requirements_path
         ], capture_output=True, text=True, check=True)
         print("✅ Python requirements installed successfully")
         return True
@@ -50,6 +87,103 @@ def install_requirements():
         print(f"STDERR: {e.stderr}")
         return False
 
+def system_packages_installed():
+    """Чи встановлені всі системні пакети (dpkg)"""
+    if shutil.which("dpkg-query") is None:
+        return False
+    result = subprocess.run(
+        ["dpkg-query", "-W", "-f=${Status}\\n"] + SYSTEM_PACKAGES,
+        capture_output=True, text=True
+    )
+    return result.returncode == 0 and all(
+        line.endswith("installed") for line in result.stdout.splitlines()
+    ) and len(result.stdout.splitlines()) == len(SYSTEM_PACKAGES)
+
+def prune_environments(cache_dir, keep, current):
+    """Видаляє найстаріші середовища, що не використовуються іншими завданнями"""
+    environments = sorted(
+        (path for path in cache_dir.iterdir() if (path / COMPLETE_MARKER).exists() and path.name != current),
+        key=lambda path: (path / COMPLETE_MARKER).stat().st_mtime,
+        reverse=True
+    )
+    for path in environments[max(keep - 1, 0):]:
+        with open(cache_dir / f"{path.name}.lock", 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # середовище зараз будується або використовується
+            shutil.rmtree(path, ignore_errors=True)
+            print(f"🧹 Removed cached environment {path.name}")
+
+def resolve_environment(requirements_path="requirements.txt"):
+    """
+    Повертає Python інтерпретатор середовища тренування.
+    Середовище (venv) шукається в кеші вузла за хешем requirements.txt та системних пакетів;
+    при промаху будується один раз під файловим блокуванням, тож паралельні завдання
+    на тому ж вузлі чекають на одну збірку замість власних встановлень.
+    """
+    started = time.time()
+    env_hash = environment_hash(requirements_path)
+    cache_dir = Path(ENV_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    env_dir = cache_dir / env_hash
+    python = env_dir / "venv" / "bin" / "python"
+    marker = env_dir / COMPLETE_MARKER
+    print(f"🧱 Training environment {env_hash} (cache: {cache_dir})")
+
+    # Спільне блокування тримається до кінця завдання, щоб середовище не видалили під час тренування;
+    # збірка (і видалення неповного середовища) виконується лише під ексклюзивним блокуванням
+    lock = open(cache_dir / f"{env_hash}.lock", 'w')
+    fcntl.flock(lock, fcntl.LOCK_SH)
+    ready = marker.exists() and python.exists()
+    if not ready:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Поки блокування не було, середовище могло зібрати інше завдання
+        ready = marker.exists() and python.exists()
+
+    if ready:
+        with open(marker, 'r') as f:
+            build = json.load(f)
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        marker.touch()
+        resolve_seconds = time.time() - started
+        saved = build['build_seconds'] - resolve_seconds
+        print(f"✅ Environment cache hit: resolved in {resolve_seconds:.1f}s, "
+              f"saved ~{saved:.0f}s (build took {build['build_seconds']:.0f}s on {build['created']})")
+        return str(python), lock
+
+    print("📦 Environment cache miss, building...")
+    shutil.rmtree(env_dir, ignore_errors=True)
+    env_dir.mkdir()
+
+    # Системні пакети спільні для вузла: пропускаємо apt, якщо вони вже встановлені
+    if not system_packages_installed():
+        install_system_dependencies()
+    else:
+        print("✅ System dependencies already installed")
+
+    # Пакети образу воркера (ray тощо) лишаються доступними, requirements ставляться поверх
+    subprocess.run([sys.executable, "-m", "venv", "--system-site-packages", str(env_dir / "venv")], check=True)
+    if not install_requirements(str(python), requirements_path):
+        shutil.rmtree(env_dir, ignore_errors=True)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+        return None, None
+
+    build_seconds = time.time() - started
+    with open(marker, 'w') as f:
+        json.dump({
+            'hash': env_hash,
+            'build_seconds': round(build_seconds, 1),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S')
+        }, f)
+    print(f"✅ Environment {env_hash} built in {build_seconds:.0f}s")
+
+    fcntl.flock(lock, fcntl.LOCK_SH)
+    prune_environments(cache_dir, ENV_CACHE_KEEP, env_hash)
+    return str(python), lock
+
 def setup_environment():
     """Налаштовує змінні середовища на воркері"""
     wandb_key = os.getenv('WANDB_API_KEY')
@@ -64,13 +198,27 @@ def setup_environment():
     print("✅ Environment file created")
     return True
 
-def run_yolo_training():
+def training_script(config_path="config.yaml"):
+    """
+    Скрипт тренування за config.yaml: пошук гіперпараметрів (tune),
+    розподілене тренування (distributed) або звичайне тренування
+    """
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    if (config.get('tune') or {}).get('enabled'):
+        return "tune_yolo.py"
+    if (config.get('distributed') or {}).get('enabled'):
+        return "train_distributed.py"
+    return "train_yolo.py"
+
+def run_yolo_training(python=sys.executable, script="train_yolo.py"):
     """Запускає тренування YOLO на воркері"""
-    print("🚀 Starting YOLO training...")
+    print(f"🚀 Starting YOLO training ({script})...")
     try:
         # Запускаємо тренування з виводом в реальному часі
         process = subprocess.Popen(
-            [sys.executable, "train_yolo.py"],
+            [python, script],
+            env={**os.environ, BASE_PYTHON_ENV: sys.executable},
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             universal_newlines=True,
@@ -106,16 +254,12 @@ def main():
         if file.is_file():
             print(f"  - {file.name}")
     
-    # Крок 1: Встановлюємо системні залежності
-    print("\n🔧 Step 1: Installing system dependencies...")
-    if not install_system_dependencies():
-        print("❌ Failed to install system dependencies")
-        sys.exit(1)
-    
-    # Крок 2: Встановлюємо Python залежності
-    print("\n🔧 Step 2: Installing Python requirements...")
-    if not install_requirements():
-        print("❌ Failed to install Python requirements")
+    # Кроки 1-2: Беремо середовище з кешу вузла або будуємо його (системні та Python залежності)
+    print("\n🔧 Step 1-2: Resolving training environment...")
+    # env_lock тримає спільне блокування середовища до завершення завдання
+    python, env_lock = resolve_environment()
+    if not python:
+        print("❌ Failed to build training environment")
         sys.exit(1)
     
     # Крок 3: Налаштовуємо середовище
@@ -126,7 +270,7 @@ def main():
     
     # Крок 4: Запускаємо тренування
     print("\n🔧 Step 4: Running YOLO training...")
-    if not run_yolo_training():
+    if not run_yolo_training(python, training_script()):
         print("❌ Training failed")
         sys.exit(1)
     
@@ -8,11 +8,18 @@ import os
 import tempfile
 import shutil
 import ray
+import ray.cloudpickle
 import yaml
 import logging
 from pathlib import Path
 from datetime import datetime
 
+import dataset_sync
+from dataset_sync import materialize_dataset, sync_dataset
+
+# Модуль синхронізації передається на воркер разом з функцією завдання
+ray.cloudpickle.register_pickle_by_value(dataset_sync)
+
 # Зменшуємо детальність логування Ray
 logging.getLogger("ray").setLevel(logging.WARNING)
 
@@ -39,7 +46,7 @@ def load_config(config_path="config.yaml"):
 
 def check_required_files():
     """Перевіряє, чи існують всі необхідні файли"""
-    required_files = ["train_yolo.py", "config.yaml", "requirements.txt", "ray_job.py", "mushroom_dataset.yaml"]
+    required_files = ["train_yolo.py", "image_cache.py", "train_distributed.py", "tune_yolo.py", "config.yaml", "requirements.txt", "ray_job.py", "mushroom_dataset.yaml"]
     missing_files = [f for f in required_files if not Path(f).exists()]
     
     if missing_files:
@@ -53,6 +60,10 @@ def prepare_job_files():
     """Підготовляє файли для завдання Ray"""
     files_to_upload = [
         "train_yolo.py",
+        "train_distributed.py",
+        "tune_yolo.py",
+        "dataset_sync.py",
+        "image_cache.py",
         "config.yaml", 
         "requirements.txt",
         "ray_job.py",
@@ -71,44 +82,14 @@ def prepare_job_files():
     
     return file_contents
 
-def prepare_dataset_files():
-    """Підготовляє файли датасету для завдання Ray"""
-    dataset_path = Path("../dataset")
-    if not dataset_path.exists():
-        print(f"  ⚠️  Dataset directory not found: {dataset_path}")
-        return {}
-    
-    dataset_files = {}
-    
-    # Рекурсивно збираємо всі файли з датасету
-    for file_path in dataset_path.rglob("*"):
-        if file_path.is_file() and not file_path.name.startswith('.'):
-            relative_path = f"dataset/{file_path.relative_to(dataset_path)}"
-            
-            try:
-                # Спробуємо прочитати як текст для текстових файлів
-                if file_path.suffix.lower() in ['.txt', '.yaml', '.yml', '.json']:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        dataset_files[relative_path] = f.read()
-                else:
-                    # Читаємо як бінарні дані для зображень та інших файлів  
-                    with open(file_path, 'rb') as f:
-                        dataset_files[relative_path] = f.read()
-                
-                print(f"  ✅ Prepared dataset file: {relative_path}")
-            except Exception as e:
-                print(f"  ⚠️  Could not read {relative_path}: {e}")
-    
-    print(f"  📊 Total dataset files: {len(dataset_files)}")
-    return dataset_files
-
 @ray.remote
-def run_ray_job(file_contents, dataset_files):
+def run_ray_job(file_contents, dataset_manifest):
     """Запускає ray_job.py на воркері Ray з завантаженими файлами"""
     import subprocess
     import sys
     import tempfile
     import os
+    import json
     
     # Створюємо тимчасову директорію та записуємо файли
     temp_dir = tempfile.mkdtemp()
@@ -123,21 +104,12 @@ def run_ray_job(file_contents, dataset_files):
         with open(filename, 'w') as f:
             f.write(content)
     
-    # Створюємо структуру dataset та записуємо файли датасету
-    if dataset_files:
-        for file_path, content in dataset_files.items():
-            # Створюємо директорії якщо потрібно
-            dir_path = os.path.dirname(file_path)
-            if dir_path:
-                os.makedirs(dir_path, exist_ok=True)
-            
-            # Записуємо файл (текстові файли як текст, бінарні як байти)
-            if file_path.endswith(('.txt', '.yaml', '.yml', '.json')):
-                with open(file_path, 'w') as f:
-                    f.write(content)
-            else:
-                with open(file_path, 'wb') as f:
-                    f.write(content)
+    # Збираємо dataset з кешу вузла (жорсткі посилання), докачуючи з кластера лише нові файли
+    if dataset_manifest:
+        materialize_dataset(dataset_manifest, "dataset")
+        # Маніфест для воркерів розподіленого тренування (train_distributed.py)
+        with open("dataset_manifest.json", 'w') as f:
+            json.dump(dataset_manifest, f)
     
     # Змінні середовища тепер встановлюються через runtime_env
     print("✅ Files uploaded and environment configured")
@@ -205,9 +177,9 @@ def main():
         if not file_contents:
             return
         
-        # Підготовляємо файли датасету
-        print("📊 Preparing dataset files...")
-        dataset_files = prepare_dataset_files()
+        # Синхронізуємо датасет з кешем кластера (завантажуються лише змінені файли)
+        print("📊 Syncing dataset...")
+        dataset_manifest = sync_dataset("../dataset")
         
         # Подаємо завдання
         print("🚀 Submitting ray_job.py as Ray task...")
@@ -223,6 +195,10 @@ def main():
         # Підготовляємо середовище виконання зі змінними W&B
         env_vars = {k: v for k, v in wandb_env.items() if v}  # Лише непорожні значення
         env_vars['WANDB_RUN_NAME'] = run_name  # Додаємо динамічну назву запуску
+        # Каталоги кешів вузла (середовище тренування, датасет), якщо задані локально
+        for key in ('TRAINING_ENV_CACHE_DIR', 'TRAINING_ENV_CACHE_KEEP', 'DATASET_NODE_CACHE_DIR', 'IMAGE_CACHE_DIR'):
+            if os.getenv(key):
+                env_vars[key] = os.getenv(key)
         
         runtime_env = {
             "env_vars": env_vars
@@ -240,8 +216,19 @@ def main():
             print("⚠️  No environment variables to pass!")
             print("   Make sure .env file exists or variables are exported")
         
+        # Розподілене тренування та пошук гіперпараметрів: завдання лише координує воркерів і не займає CPU
+        distributed = bool(config and (config.get('distributed') or {}).get('enabled'))
+        tuning = bool(config and (config.get('tune') or {}).get('enabled'))
+        if tuning:
+            print(f"🔍 Hyperparameter search: {config['tune'].get('num_samples', 16)} trials")
+        elif distributed:
+            print(f"🔀 Distributed training on {config['distributed'].get('num_workers', 2)} workers")
+        
         # Подаємо завдання з середовищем виконання
-        task = run_ray_job.options(runtime_env=runtime_env).remote(file_contents, dataset_files)
+        task = run_ray_job.options(
+            runtime_env=runtime_env,
+            num_cpus=0 if distributed or tuning else 1
+        ).remote(file_contents, dataset_manifest)
         
         # Чекаємо завершення
         print("👀 Waiting for task completion...")
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Розподілене data-parallel тренування YOLO на кількох воркерах Ray
+Ray Train (TorchTrainer) запускає N процесів з групою torch.distributed (gloo, CPU);
+кожен процес тренує модель на своїй частині датасету (DistributedSampler),
+а градієнти усереднюються між процесами перед кожним кроком оптимізатора.
+Ефективний batch та learning rate масштабуються з N, параметри - з config.yaml
+(розділ distributed). Режим --benchmark вимірює швидкість (зображень/с) для
+різної кількості воркерів та ефективність масштабування.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import ray
+import ray.cloudpickle
+import yaml
+from ray.train import RunConfig, ScalingConfig
+from ray.train.torch import TorchConfig, TorchTrainer
+from ray.util.scheduling_strategies import NodeAffinitySchedulingStrategy
+
+import dataset_sync
+import image_cache
+import ray_job
+import train_yolo
+
+# Локальні модулі передаються на воркери разом з функцією тренування
+ray.cloudpickle.register_pickle_by_value(dataset_sync)
+ray.cloudpickle.register_pickle_by_value(image_cache)
+ray.cloudpickle.register_pickle_by_value(ray_job)
+ray.cloudpickle.register_pickle_by_value(train_yolo)
+
+DEFAULT_DISTRIBUTED = {
+    'enabled': False,
+    'num_workers': 2,
+    'cpus_per_worker': 1,
+    'lr_scaling': 'sqrt',
+    'benchmark_workers': [1, 2, 4],
+    'benchmark_epochs': 1
+}
+
+# Маніфест датасету, який run_ray_job записує поруч зі скриптами
+MANIFEST_FILE = "dataset_manifest.json"
+RESULTS_FILE = "distributed_scaling.json"
+
+def distributed_config(config):
+    """Розділ distributed з config.yaml зі значеннями за замовчуванням"""
+    return {**DEFAULT_DISTRIBUTED, **(config.get('distributed') or {})}
+
+def scale_hyperparameters(config, num_workers):
+    """
+    Масштабує параметри під N воркерів:
+    batch з config.yaml - batch одного воркера, ефективний batch = batch * N;
+    lr0 множиться на N (linear, для SGD) або на sqrt(N) (sqrt, для Adam).
+    nbs = batch вимикає накопичення градієнтів ultralytics (accumulate = nbs / batch,
+    за замовчуванням nbs = 64), тож крок оптимізатора справді охоплює batch * N зображень.
+    """
+    scaling = distributed_config(config)['lr_scaling']
+    if scaling == 'linear':
+        factor = num_workers
+    elif scaling == 'sqrt':
+        factor = math.sqrt(num_workers)
+    elif scaling == 'none':
+        factor = 1.0
+    else:
+        raise ValueError(f"Unknown lr_scaling: {scaling} (use linear, sqrt or none)")
+
+    return {
+        'batch': config['batch'],
+        'nbs': config['batch'],
+        'effective_batch': config['batch'] * num_workers,
+        'lr0': config['lr0'] * factor
+    }
+
+def make_trainer_class(base):
+    """
+    Тренер base (з кешем зображень або стандартний DetectionTrainer)
+    з синхронізацією градієнтів між процесами Ray Train.
+    Ultralytics бачить змінні RANK / LOCAL_RANK від Ray Train, тож сам шардує
+    датасет DistributedSampler'ом, валідує й зберігає модель лише на rank 0 та
+    розсилає сигнал зупинки; бракує лише усереднення градієнтів (DDP обгортка
+    ultralytics розрахована на CUDA), яке робить optimizer_step.
+    """
+    import torch
+    import torch.distributed as dist
+
+    class DistributedDetectionTrainer(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.images_seen = 0
+            self.train_seconds = 0.0
+            self._epoch_started = None
+            self.add_callback("on_pretrain_routine_end", self._broadcast_model)
+            self.add_callback("on_train_epoch_start", self._start_epoch_timer)
+            self.add_callback("on_train_epoch_end", self._stop_epoch_timer)
+
+        @staticmethod
+        def _broadcast_model(trainer):
+            """
+            Однакові початкові ваги на всіх процесах (seed ultralytics залежить від RANK).
+            EMA існує лише на rank 0 і вже створена з його ваг.
+            """
+            for tensor in trainer.model.state_dict().values():
+                dist.broadcast(tensor, src=0)
+
+        def _start_epoch_timer(self, trainer):
+            self._epoch_started = time.time()
+
+        def _stop_epoch_timer(self, trainer):
+            # Лише прохід по батчах, без валідації та збереження на rank 0
+            self.train_seconds += time.time() - self._epoch_started
+
+        def preprocess_batch(self, batch):
+            self.images_seen += batch['img'].shape[0]
+            return super().preprocess_batch(batch)
+
+        def optimizer_step(self):
+            """Усереднює градієнти всіх процесів одним all-reduce і виконує крок оптимізатора"""
+            params = [p for p in self.model.parameters() if p.requires_grad]
+            grads = torch.cat([
+                (p.grad if p.grad is not None else torch.zeros_like(p)).reshape(-1) for p in params
+            ])
+            dist.all_reduce(grads)
+            grads /= dist.get_world_size()
+
+            offset = 0
+            for p in params:
+                size = p.numel()
+                p.grad = grads[offset:offset + size].view_as(p).clone()
+                offset += size
+
+            super().optimizer_step()
+
+    return DistributedDetectionTrainer
+
+def load_data_config(config):
+    """
+    Читає yaml датасету на драйвері: воркери Ray Train можуть бути на інших вузлах.
+    Відносний path перетворюється на абсолютний для запуску без маніфесту.
+    """
+    data_file = Path(config['data']).resolve()
+    with open(data_file, 'r') as f:
+        data = yaml.safe_load(f)
+    data['path'] = str((data_file.parent / data.get('path', '.')).resolve())
+    return data
+
+def prepare_data(data, manifest, work_dir):
+    """
+    Готує датасет на воркері: з маніфесту (кеш вузла + жорсткі посилання)
+    або за шляхом драйвера, якщо маніфесту немає (локальний кластер).
+    Повертає шлях до yaml датасету.
+    """
+    data = dict(data)
+    if manifest:
+        dataset_sync.materialize_dataset(manifest, work_dir / "dataset")
+        data['path'] = str(work_dir / "dataset")
+
+    data_path = work_dir / "dataset.yaml"
+    with open(data_path, 'w') as f:
+        yaml.safe_dump(data, f)
+    return str(data_path)
+
+def train_loop_per_worker(loop_config):
+    """Тренування на одному воркері Ray Train"""
+    import torch
+    import torch.distributed as dist
+    from ultralytics import YOLO
+
+    context = ray.train.get_context()
+    rank = context.get_world_rank()
+    world_size = context.get_world_size()
+
+    # Ultralytics читає RANK при імпорті: модуль має бути імпортований вже після Ray Train (див. deferred)
+    from ultralytics.utils import RANK
+    if RANK != rank:
+        raise RuntimeError(f"ultralytics sees RANK={RANK}, Ray Train world rank is {rank}")
+
+    # Окрема робоча директорія процесу: датасет та результати тренування
+    work_dir = Path(tempfile.mkdtemp(prefix=f"yolo-ddp-{rank}-"))
+    os.chdir(work_dir)
+    config = loop_config['config']
+    data = prepare_data(loop_config['data'], loop_config['manifest'], work_dir)
+
+    # Вбудований callback Ray Tune звітує лише з rank 0, а ray.train.report має викликатись усіма воркерами
+    from ultralytics.utils import SETTINGS
+    SETTINGS['raytune'] = False
+
+    # W&B лише на rank 0: інакше кожен воркер створить окремий запуск
+    if rank == 0 and not loop_config['benchmark']:
+        if not train_yolo.setup_wandb_environment():
+            print("⚠️  Continuing without W&B logging")
+    else:
+        SETTINGS['wandb'] = False
+
+    train_args = train_yolo.build_train_args(config, loop_config['run_name'])
+    scaled = scale_hyperparameters(config, world_size)
+    train_args.update({
+        'data': data,
+        'device': 'cpu',
+        'batch': scaled['batch'],
+        'nbs': scaled['nbs'],
+        'lr0': scaled['lr0'],
+        'epochs': loop_config['epochs']
+    })
+    if loop_config['benchmark']:
+        train_args.update({'val': False, 'plots': False, 'save_period': -1})
+
+    if rank == 0:
+        print(f"🔧 Distributed training: {world_size} workers, batch {scaled['batch']}/worker "
+              f"(effective {scaled['effective_batch']}), lr0 {scaled['lr0']:.5f}")
+
+    model = YOLO(config['model'])
+    model.train(trainer=make_trainer_class(image_cache.detection_trainer(config)), **train_args)
+    trainer = model.trainer
+
+    # Швидкість кластера: сума зображень усіх воркерів за час найповільнішого
+    images = torch.tensor([float(trainer.images_seen)], dtype=torch.float64)
+    seconds = torch.tensor([trainer.train_seconds], dtype=torch.float64)
+    dist.all_reduce(images)
+    dist.all_reduce(seconds, op=dist.ReduceOp.MAX)
+
+    ray.train.report({
+        'num_workers': world_size,
+        'effective_batch': scaled['effective_batch'],
+        'lr0': scaled['lr0'],
+        'images': int(images.item()),
+        'train_seconds': round(seconds.item(), 2),
+        'images_per_second': round(images.item() / max(seconds.item(), 1e-9), 2),
+        'save_dir': str(trainer.save_dir)
+    })
+
+def deferred(func):
+    """
+    Обгортка функції воркера, що розпаковує func лише під час виклику.
+    Ray Train десеріалізує функцію тренування до встановлення RANK / LOCAL_RANK,
+    а ultralytics (імпортований train_yolo та image_cache) читає їх при імпорті.
+    """
+    payload = ray.cloudpickle.dumps(func)
+
+    def wrapper(*args, **kwargs):
+        return ray.cloudpickle.loads(payload)(*args, **kwargs)
+    return wrapper
+
+def run_training(config, num_workers, run_name, manifest=None, epochs=None, benchmark=False):
+    """Запускає TorchTrainer на num_workers воркерах і повертає метрики rank 0"""
+    dist_config = distributed_config(config)
+    trainer = TorchTrainer(
+        deferred(train_loop_per_worker),
+        train_loop_config={
+            'config': config,
+            'manifest': manifest,
+            'run_name': run_name,
+            'epochs': epochs or config['epochs'],
+            'benchmark': benchmark,
+            'data': load_data_config(config)
+        },
+        scaling_config=ScalingConfig(
+            num_workers=num_workers,
+            use_gpu=False,
+            resources_per_worker={'CPU': dist_config['cpus_per_worker']}
+        ),
+        torch_config=TorchConfig(backend="gloo"),
+        run_config=RunConfig(name=run_name)
+    )
+    result = trainer.fit()
+    return result.metrics
+
+def run_benchmark(config, manifest, worker_counts, epochs):
+    """
+    Тренує кілька епох для кожної кількості воркерів і рахує ефективність масштабування:
+    швидкість(N) / (N * швидкість(1)), база - найменша кількість воркерів
+    """
+    results = []
+    for num_workers in sorted(worker_counts):
+        print(f"\n📏 Benchmark: {num_workers} worker(s), {epochs} epoch(s)")
+        metrics = run_training(config, num_workers, f"{config['run_name']}-scaling-{num_workers}",
+                               manifest=manifest, epochs=epochs, benchmark=True)
+        results.append({key: metrics[key] for key in (
+            'num_workers', 'effective_batch', 'lr0', 'images', 'train_seconds', 'images_per_second'
+        )})
+
+    base = results[0]
+    per_worker_base = base['images_per_second'] / base['num_workers']
+    for row in results:
+        row['speedup'] = round(row['images_per_second'] / base['images_per_second'], 2)
+        row['scaling_efficiency'] = round(row['images_per_second'] / (per_worker_base * row['num_workers']), 3)
+
+    print(f"\n{'workers':>8}{'eff. batch':>12}{'images/s':>10}{'speedup':>9}{'efficiency':>12}")
+    for row in results:
+        print(f"{row['num_workers']:>8}{row['effective_batch']:>12}{row['images_per_second']:>10.2f}"
+              f"{row['speedup']:>9.2f}{row['scaling_efficiency']:>12.1%}")
+
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Saved to {RESULTS_FILE}")
+    return results
+
+def load_manifest(path=MANIFEST_FILE):
+    """Маніфест датасету, записаний run_ray_job, або None - тоді воркери читають локальний шлях"""
+    if not Path(path).exists():
+        print(f"⚠️  {path} not found, workers read the dataset from the local path")
+        return None
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    print(f"📊 Dataset manifest: {len(manifest['files'])} files")
+    return manifest
+
+def worker_runtime_env():
+    """
+    Змінні W&B та кешів для воркерів Ray. Якщо скрипт запущено з ray_job.py, воркери
+    використовують те саме середовище з кешу вузлів (TRAINING_ENV_CACHE_DIR), що й драйвер;
+    інакше - Python пакети образу воркера
+    """
+    env_vars = {
+        key: os.environ[key]
+        for key in ('WANDB_API_KEY', 'WANDB_PROJECT', 'WANDB_ENTITY', 'WANDB_RUN_NAME',
+                    'DATASET_NODE_CACHE_DIR', 'IMAGE_CACHE_DIR', 'TRAINING_ENV_CACHE_DIR', 'TRAINING_ENV_CACHE_KEEP')
+        if os.getenv(key)
+    }
+    if os.getenv(ray_job.BASE_PYTHON_ENV):
+        return {'py_executable': sys.executable, 'env_vars': env_vars}
+    return {'env_vars': env_vars}
+
+@ray.remote(num_cpus=0)
+class NodeEnvironment:
+    """Середовище тренування з кешу вузла; спільне блокування тримається, поки живе актор"""
+
+    def __init__(self, requirements):
+        workdir = Path(tempfile.mkdtemp())
+        (workdir / "requirements.txt").write_text(requirements)
+        self.python, self.lock = ray_job.resolve_environment(str(workdir / "requirements.txt"))
+
+    def python_path(self):
+        return self.python
+
+def prepare_node_environments():
+    """
+    Знаходить або будує середовище тренування на кожному вузлі з CPU, перш ніж там стартують воркери.
+    Повертає актори, що тримають середовища від видалення до кінця тренування.
+    """
+    base_python = os.getenv(ray_job.BASE_PYTHON_ENV)
+    if not base_python:
+        return []
+
+    with open("requirements.txt", 'r') as f:
+        requirements = f.read()
+    nodes = [node for node in ray.nodes() if node.get('Alive') and node.get('Resources', {}).get('CPU')]
+    environments = [
+        NodeEnvironment.options(
+            # Актори запускаються інтерпретатором образу: середовища на вузлі ще може не бути
+            runtime_env={'py_executable': base_python},
+            scheduling_strategy=NodeAffinitySchedulingStrategy(node_id=node['NodeID'], soft=False)
+        ).remote(requirements)
+        for node in nodes
+    ]
+    pythons = ray.get([environment.python_path.remote() for environment in environments])
+    if any(python != sys.executable for python in pythons):
+        raise SystemExit(f"❌ Training environment differs across nodes: {sorted(set(map(str, pythons)))}")
+    print(f"🧱 Training environment ready on {len(nodes)} nodes: {sys.executable}")
+    return environments
+
+def main():
+    """Головна функція розподіленого тренування"""
+    parser = argparse.ArgumentParser(description="Data-parallel YOLO training on Ray workers (gloo)")
+    parser.add_argument("--workers", type=int, default=None, help="кількість воркерів (за замовчуванням distributed.num_workers)")
+    parser.add_argument("--benchmark", action="store_true", help="виміряти images/s для distributed.benchmark_workers")
+    parser.add_argument("--epochs", type=int, default=None, help="епохи (для --benchmark за замовчуванням distributed.benchmark_epochs)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="маніфест датасету з dataset_sync")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🤖 Distributed YOLO Training with Ray Train (gloo)")
+    print("=" * 60)
+
+    config = train_yolo.load_config()
+    config['device'] = 'cpu'
+    dist_config = distributed_config(config)
+
+    manifest = load_manifest(args.manifest)
+
+    if not ray.is_initialized():
+        ray.init(runtime_env=worker_runtime_env())
+    node_environments = prepare_node_environments()  # тримає середовища до кінця тренування
+
+    if args.benchmark:
+        run_benchmark(config, manifest, dist_config['benchmark_workers'],
+                      args.epochs or dist_config['benchmark_epochs'])
+        return
+
+    num_workers = args.workers or dist_config['num_workers']
+    run_name = os.getenv('WANDB_RUN_NAME', config['run_name'])
+    metrics = run_training(config, num_workers, run_name, manifest=manifest, epochs=args.epochs)
+
+    print("✅ Distributed training completed!")
+    print(f"📊 {metrics['num_workers']} workers, effective batch {metrics['effective_batch']}, "
+          f"lr0 {metrics['lr0']:.5f}: {metrics['images_per_second']:.2f} images/s")
+    print(f"📁 Results saved on the rank 0 worker in: {metrics['save_dir']}")
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,8 @@ from dotenv import load_dotenv
 from ultralytics import YOLO
 import torch
 
+from image_cache import detection_trainer
+
 def load_config(config_path="config.yaml"):
     """Завантажує конфігурацію з YAML файлу"""
     with open(config_path, 'r') as file:
@@ -46,21 +48,9 @@ def setup_wandb_environment():
         print(f"❌ Failed to setup W&B: {e}")
         return False
 
-def train_model(config):
-    """Тренує модель YOLOv8n з вбудованим відстеженням W&B"""
-    
-    # Перевизначаємо run_name змінною середовища, якщо встановлено
-    run_name = os.getenv('WANDB_RUN_NAME', config['run_name'])
-    
-    print("🚀 Starting YOLOv8n training on CPU...")
-    print(f"📊 W&B Project: {config['wandb_project']}")
-    print(f"🏃 Run Name: {run_name}")
-    
-    # Ініціалізуємо модель
-    model = YOLO(config['model'])
-    
-    # Параметри тренування - YOLO автоматично обробить інтеграцію W&B
-    train_args = {
+def build_train_args(config, run_name):
+    """Параметри model.train з конфігурації - YOLO автоматично обробить інтеграцію W&B"""
+    return {
         'data': config['data'],
         'epochs': config['epochs'],
         'batch': config['batch'],
@@ -78,11 +68,28 @@ def train_model(config):
         'plots': True,
         'verbose': True
     }
+
+def train_model(config):
+    """Тренує модель YOLOv8n з вбудованим відстеженням W&B"""
+    
+    # Перевизначаємо run_name змінною середовища, якщо встановлено
+    run_name = os.getenv('WANDB_RUN_NAME', config['run_name'])
+    
+    print("🚀 Starting YOLOv8n training on CPU...")
+    print(f"📊 W&B Project: {config['wandb_project']}")
+    print(f"🏃 Run Name: {run_name}")
+    
+    # Ініціалізуємо модель
+    model = YOLO(config['model'])
+    
+    # Параметри тренування
+    train_args = build_train_args(config, run_name)
     
     print(f"🔧 Training parameters: {train_args}")
     
     # Починаємо тренування - YOLO автоматично логуватиме в W&B
-    results = model.train(**train_args)
+    # З image_cache: true зображення читаються з memmap кешу замість файлів
+    results = model.train(trainer=detection_trainer(config), **train_args)
     
     print("✅ Training completed with built-in W&B logging!")
     
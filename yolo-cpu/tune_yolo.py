@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Паралельний пошук гіперпараметрів YOLO з Ray Tune
+Простір пошуку задається в config.yaml (розділ tune), кожен trial - окреме
+тренування з власним резервуванням CPU на кластері Ray. Планувальник ASHA
+зупиняє слабкі trials за mAP валідації після кожної епохи, тож повну кількість
+епох тренують лише найкращі. Найкраща конфігурація записується в best_config.yaml.
+"""
+
+import argparse
+import json
+import math
+import os
+import tempfile
+from pathlib import Path
+
+import ray
+import ray.cloudpickle
+import yaml
+from ray import tune
+from ray.tune.schedulers import ASHAScheduler
+
+import dataset_sync
+import image_cache
+import train_distributed
+import train_yolo
+from train_distributed import (MANIFEST_FILE, load_data_config, load_manifest, prepare_data,
+                               prepare_node_environments, worker_runtime_env)
+
+# Локальні модулі передаються на воркери разом з функцією trial
+ray.cloudpickle.register_pickle_by_value(dataset_sync)
+ray.cloudpickle.register_pickle_by_value(image_cache)
+ray.cloudpickle.register_pickle_by_value(train_distributed)
+ray.cloudpickle.register_pickle_by_value(train_yolo)
+
+DEFAULT_TUNE = {
+    'enabled': False,
+    'num_samples': 16,
+    'max_concurrent': 4,
+    'cpus_per_trial': 1,
+    'metric': 'metrics/mAP50-95(B)',
+    'grace_period': 2,
+    'reduction_factor': 3,
+    'search_space': {}
+}
+
+BEST_CONFIG_FILE = "best_config.yaml"
+RESULTS_FILE = "tune_results.json"
+
+# Кількість точок на неперервний параметр для оцінки вартості сітки
+GRID_POINTS = 3
+
+def tune_config(config):
+    """Розділ tune з config.yaml зі значеннями за замовчуванням"""
+    return {**DEFAULT_TUNE, **(config.get('tune') or {})}
+
+def build_search_space(space):
+    """
+    Перетворює опис простору з config.yaml на розподіли Ray Tune:
+    {lr0: {loguniform: [a, b]}, momentum: {uniform: [a, b]}, batch: {choice: [...]}}
+    """
+    samplers = {'loguniform': tune.loguniform, 'uniform': tune.uniform}
+    search_space = {}
+    for name, spec in space.items():
+        (kind, values), = spec.items()
+        if kind == 'choice':
+            search_space[name] = tune.choice(values)
+        elif kind in samplers:
+            search_space[name] = samplers[kind](*values)
+        else:
+            raise ValueError(f"Unknown distribution for {name}: {kind} (use loguniform, uniform or choice)")
+    return search_space
+
+def grid_size(space):
+    """Кількість конфігурацій сітки по тому ж простору (GRID_POINTS точок на неперервний параметр)"""
+    return math.prod(len(values) if kind == 'choice' else GRID_POINTS
+                     for spec in space.values() for kind, values in spec.items())
+
+def train_trial(trial_config, base):
+    """Один trial: тренування з параметрами trial та звітом метрик валідації після кожної епохи"""
+    import torch
+    from ultralytics.utils import SETTINGS
+
+    # Вбудовану інтеграцію Ray Tune та W&B вимикаємо: метрики звітує callback нижче
+    SETTINGS['raytune'] = False
+    SETTINGS['wandb'] = False
+    from ultralytics import YOLO
+
+    torch.set_num_threads(base['cpus_per_trial'])
+
+    work_dir = Path(tempfile.mkdtemp(prefix="yolo-tune-"))
+    os.chdir(work_dir)
+    config = {**base['config'], **trial_config}
+    data = prepare_data(base['data'], base['manifest'], work_dir)
+
+    train_args = train_yolo.build_train_args(config, tune.get_context().get_trial_name())
+    train_args.update({
+        'data': data,
+        'device': 'cpu',
+        'plots': False,
+        'save_period': -1,
+        'verbose': False
+    })
+
+    def report_epoch(trainer):
+        tune.report({**trainer.metrics, 'epoch': trainer.epoch + 1})
+
+    model = YOLO(config['model'])
+    model.add_callback("on_fit_epoch_end", report_epoch)
+    model.train(trainer=image_cache.detection_trainer(config), **train_args)
+
+def write_best_config(config, best_params, path=BEST_CONFIG_FILE):
+    """Записує config.yaml з найкращими параметрами (готовий для train_yolo.py)"""
+    best = {**config, **best_params}
+    best['tune'] = {**tune_config(config), 'enabled': False}
+    with open(path, 'w') as f:
+        yaml.safe_dump(best, f, sort_keys=False, allow_unicode=True)
+    return best
+
+def main():
+    """Головна функція пошуку гіперпараметрів"""
+    parser = argparse.ArgumentParser(description="Parallel YOLO hyperparameter search with Ray Tune and ASHA")
+    parser.add_argument("--samples", type=int, default=None, help="кількість trials (за замовчуванням tune.num_samples)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="маніфест датасету з dataset_sync")
+    parser.add_argument("--output", default=BEST_CONFIG_FILE, help="файл найкращої конфігурації")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🤖 YOLO Hyperparameter Search with Ray Tune (ASHA)")
+    print("=" * 60)
+
+    config = train_yolo.load_config()
+    config['device'] = 'cpu'
+    settings = tune_config(config)
+    if not settings['search_space']:
+        raise SystemExit("❌ tune.search_space is empty in config.yaml")
+
+    num_samples = args.samples or settings['num_samples']
+    max_epochs = config['epochs']
+    manifest = load_manifest(args.manifest)
+
+    if not ray.is_initialized():
+        ray.init(runtime_env=worker_runtime_env())
+    node_environments = prepare_node_environments()  # тримає середовища до кінця пошуку
+
+    scheduler = ASHAScheduler(
+        time_attr='epoch',
+        max_t=max_epochs,
+        grace_period=settings['grace_period'],
+        reduction_factor=settings['reduction_factor']
+    )
+    trainable = tune.with_parameters(train_trial, base={
+        'config': config,
+        'data': load_data_config(config),
+        'manifest': manifest,
+        'cpus_per_trial': settings['cpus_per_trial']
+    })
+
+    print(f"🔍 {num_samples} trials, up to {settings['max_concurrent']} concurrent, "
+          f"{settings['cpus_per_trial']} CPU each, max {max_epochs} epochs, metric {settings['metric']}")
+
+    tuner = tune.Tuner(
+        tune.with_resources(trainable, {'cpu': settings['cpus_per_trial']}),
+        param_space=build_search_space(settings['search_space']),
+        tune_config=tune.TuneConfig(
+            metric=settings['metric'],
+            mode='max',
+            scheduler=scheduler,
+            num_samples=num_samples,
+            max_concurrent_trials=settings['max_concurrent']
+        ),
+        run_config=tune.RunConfig(name=f"{config['run_name']}-tune")
+    )
+    results = tuner.fit()
+
+    best = results.get_best_result()
+    best_params = {name: best.config[name] for name in settings['search_space']}
+    write_best_config(config, best_params, args.output)
+
+    # Вартість пошуку в епохах проти повного тренування кожного trial та сітки
+    trials = []
+    for result in results:
+        if result.metrics is None:
+            continue
+        trials.append({
+            'config': {name: result.config[name] for name in settings['search_space']},
+            'epochs': result.metrics.get('epoch', 0),
+            settings['metric']: result.metrics.get(settings['metric'])
+        })
+    epochs_trained = sum(trial['epochs'] for trial in trials)
+    full_epochs = len(trials) * max_epochs
+    grid_epochs = grid_size(settings['search_space']) * max_epochs
+
+    print("\n✅ Search completed!")
+    print(f"🏆 Best {settings['metric']}: {best.metrics[settings['metric']]:.4f} "
+          f"after {best.metrics['epoch']} epochs")
+    for name, value in best_params.items():
+        print(f"   - {name}: {value}")
+    print(f"⏱️  Epochs trained: {epochs_trained} of {full_epochs} without early stopping "
+          f"({1 - epochs_trained / max(full_epochs, 1):.0%} saved), "
+          f"{GRID_POINTS}-point grid: {grid_epochs} epochs")
+    print(f"💾 Best config saved to {args.output}")
+
+    with open(RESULTS_FILE, 'w') as f:
+        json.dump({
+            'best': {**best_params, settings['metric']: best.metrics[settings['metric']]},
+            'epochs_trained': epochs_trained,
+            'epochs_without_early_stopping': full_epochs,
+            'grid_epochs': grid_epochs,
+            'trials': trials
+        }, f, indent=2)
+
+    # У завданні Ray файл залишається на воркері: дублюємо конфігурацію у вивід
+    print(f"\n--- {args.output} ---")
+    print(yaml.safe_dump(best_params, sort_keys=False).strip())
+
+if __name__ == "__main__":
+    main()